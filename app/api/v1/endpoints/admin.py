@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+import hmac
+import os
+
+from app.core.config import settings
+from app.services.sampling_profiler.implementation import SamplingProfiler
+
+router = APIRouter()
+
+MAX_PROFILE_SECONDS = 120
+
+# one profiler per worker, so concurrent profile requests do not stack up
+profiler = SamplingProfiler()
+
+
+def verify_admin_token(authorization: Optional[str] = Header(default=None)):
+    # admin endpoints do not exist unless a token is configured
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    expected = f"Bearer {settings.ADMIN_TOKEN}"
+    if not authorization or not hmac.compare_digest(authorization, expected):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+@router.post("/profile", dependencies=[Depends(verify_admin_token)])
+async def profile(
+    seconds: float = Query(default=10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(default=10, ge=1, le=1000),
+):
+    """
+    Samples every thread of the worker that handles this request for
+    `seconds` and returns a flamegraph-compatible collapsed-stack file
+    """
+    if profiler.is_running:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    profiler.interval = interval_ms / 1000
+    try:
+        # sample from a thread so the event loop keeps serving (and is sampled)
+        stacks = await run_in_threadpool(profiler.profile, seconds)
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    filename = f"profile-{os.getpid()}.collapsed"
+    return Response(
+        content=stacks,
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,29 +1,39 @@
-from fastapi import APIRouter, HTTPException
-import redis
-from app.core.config import settings
+from fastapi import APIRouter, Depends, HTTPException, Request
+from app.core.drain import WEBHOOK, get_drain_tracker
+from app.services.health_monitor.implementation import NOT_READY
 
 router = APIRouter()
 
 
+def get_health_monitor(request: Request):
+    # started by the application lifespan
+    return getattr(request.app.state, "health_monitor", None)
+
+
+@router.get("/live")
+async def liveness_check():
+    """
+    Answers as long as the process serves requests, without looking at its
+    dependencies: a Redis outage must not get the containers restarted
+    """
+    return {"status": "alive"}
+
+
 @router.get("")
-async def health_check():
+@router.get("/ready")
+async def readiness_check(health_monitor=Depends(get_health_monitor)):
     """
-    Health check endpoint that verifies Redis connection
+    The latest snapshot of the dependency checks, refreshed in the
+    background, so probes never reach Redis or Stark Bank themselves
     """
-    try:
-        # Test Redis connection
-        redis_client = redis.from_url(settings.REDIS_URL)
-        redis_client.ping()
-
-        return {
-            "status": "healthy",
-            "services": {"redis": "connected", "api": "running"},
-        }
-    except redis.ConnectionError:
-        raise HTTPException(
-            status_code=503,
-            detail={
-                "status": "unhealthy",
-                "services": {"redis": "disconnected", "api": "running"},
-            },
-        )
+    if health_monitor is None:
+        snapshot = {"status": NOT_READY, "checks": {}}
+    else:
+        snapshot = health_monitor.snapshot()
+    if get_drain_tracker(WEBHOOK).draining:
+        # shutting down, the load balancer stops sending requests here
+        snapshot = {**snapshot, "status": NOT_READY, "draining": True}
+
+    if snapshot["status"] == NOT_READY:
+        raise HTTPException(status_code=503, detail=snapshot)
+    return snapshot
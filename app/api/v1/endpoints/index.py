@@ -89,7 +89,8 @@ async def root():
         <h2>API Endpoints</h2>
         <ul>
             <li><code><a href="/api/v1/webhooks/starkbank">/api/v1/webhooks/starkbank</a></code> - Webhook endpoint for Stark Bank events</li>
-            <li><code><a href="/health">/health</a></code> - Health check endpoint</li>
+            <li><code><a href="/health/live">/health/live</a></code> - Liveness check endpoint</li>
+            <li><code><a href="/health/ready">/health/ready</a></code> - Readiness check endpoint</li>
         </ul>
 
         <h2>Local Development</h2>
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+
+from app.api.v1.endpoints.admin import verify_admin_token
+from app.core.job_history import get_job_history
+
+router = APIRouter(dependencies=[Depends(verify_admin_token)])
+
+MAX_RUNS = 200
+
+
+@router.get("")
+async def list_job_runs(
+    job: Optional[str] = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=MAX_RUNS),
+    history=Depends(get_job_history),
+):
+    """
+    The most recent runs of the scheduled jobs of the whole fleet, newest
+    first, with their counts, progress and errors
+    """
+    return {"runs": await run_in_threadpool(history.runs, job, limit)}
+
+
+@router.get("/{run_id}")
+async def get_job_run(run_id: str, history=Depends(get_job_history)):
+    """
+    The latest state of a run, live progress included while it runs
+    """
+    run = await run_in_threadpool(history.run, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Job run not found")
+    return run
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import Optional
+import hmac
+
+from app.core.config import settings
+from app.core.metrics import render_metrics
+
+
+def verify_metrics_token(authorization: Optional[str] = Header(default=None)):
+    # the API is public, so its metrics do not exist unless a token is configured
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not authorization or not hmac.compare_digest(authorization, expected):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+router = APIRouter(dependencies=[Depends(verify_metrics_token)])
+
+
+@router.get("")
+def metrics():
+    """
+    Prometheus metrics aggregated across all workers. Reads the files of
+    every worker, so it runs on the thread pool
+    """
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
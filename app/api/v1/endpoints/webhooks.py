@@ -1,34 +1,266 @@
 from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
 from functools import lru_cache
+from typing import Optional
 from datetime import datetime, timezone
+import logging
+import math
 import redis
+import time
 
-from app.models.types import Transfer, StarkBankEvent
+from app.models.types import (
+    ArchivedEvent,
+    EventOutcome,
+    StarkBankEvent,
+    credited_invoice_transfer,
+)
 from app.core.config import settings
-from app.services.starkbank_signature_verifier.implementation import (
-    StarkBankSignatureVerifier,
+from app.core.drain import WEBHOOK, get_drain_tracker
+from app.core.event_archive import get_event_archive_writer
+from app.core.logs import current_event_id
+from app.core.redis_client import (
+    get_redis_client,
+    get_redis_replica_client,
+    key_namespace,
+)
+from app.core.resilience import get_starkbank_caller
+from app.core.transfer_sweep import get_transfer_sweeper
+from app.core.workspaces import (
+    get_workspace_registry,
+    get_workspace_signature_verifier,
+)
+from app.core.metrics import (
+    EVENT_REPLAY_FILTER_UNCONFIRMED_TOTAL,
+    REDIS_OPERATION_SECONDS,
+    SIGNATURE_VERIFICATION_SECONDS,
+    WEBHOOK_REJECTIONS_TOTAL,
+    WEBHOOK_REQUEST_SECONDS,
+)
+from app.services.bloom_filter.implementation import RedisRotatingBloomFilter
+from app.services.concurrency_limiter.implementation import ConcurrencyLimiter
+from app.services.drain.implementation import DrainingError
+from app.services.near_cache.implementation import TTLCache
+from app.services.outbox.implementation import TRANSFERS, RedisOutbox
+from app.services.rate_limiter.implementation import RedisTokenBucket
+from app.services.singleflight.implementation import SingleFlight
+from app.services.workspace_registry.implementation import (
+    Workspace,
+    WorkspaceRegistry,
 )
-from app.services.transfer_service.implementation import StarkBankTransferSender
+from app.services.resilience.implementation import (
+    CircuitOpenError,
+    RateLimitedError,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TimedWebhookRoute(APIRoute):
+    def get_route_handler(self):
+        route_handler = super().get_route_handler()
+
+        async def timed_route_handler(request: Request):
+            start = time.perf_counter()
+            status_code = 500
+            try:
+                response = await route_handler(request)
+                status_code = response.status_code
+                return response
+            except HTTPException as e:
+                status_code = e.status_code
+                raise
+            except RequestValidationError:
+                status_code = 422
+                raise
+            finally:
+                WEBHOOK_REQUEST_SECONDS.labels(str(status_code)).observe(
+                    time.perf_counter() - start
+                )
+
+        return timed_route_handler
+
+
+router = APIRouter(route_class=TimedWebhookRoute)
+
+
+def get_redis_read_client(redis_client=Depends(get_redis_client)):
+    # replicas may lag behind: a copy of an event processed a moment ago can
+    # pass the dedupe check, its transfer is then refused by its external id
+    if settings.REDIS_READ_FROM_REPLICAS:
+        return get_redis_replica_client()
+    return redis_client
+
+
+@lru_cache(maxsize=1)
+def get_event_replay_filter(
+    redis_client=Depends(get_redis_client),
+) -> Optional[RedisRotatingBloomFilter]:
+    if not settings.EVENT_REPLAY_FILTER_ENABLED:
+        return None
+
+    return RedisRotatingBloomFilter(
+        redis_client,
+        namespace="webhook:events:bloom",
+        capacity=settings.EVENT_REPLAY_FILTER_CAPACITY,
+        error_rate=settings.EVENT_REPLAY_FILTER_ERROR_RATE,
+        bucket_seconds=settings.EVENT_REPLAY_FILTER_BUCKET_SECONDS,
+        retention=settings.EVENT_REPLAY_FILTER_RETENTION_SECONDS,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_processed_events_cache():
+    # per worker: Stark Bank often delivers the same event several times
+    # within seconds, those copies are answered without touching Redis
+    return TTLCache(
+        "processed_events",
+        max_size=settings.PROCESSED_EVENTS_CACHE_SIZE,
+        ttl=settings.processed_event_ttl.total_seconds(),
+    )
+
 
-router = APIRouter()
+@lru_cache(maxsize=1)
+def get_webhook_singleflight():
+    return SingleFlight("webhook_event")
 
 
 @lru_cache(maxsize=1)
-def get_signature_verifier():
-    # use the same instance for all requests
-    return StarkBankSignatureVerifier(settings.starkbank_project)
+def get_webhook_rate_limiter(redis_client=Depends(get_redis_client)):
+    # shared by every worker, bounds the rate the whole fleet accepts
+    return RedisTokenBucket(
+        redis_client,
+        "webhook",
+        rate=settings.WEBHOOK_RATE_LIMIT_PER_SECOND,
+        capacity=settings.WEBHOOK_RATE_LIMIT_BURST,
+    )
 
 
 @lru_cache(maxsize=1)
-def get_redis_client():
-    return redis.from_url(settings.REDIS_URL)
+def get_webhook_concurrency_limiter():
+    return ConcurrencyLimiter("webhook", settings.WEBHOOK_MAX_CONCURRENCY)
+
+
+@lru_cache(maxsize=1)
+def get_transfer_outbox(
+    redis_client=Depends(get_redis_client),
+) -> Optional[RedisOutbox]:
+    if settings.WEBHOOK_TRANSFER_MODE != "outbox":
+        return None
+    return RedisOutbox(redis_client, key_namespace(TRANSFERS))
+
+
+def get_webhook_drain_tracker():
+    return get_drain_tracker(WEBHOOK)
 
 
 class WebhookRequest(BaseModel):
     event: StarkBankEvent
 
 
+def get_workspace(
+    schema: WebhookRequest,
+    registry: WorkspaceRegistry = Depends(get_workspace_registry),
+) -> Optional[Workspace]:
+    # None for a workspace this deployment does not serve, rejected by
+    # validate_workspace
+    return registry.get(schema.event.workspaceId)
+
+
+def get_signature_verifier(workspace=Depends(get_workspace)):
+    if workspace is None:
+        return None
+    # one instance per workspace, shared by all its requests
+    return get_workspace_signature_verifier(workspace)
+
+
+def get_webhook_transfer_sweeper(workspace=Depends(get_workspace)):
+    if workspace is None:
+        return None
+    return get_transfer_sweeper(workspace)
+
+
+def archive_event(
+    archive_writer,
+    event: StarkBankEvent,
+    outcome: EventOutcome,
+    amount: Optional[int] = None,
+):
+    if archive_writer is None:
+        return
+    archive_writer.submit(
+        ArchivedEvent.model_construct(
+            event_id=event.id,
+            invoice_id=event.log.get("invoice", {}).get("id"),
+            created=event.created,
+            outcome=outcome,
+            amount=amount,
+            source="webhook",
+        )
+    )
+
+
+async def track_webhook(drain_tracker=Depends(get_webhook_drain_tracker)):
+    """
+    Counts the request until its response is sent, for the drain report.
+    The server already waits for the open connections before shutting the
+    application down, so few requests are still in flight by then; those
+    arriving on a kept-alive connection meanwhile are refused.
+    """
+    try:
+        with drain_tracker.track():
+            yield
+    except DrainingError:
+        raise HTTPException(
+            status_code=503,
+            detail="Shutting down, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def admit_webhook(
+    concurrency_limiter=Depends(get_webhook_concurrency_limiter),
+):
+    """
+    Sheds load before any other work is done. A 503 is retried by Stark
+    Bank, and events it gives up on are picked up by the reconciliation job.
+    """
+    if not concurrency_limiter.try_acquire():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many requests in flight, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        yield
+    finally:
+        concurrency_limiter.release()
+
+
+async def limit_webhook_rate(rate_limiter=Depends(get_webhook_rate_limiter)):
+    """
+    Caps the signed webhooks of the whole fleet. Runs after the validation,
+    so forged or invalid requests never spend its tokens;
+    the concurrency limit of each worker bounds the work they cause.
+    """
+    try:
+        with REDIS_OPERATION_SECONDS.labels("rate_limit").time():
+            acquired, retry_after = rate_limiter.try_acquire()
+    except redis.RedisError:
+        # fail open, the concurrency limit still protects this worker
+        acquired, retry_after = True, 0
+
+    if not acquired:
+        raise HTTPException(
+            status_code=503,
+            detail="Rate limit exceeded, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
 async def validate_event_age(schema: WebhookRequest):
     now = datetime.now(timezone.utc)
     event_age = now - schema.event.created
@@ -40,12 +272,44 @@ async def validate_event_age(schema: WebhookRequest):
         )
 
 
+async def validate_workspace(workspace: Optional[Workspace]):
+    if workspace is None:
+        raise HTTPException(status_code=403, detail="Forbidden: Unknown workspace")
+
+
 async def validate_not_already_processed(
     schema: WebhookRequest,
-    redis_client=Depends(get_redis_client),
+    workspace: Workspace,
+    redis_client,
+    event_replay_filter: Optional[RedisRotatingBloomFilter],
+    processed_events: TTLCache,
 ):
-    key = f"webhook:event:{schema.event.id}"
-    if redis_client.exists(key):
+    if processed_events.contains(schema.event.id):
+        raise HTTPException(
+            status_code=409,
+            detail="Event already processed",
+        )
+
+    if event_replay_filter is not None:
+        with REDIS_OPERATION_SECONDS.labels("bloom_check").time():
+            maybe_processed = event_replay_filter.might_contain(schema.event.id)
+        if not maybe_processed:
+            # a Bloom filter has no false negatives: the event is new
+            return
+
+    key = workspace.key(f"webhook:event:{schema.event.id}")
+    with REDIS_OPERATION_SECONDS.labels("exists").time():
+        already_processed = redis_client.exists(key)
+
+    if not already_processed and event_replay_filter is not None:
+        # Either a replay older than the exact key or a false positive.
+        # Rejecting is the safe side: a false positive is never answered
+        # with 200, so the event stays undelivered and the reconciliation
+        # job transfers it, while accepting could pay twice.
+        EVENT_REPLAY_FILTER_UNCONFIRMED_TOTAL.inc()
+        already_processed = True
+
+    if already_processed:
         raise HTTPException(
             status_code=409,
             detail="Event already processed",
@@ -55,7 +319,7 @@ async def validate_not_already_processed(
 async def validate_signature(
     request: Request,
     schema: WebhookRequest,
-    signature_verifier=Depends(get_signature_verifier),
+    signature_verifier,
 ):
     signature = request.headers.get("Digital-Signature")
     if not signature:
@@ -65,43 +329,174 @@ async def validate_signature(
 
     request_body = await request.body()
 
-    if not signature_verifier.check_signature(
-        request_body, signature, schema.event.created
-    ):
+    with SIGNATURE_VERIFICATION_SECONDS.time():
+        valid_signature = signature_verifier.check_signature(
+            request_body, signature, schema.event.created
+        )
+    if not valid_signature:
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid signature")
 
 
-def valid_workspace(schema: WebhookRequest):
-    return schema.event.workspaceId == settings.STARK_PROJECT_ID
+async def validate_webhook(
+    request: Request,
+    schema: WebhookRequest,
+    workspace=Depends(get_workspace),
+    redis_read_client=Depends(get_redis_read_client),
+    event_replay_filter=Depends(get_event_replay_filter),
+    processed_events=Depends(get_processed_events_cache),
+    signature_verifier=Depends(get_signature_verifier),
+):
+    """
+    Runs the validation stages cheapest first, so the ECDSA verification
+    only runs for requests that can still succeed. The earlier stages have
+    no side effects, so nothing is done for a request that is not signed.
+    """
+    # for the records of the rest of the request, in its own context
+    current_event_id.set(schema.event.id)
+    stages = (
+        ("age", lambda: validate_event_age(schema)),
+        ("workspace", lambda: validate_workspace(workspace)),
+        (
+            "dedupe",
+            lambda: validate_not_already_processed(
+                schema,
+                workspace,
+                redis_read_client,
+                event_replay_filter,
+                processed_events,
+            ),
+        ),
+        ("signature", lambda: validate_signature(request, schema, signature_verifier)),
+    )
+
+    for stage, validate in stages:
+        try:
+            await validate()
+        except HTTPException as e:
+            WEBHOOK_REJECTIONS_TOTAL.labels(stage).inc()
+            logger.debug(
+                "Rejected event by %s: %s",
+                stage,
+                e.detail,
+                extra={"stage": stage, "status_code": e.status_code},
+            )
+            raise
 
 
 @router.post(
     "/starkbank",
     dependencies=[
-        Depends(validate_signature),
-        Depends(validate_event_age),
-        Depends(validate_not_already_processed),
-        Depends(valid_workspace),
+        Depends(track_webhook),
+        Depends(admit_webhook),
+        Depends(validate_webhook),
+        Depends(limit_webhook_rate),
     ],
 )
 async def starkbank_webhook(
     schema: WebhookRequest,
+    workspace=Depends(get_workspace),
     redis_client=Depends(get_redis_client),
+    event_replay_filter=Depends(get_event_replay_filter),
+    processed_events=Depends(get_processed_events_cache),
+    singleflight=Depends(get_webhook_singleflight),
+    transfer_outbox=Depends(get_transfer_outbox),
+    archive_writer=Depends(get_event_archive_writer),
+    transfer_sweeper=Depends(get_webhook_transfer_sweeper),
 ):
     if schema.event.subscription != "invoice" or schema.event.log["type"] != "credited":
+        archive_event(archive_writer, schema.event, EventOutcome.SKIPPED)
         return
 
-    transfer_sender = StarkBankTransferSender(settings.starkbank_project)
-    transfer_amount = (
-        schema.event.log["invoice"]["amount"] - schema.event.log["invoice"]["fee"]
-    )
+    async def send_transfer(transfer_amount: int):
+        from app.services.transfer_service.implementation import (
+            StarkBankTransferSender,
+        )
 
-    transfer = Transfer(
-        account=settings.default_account,
-        amount=transfer_amount,
-    )
+        # ahead of the background jobs in the Stark Bank rate limiter
+        transfer_sender = StarkBankTransferSender(
+            workspace.project,
+            get_starkbank_caller("transfer", workspace),
+            high_priority=True,
+        )
+        transfer = credited_invoice_transfer(
+            workspace.default_account,
+            transfer_amount,
+            schema.event.id,
+            schema.event.log["invoice"].get("id"),
+        )
+
+        try:
+            # off the event loop, so other requests (and copies of this
+            # event waiting on the singleflight) keep being served
+            await run_in_threadpool(transfer_sender.send, transfer)
+        except Exception as e:
+            archive_event(
+                archive_writer, schema.event, EventOutcome.FAILED, transfer_amount
+            )
+            if isinstance(e, (CircuitOpenError, RateLimitedError)):
+                # fail fast, Stark Bank will deliver the event again later
+                logger.warning("Stark Bank is unavailable, event left for later: %s", e)
+                raise HTTPException(
+                    status_code=503,
+                    detail="Stark Bank is unavailable, try again later",
+                )
+            logger.exception("Could not transfer event %s", schema.event.id)
+            raise
+
+    async def process_credited_invoice():
+        transfer_amount = (
+            schema.event.log["invoice"]["amount"] - schema.event.log["invoice"]["fee"]
+        )
+
+        if transfer_sweeper is not None:
+            # paid with the other credits of the account by the next sweep
+            transfer_sweeper.credit(
+                workspace.default_account, schema.event.id, transfer_amount
+            )
+            outcome = EventOutcome.QUEUED
+        elif transfer_outbox is not None:
+            # sent by the worker role, the webhook does not wait for Stark Bank
+            transfer_outbox.push(
+                {
+                    "workspace_id": workspace.workspace_id,
+                    "event_id": schema.event.id,
+                    "invoice_id": schema.event.log["invoice"].get("id"),
+                    "created": schema.event.created.isoformat(),
+                    "amount": transfer_amount,
+                }
+            )
+            outcome = EventOutcome.QUEUED
+        else:
+            await send_transfer(transfer_amount)
+            outcome = EventOutcome.TRANSFERRED
+        archive_event(archive_writer, schema.event, outcome, transfer_amount)
+        logger.debug(
+            "Handled event: %s",
+            outcome.value,
+            extra={"outcome": outcome.value, "amount": transfer_amount},
+        )
 
-    transfer_sender.send(transfer)
+        key = workspace.key(f"webhook:event:{schema.event.id}")
+        with REDIS_OPERATION_SECONDS.labels("set").time():
+            redis_client.set(
+                key, "1", ex=int(settings.processed_event_ttl.total_seconds())
+            )
+        if event_replay_filter is not None:
+            with REDIS_OPERATION_SECONDS.labels("bloom_add").time():
+                event_replay_filter.add(schema.event.id)
+        processed_events.add(schema.event.id)
+
+    # a copy may have finished while this one was being validated
+    if processed_events.contains(schema.event.id):
+        raise HTTPException(
+            status_code=409,
+            detail="Event already processed",
+        )
 
-    key = f"webhook:event:{schema.event.id}"
-    redis_client.set(key, "1", ex=int(settings.max_event_age.total_seconds()))
+    # concurrent copies of the same event wait for the one already in flight
+    _, shared = await singleflight.do(schema.event.id, process_credited_invoice)
+    if shared:
+        raise HTTPException(
+            status_code=409,
+            detail="Event already processed",
+        )
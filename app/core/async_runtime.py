@@ -0,0 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from app.core.config import settings
+from app.core.redis_client import get_redis_pool_registry
+
+
+def get_async_redis_client():
+    # bound to the event loop that uses it first, the application's
+    return get_redis_pool_registry().client("async")
+
+
+@lru_cache(maxsize=1)
+def get_starkbank_executor() -> ThreadPoolExecutor:
+    # the SDK is blocking, async code runs its calls here: this bounds the
+    # threads they take instead of one per call
+    return ThreadPoolExecutor(
+        max_workers=settings.STARKBANK_MAX_CONCURRENT_CALLS,
+        thread_name_prefix="starkbank",
+    )
@@ -1,12 +1,13 @@
-from typing import Literal
-from pydantic import Field, model_validator, ConfigDict
+from typing import TYPE_CHECKING, Literal, Optional
+from functools import lru_cache
+from pydantic import BaseModel, Field, model_validator, ConfigDict
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
-import starkbank
 from app.models.types import Account, AccountType
 from datetime import timedelta
 
-load_dotenv()
+if TYPE_CHECKING:
+    import starkbank
 
 
 def construct_private_key(ec_parameters: str, ec_private_key: str) -> str:
@@ -23,28 +24,222 @@ def construct_private_key(ec_parameters: str, ec_private_key: str) -> str:
 -----END EC PRIVATE KEY-----"""
 
 
+class WorkspaceSettings(BaseModel):
+    """
+    A Stark Bank workspace served besides the STARK_PROJECT_ID one. Unset
+    fields fall back to the settings of the main workspace.
+    """
+
+    project_id: str
+    # the id Stark Bank gives the workspace, sent in its events
+    workspace_id: str
+    ec_parameters: str
+    ec_private_key: str
+    environment: Optional[Literal["sandbox", "production"]] = None
+    default_account: Optional[Account] = None
+    rate_limits: Optional[dict[str, float]] = None
+    # prefix of its Redis keys, the project id when unset
+    namespace: Optional[str] = Field(default=None, pattern=r"^[A-Za-z0-9_\-]+$")
+
+
+class RedisPoolSettings(BaseModel):
+    """
+    Size and timeouts of a named Redis connection pool of each process.
+    """
+
+    max_connections: int = Field(default=50, gt=0)
+    # waiting for a free connection, once all of them are in use
+    timeout: float = Field(default=5, gt=0)
+    # above the 5 seconds the outbox worker blocks waiting for items
+    socket_timeout: float = Field(default=10, gt=0)
+    socket_connect_timeout: float = Field(default=2, gt=0)
+    # idle connections are pinged before reuse after this many seconds
+    health_check_interval: int = Field(default=30, ge=0)
+
+
 class Settings(BaseSettings):
     model_config = ConfigDict(env_file=".env", case_sensitive=True)
 
     ENVIRONMENT: Literal["development", "production"]
     STARK_ENVIRONMENT: Literal["sandbox", "production"]
     STARK_PROJECT_ID: str
+    # the workspace the project belongs to, not the same id as the project
+    STARK_WORKSPACE_ID: str
     STARKBANK_EC_PARAMETERS: str
     STARKBANK_EC_PRIVATE_KEY: str
     API_EXTERNAL_URL: str
+    APP_ROLE: Literal["all", "api", "scheduler", "worker"] = Field(default="all")
+    WEBHOOK_TRANSFER_MODE: Literal["inline", "outbox"] = Field(default="inline")
+    METRICS_PORT: int = Field(default=8000)
+    JOB_RUNTIME: Literal["thread", "asyncio"] = Field(default="thread")
+    STARKBANK_MAX_CONCURRENT_CALLS: int = Field(default=8, gt=0)
+    # within gunicorn's GRACEFUL_TIMEOUT and the ECS stop timeout (30s)
+    SHUTDOWN_DRAIN_SECONDS: float = Field(default=20, ge=0)
+    LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR"] = Field(default="INFO")
+    # share of the debug records written, the webhook logs one per request
+    LOG_DEBUG_SAMPLE_RATE: float = Field(default=0.01, ge=0, le=1)
+    # records waiting to be written, new ones are dropped beyond that
+    LOG_QUEUE_SIZE: int = Field(default=10000, gt=0)
+    # how often the readiness snapshot served by /health/ready is refreshed
+    HEALTH_CHECK_INTERVAL_SECONDS: float = Field(default=5, gt=0)
     REDIS_URL: str = Field(default="redis://localhost:6379/0")
+    # with sentinel, REDIS_URL only gives the password, database and TLS
+    REDIS_MODE: Literal["standalone", "sentinel", "cluster"] = Field(
+        default="standalone"
+    )
+    REDIS_SENTINELS: list[str] = Field(default=[])
+    REDIS_SENTINEL_SERVICE: str = Field(default="mymaster")
+    # read-only checks go to replicas: REDIS_REPLICA_URL (e.g. the ElastiCache
+    # reader endpoint) when standalone, the replicas of the topology otherwise
+    REDIS_READ_FROM_REPLICAS: bool = Field(default=False)
+    REDIS_REPLICA_URL: Optional[str] = Field(default=None)
+    # by pool name: default, replica and async
+    REDIS_POOLS: dict[str, RedisPoolSettings] = Field(default={})
     DEFAULT_BANK_CODE: str = Field(default="20018183")
     DEFAULT_BRANCH: str = Field(default="0001")
     DEFAULT_ACCOUNT: str = Field(default="6341320293482496")
     DEFAULT_NAME: str = Field(default="Stark Bank S.A.")
     DEFAULT_TAX_ID: str = Field(default="20.018.183/0001-80")
     DEFAULT_ACCOUNT_TYPE: AccountType = Field(default="payment")
+    ADMIN_TOKEN: Optional[str] = Field(default=None)
+    METRICS_TOKEN: Optional[str] = Field(default=None)
+    STARKBANK_REQUEST_TIMEOUT_SECONDS: float = Field(default=10, gt=0)
+    STARKBANK_CALL_DEADLINE_SECONDS: float = Field(default=30, gt=0)
+    STARKBANK_MAX_ATTEMPTS: int = Field(default=3, ge=1)
+    STARKBANK_RETRY_BASE_DELAY_SECONDS: float = Field(default=0.2, ge=0)
+    STARKBANK_RETRY_MAX_DELAY_SECONDS: float = Field(default=5, ge=0)
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = Field(default=5, ge=1)
+    CIRCUIT_BREAKER_RECOVERY_SECONDS: float = Field(default=30, gt=0)
+    # requests per second shared by the whole fleet, per Stark Bank resource
+    STARKBANK_RATE_LIMITS: dict[str, float] = Field(
+        default={"invoice": 5, "transfer": 5, "event": 10}
+    )
+    STARKBANK_RATE_LIMIT_BURST: int = Field(default=10, ge=1)
+    STARKBANK_RATE_LIMIT_PRIORITY_RESERVE: int = Field(default=3, ge=0)
+    STARKBANK_RATE_LIMIT_RECOVERY_SECONDS: float = Field(default=60, gt=0)
+    PROCESSED_EVENTS_CACHE_SIZE: int = Field(default=10000, gt=0)
+    WEBHOOK_RATE_LIMIT_PER_SECOND: float = Field(default=20, gt=0)
+    WEBHOOK_RATE_LIMIT_BURST: int = Field(default=100, ge=1)
+    WEBHOOK_MAX_CONCURRENCY: int = Field(default=32, gt=0)
+    EVENT_REPLAY_FILTER_ENABLED: bool = Field(default=False)
+    EVENT_REPLAY_FILTER_CAPACITY: int = Field(default=250000, gt=0)
+    EVENT_REPLAY_FILTER_ERROR_RATE: float = Field(default=0.001, gt=0, lt=1)
+    EVENT_REPLAY_FILTER_BUCKET_SECONDS: int = Field(default=6 * 3600, gt=0)
+    EVENT_REPLAY_FILTER_RETENTION_SECONDS: int = Field(default=3 * 24 * 3600, gt=0)
+    # credited invoices are netted into one transfer per interval or threshold
+    TRANSFER_SWEEP_ENABLED: bool = Field(default=False)
+    TRANSFER_SWEEP_INTERVAL_SECONDS: int = Field(default=3600, gt=0)
+    TRANSFER_SWEEP_THRESHOLD: int = Field(default=100000000, gt=0, lt=10000000000)
+    TRANSFER_SWEEP_CHECK_SECONDS: int = Field(default=60, gt=0)
+    # "distributed" queues the undelivered events for every scheduler of
+    # the fleet to process, instead of one process handling all of them
+    RECONCILIATION_MODE: Literal["local", "distributed"] = Field(default="local")
+    RECONCILIATION_BATCH_SIZE: int = Field(default=10, gt=0)
+    RECONCILIATION_VISIBILITY_TIMEOUT_SECONDS: int = Field(default=300, gt=0)
+    RECONCILIATION_RETRY_DELAY_SECONDS: int = Field(default=60, ge=0)
+    # failures of an event, Stark Bank being unavailable aside, before it is
+    # moved to the dead letters of the queue
+    RECONCILIATION_MAX_ATTEMPTS: int = Field(default=5, ge=1)
+    RECONCILIATION_POLL_SECONDS: int = Field(default=10, gt=0)
+    # undelivered events are fetched while the previous pages are handled,
+    # up to STARKBANK_EVENTS_READ_AHEAD_PAGES ahead (0 fetches on demand)
+    STARKBANK_EVENTS_PAGE_SIZE: int = Field(default=100, ge=1, le=100)
+    STARKBANK_EVENTS_READ_AHEAD_PAGES: int = Field(default=2, ge=0)
+    # SQLite file recording every handled event, disabled when unset
+    EVENT_ARCHIVE_PATH: Optional[str] = Field(default=None)
+    # other workspaces served by this deployment, as a JSON list
+    STARK_WORKSPACES: list[WorkspaceSettings] = Field(default=[])
 
     @model_validator(mode="after")
     def validate_default_account(self):
         self.default_account
         return self
 
+    @model_validator(mode="after")
+    def validate_webhook_transfer_mode(self):
+        if self.WEBHOOK_TRANSFER_MODE == "outbox" and self.APP_ROLE == "all":
+            raise ValueError(
+                "WEBHOOK_TRANSFER_MODE outbox needs a separate worker role"
+            )
+        if self.WEBHOOK_TRANSFER_MODE == "outbox" and self.TRANSFER_SWEEP_ENABLED:
+            raise ValueError(
+                "TRANSFER_SWEEP_ENABLED replaces the transfers of WEBHOOK_TRANSFER_MODE outbox"
+            )
+        return self
+
+    @model_validator(mode="after")
+    def validate_redis(self):
+        if self.REDIS_MODE == "sentinel" and not self.REDIS_SENTINELS:
+            raise ValueError("REDIS_MODE sentinel needs REDIS_SENTINELS")
+        if (
+            self.REDIS_MODE == "standalone"
+            and self.REDIS_READ_FROM_REPLICAS
+            and not self.REDIS_REPLICA_URL
+        ):
+            raise ValueError("REDIS_READ_FROM_REPLICAS needs REDIS_REPLICA_URL")
+        return self
+
+    @model_validator(mode="after")
+    def validate_workspaces(self):
+        project_ids = [self.STARK_PROJECT_ID] + [
+            workspace.project_id for workspace in self.STARK_WORKSPACES
+        ]
+        if len(set(project_ids)) != len(project_ids):
+            raise ValueError("STARK_WORKSPACES must not repeat a project id")
+        workspace_ids = [self.STARK_WORKSPACE_ID] + [
+            workspace.workspace_id for workspace in self.STARK_WORKSPACES
+        ]
+        if len(set(workspace_ids)) != len(workspace_ids):
+            raise ValueError("STARK_WORKSPACES must not repeat a workspace id")
+        namespaces = [
+            workspace.namespace or workspace.project_id
+            for workspace in self.STARK_WORKSPACES
+        ]
+        if len(set(namespaces)) != len(namespaces):
+            raise ValueError("STARK_WORKSPACES must not repeat a namespace")
+        return self
+
+    @model_validator(mode="after")
+    def validate_starkbank_rate_limits(self):
+        rate_limits = [self.STARKBANK_RATE_LIMITS] + [
+            workspace.rate_limits
+            for workspace in self.STARK_WORKSPACES
+            if workspace.rate_limits is not None
+        ]
+        if any(rate <= 0 for limits in rate_limits for rate in limits.values()):
+            raise ValueError("STARKBANK_RATE_LIMITS must be positive")
+        if (
+            self.STARKBANK_RATE_LIMIT_PRIORITY_RESERVE
+            >= self.STARKBANK_RATE_LIMIT_BURST
+        ):
+            raise ValueError(
+                "STARKBANK_RATE_LIMIT_PRIORITY_RESERVE must be below STARKBANK_RATE_LIMIT_BURST"
+            )
+        return self
+
+    @model_validator(mode="after")
+    def validate_reconciliation(self):
+        # the visibility of the rest of a batch is extended before each event
+        if (
+            self.RECONCILIATION_VISIBILITY_TIMEOUT_SECONDS
+            < self.max_event_handling_time.total_seconds()
+        ):
+            raise ValueError(
+                "RECONCILIATION_VISIBILITY_TIMEOUT_SECONDS must cover the two Stark Bank calls of an event, each of STARKBANK_CALL_DEADLINE_SECONDS plus STARKBANK_REQUEST_TIMEOUT_SECONDS"
+            )
+        return self
+
+    @model_validator(mode="after")
+    def validate_event_replay_filter(self):
+        if self.EVENT_REPLAY_FILTER_ENABLED and (
+            self.EVENT_REPLAY_FILTER_RETENTION_SECONDS
+            < self.max_event_age.total_seconds()
+        ):
+            raise ValueError(
+                "EVENT_REPLAY_FILTER_RETENTION_SECONDS must cover the maximum event age"
+            )
+        return self
+
     @property
     def max_event_age(self) -> timedelta:
         """
@@ -64,6 +259,64 @@ class Settings(BaseSettings):
         within this window, giving us 2 opportunities to process the event.
         The second and third retries will not be handled, but we have
         a job that processes undelivered events once per day.
+
+        With the event replay filter enabled, processed event ids are
+        remembered in a fixed-size Bloom filter for much longer, so the
+        window is extended to the last retry (5 + 30 + 120 = 155 minutes
+        after the first attempt) plus some clock skew.
+        """
+        if self.EVENT_REPLAY_FILTER_ENABLED:
+            return timedelta(minutes=165)
+        return timedelta(seconds=420)
+
+    @property
+    def max_event_handling_time(self) -> timedelta:
+        """
+        The longest a job may take to handle one event: its two Stark Bank
+        calls (the transfer and marking it delivered) may each start a last
+        attempt just before their deadline.
+        """
+        return timedelta(
+            seconds=2
+            * (
+                self.STARKBANK_CALL_DEADLINE_SECONDS
+                + self.STARKBANK_REQUEST_TIMEOUT_SECONDS
+            )
+        )
+
+    @property
+    def event_lock_ttl(self) -> timedelta:
+        """
+        How long the lock of an event handled by a job is kept if the job
+        never unlocks it, e.g. the process stopped while handling it. Twice
+        the longest handling, so a lock is never lost while its event is
+        still being handled.
+        """
+        return 2 * self.max_event_handling_time
+
+    @property
+    def outbox_heartbeat_ttl(self) -> timedelta:
+        """
+        A worker refreshes its heartbeat each time it waits for an item, up
+        to 5 seconds, then sends its transfer: one Stark Bank call, which
+        may start a last attempt just before its deadline. Doubled, so the
+        items of a worker still sending are never handed to another one.
+        """
+        return timedelta(
+            seconds=2
+            * (
+                5
+                + self.STARKBANK_CALL_DEADLINE_SECONDS
+                + self.STARKBANK_REQUEST_TIMEOUT_SECONDS
+            )
+        )
+
+    @property
+    def processed_event_ttl(self) -> timedelta:
+        """
+        How long the exact "event processed" key is kept. It covers the
+        bursts of duplicated deliveries; older replays are caught by the
+        event replay filter, when enabled.
         """
         return timedelta(seconds=420)
 
@@ -83,7 +336,9 @@ class Settings(BaseSettings):
         return f"{self.API_EXTERNAL_URL}/api/v1/webhooks/starkbank"
 
     @property
-    def starkbank_project(self) -> starkbank.Project:
+    def starkbank_project(self) -> "starkbank.Project":
+        import starkbank
+
         return starkbank.Project(
             environment=self.STARK_ENVIRONMENT,
             id=self.STARK_PROJECT_ID,
@@ -94,4 +349,24 @@ class Settings(BaseSettings):
         )
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    load_dotenv()
+    return Settings()
+
+
+class LazySettings:
+    """
+    Stands in for the Settings instance, which is only built (reading .env
+    and the environment) the first time a setting is used instead of when
+    this module is imported.
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(get_settings(), name, value)
+
+
+settings = LazySettings()
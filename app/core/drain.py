@@ -0,0 +1,44 @@
+from functools import lru_cache
+import logging
+import time
+from app.services.drain.implementation import DrainTracker
+
+WEBHOOK = "webhook"
+JOBS = "jobs"
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_drain_tracker(name: str) -> DrainTracker:
+    # one per kind of work in the process, shared by everything doing it
+    return DrainTracker(name)
+
+
+def drain_all(timeout: float, names=(WEBHOOK, JOBS)) -> dict[str, tuple[int, int]]:
+    """
+    Stops all new work at once, then waits for the work in flight, all
+    within `timeout` seconds. Blocks, so it must not run on the event loop
+    the work runs on.
+    """
+    deadline = time.monotonic() + timeout
+    trackers = [get_drain_tracker(name) for name in names]
+    for tracker in trackers:
+        tracker.stop_accepting()
+
+    report = {}
+    for tracker in trackers:
+        report[tracker.name] = tracker.drain(max(0, deadline - time.monotonic()))
+        drained, abandoned = report[tracker.name]
+        logger.info(
+            "Drained %s: %d finished, %d abandoned",
+            tracker.name,
+            drained,
+            abandoned,
+            extra={
+                "tracker": tracker.name,
+                "finished": drained,
+                "abandoned": abandoned,
+            },
+        )
+    return report
@@ -0,0 +1,27 @@
+from functools import lru_cache
+from typing import Optional
+import atexit
+from app.core.config import settings
+from app.services.event_archive.implementation import (
+    BatchedEventArchiveWriter,
+    SQLiteEventArchive,
+)
+
+
+@lru_cache(maxsize=1)
+def get_event_archive() -> Optional[SQLiteEventArchive]:
+    if not settings.EVENT_ARCHIVE_PATH:
+        return None
+    return SQLiteEventArchive(settings.EVENT_ARCHIVE_PATH)
+
+
+@lru_cache(maxsize=1)
+def get_event_archive_writer() -> Optional[BatchedEventArchiveWriter]:
+    archive = get_event_archive()
+    if archive is None:
+        return None
+
+    writer = BatchedEventArchiveWriter(archive)
+    # writes what is still queued when the process exits
+    atexit.register(writer.close)
+    return writer
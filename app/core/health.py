@@ -0,0 +1,78 @@
+import time
+from typing import Optional
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+from app.core.resilience import get_starkbank_circuit_breaker
+from app.core.workspaces import get_workspace_registry, get_workspace_signature_verifier
+from app.services.health_monitor.implementation import HealthMonitor
+from app.services.resilience.implementation import CircuitBreaker
+
+BREAKER_STATES = {
+    CircuitBreaker.CLOSED: "closed",
+    CircuitBreaker.HALF_OPEN: "half_open",
+    CircuitBreaker.OPEN: "open",
+}
+
+
+def check_redis() -> dict:
+    start = time.perf_counter()
+    get_redis_client().ping()
+    return {"latency_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+def check_public_keys() -> dict:
+    # fetched on the first check when the webhook has not needed them yet,
+    # a failure is tried again on the next one. Per workspace: one that
+    # cannot load its keys only fails its own webhooks
+    workspaces = {}
+    for workspace in get_workspace_registry():
+        try:
+            get_workspace_signature_verifier(workspace)
+        except Exception as e:
+            workspaces[workspace.workspace_id] = str(e) or type(e).__name__
+        else:
+            workspaces[workspace.workspace_id] = "loaded"
+    return {
+        "ok": all(state == "loaded" for state in workspaces.values()),
+        "workspaces": workspaces,
+    }
+
+
+def check_starkbank() -> dict:
+    # from the circuit breakers: probing the API from every worker would
+    # spend the rate limits of the actual calls
+    states = {
+        resource: BREAKER_STATES[get_starkbank_circuit_breaker(resource).state]
+        for resource in settings.STARKBANK_RATE_LIMITS
+    }
+    return {"ok": "open" not in states.values(), "circuit_breakers": states}
+
+
+def scheduler_check(scheduler):
+    def check_scheduler() -> dict:
+        if scheduler is None:
+            return {"enabled": False}
+        if not scheduler.running:
+            raise RuntimeError("The scheduler is not running")
+        return {"enabled": True, "jobs": len(scheduler.get_jobs())}
+
+    return check_scheduler
+
+
+def create_health_monitor(scheduler: Optional[object] = None) -> HealthMonitor:
+    """
+    The monitor of an API process, `scheduler` being the one it runs the
+    jobs with, if any. Stark Bank being unavailable, or the public keys of
+    a workspace, only degrades it: the whole fleet depends on them, taking
+    every task out would not help.
+    """
+    return HealthMonitor(
+        {
+            "redis": check_redis,
+            "public_keys": check_public_keys,
+            "scheduler": scheduler_check(scheduler),
+            "starkbank": check_starkbank,
+        },
+        required=("redis", "scheduler"),
+        interval=settings.HEALTH_CHECK_INTERVAL_SECONDS,
+    )
@@ -0,0 +1,90 @@
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import AsyncIterator, Iterator, Optional
+import asyncio
+import logging
+from app.core.metrics import JOB_DURATION_SECONDS, JOB_EVENTS_TOTAL
+from app.core.redis_client import get_redis_client
+from app.services.job_history.implementation import JobRun, RedisJobHistory
+
+logger = logging.getLogger(__name__)
+
+# the run of the job being executed, counting the items it handles
+current_job_run: ContextVar[Optional[JobRun]] = ContextVar(
+    "current_job_run", default=None
+)
+
+
+@lru_cache(maxsize=1)
+def get_job_history() -> RedisJobHistory:
+    return RedisJobHistory(get_redis_client())
+
+
+@contextmanager
+def record_job_run(job: str) -> Iterator[JobRun]:
+    """
+    Records a run of `job` in the history, with its duration, what it
+    counted with `count_job_events` and the exception that ended it.
+    """
+    history = get_job_history()
+    run = history.start(job)
+    token = current_job_run.set(run)
+    try:
+        with JOB_DURATION_SECONDS.labels(job).time():
+            yield run
+    except BaseException as e:
+        finish_job_run(history, run, e)
+        raise
+    else:
+        finish_job_run(history, run)
+    finally:
+        current_job_run.reset(token)
+
+
+@asynccontextmanager
+async def record_job_run_async(job: str) -> AsyncIterator[JobRun]:
+    """
+    Same as `record_job_run`, for the jobs running on an event loop: the
+    run is published from the thread of the history, and the loop only
+    waits for it, without blocking, once the run is over.
+    """
+    history = get_job_history()
+    run = history.start(job, background=True)
+    token = current_job_run.set(run)
+    try:
+        with JOB_DURATION_SECONDS.labels(job).time():
+            yield run
+    except BaseException as e:
+        finish_job_run(history, run, e)
+        raise
+    else:
+        finish_job_run(history, run)
+    finally:
+        current_job_run.reset(token)
+        await asyncio.wrap_future(history.flush())
+
+
+def finish_job_run(
+    history: RedisJobHistory, run: JobRun, error: Optional[BaseException] = None
+) -> None:
+    history.finish(run, error)
+    if error is not None:
+        logger.error(
+            "Job run failed", exc_info=error, extra={"counts": dict(run.counts)}
+        )
+    else:
+        logger.info(
+            "Job run finished",
+            extra={
+                "counts": dict(run.counts),
+                "seconds": run.finished_at - run.started_at,
+            },
+        )
+
+
+def count_job_events(job: str, outcome: str, amount: int = 1) -> None:
+    JOB_EVENTS_TOTAL.labels(job, outcome).inc(amount)
+    run = current_job_run.get()
+    if run is not None:
+        run.count(outcome, amount)
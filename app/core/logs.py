@@ -0,0 +1,104 @@
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+import atexit
+import logging
+import sys
+import uuid
+
+from app.core.config import settings
+from app.core.job_history import current_job_run
+from app.services.structured_logging.implementation import (
+    ContextFilter,
+    DebugSampler,
+    JsonFormatter,
+    LogPipeline,
+)
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# correlation ids of what the current thread or task is working on, the run
+# of a job coming from the job history
+current_request_id: ContextVar[Optional[str]] = ContextVar(
+    "current_request_id", default=None
+)
+current_event_id: ContextVar[Optional[str]] = ContextVar(
+    "current_event_id", default=None
+)
+
+
+def log_context() -> dict:
+    context = {}
+    request_id = current_request_id.get()
+    if request_id is not None:
+        context["request_id"] = request_id
+    event_id = current_event_id.get()
+    if event_id is not None:
+        context["event_id"] = event_id
+    run = current_job_run.get()
+    if run is not None:
+        context["job"] = run.job
+        context["job_run_id"] = run.run_id
+    return context
+
+
+@lru_cache(maxsize=1)
+def configure_logging() -> LogPipeline:
+    """
+    Sends the records of every logger to stdout as JSON lines, written by a
+    background thread: logging from the event loop only enqueues. Called
+    once the process runs, so the thread is not lost to the fork of the
+    gunicorn workers.
+    """
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    pipeline = LogPipeline(output, max_pending=settings.LOG_QUEUE_SIZE)
+    # in the thread that logs, before the record is queued
+    pipeline.handler.addFilter(DebugSampler(settings.LOG_DEBUG_SAMPLE_RATE))
+    pipeline.handler.addFilter(ContextFilter(log_context))
+
+    root = logging.getLogger()
+    root.addHandler(pipeline.handler)
+    root.setLevel(settings.LOG_LEVEL)
+    # the runs of the jobs are logged by record_job_run, with their counts
+    logging.getLogger("apscheduler").setLevel(logging.WARNING)
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    return pipeline
+
+
+class RequestIdMiddleware:
+    """
+    Gives every request an id, the one of its X-Request-ID header if any,
+    for its log records, and returns it in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:128]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER, request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        token = current_request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            current_request_id.reset(token)
@@ -0,0 +1,242 @@
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess, start_http_server
+
+SIGNATURE_VERIFICATION_SECONDS = Histogram(
+    "starkbank_signature_verification_seconds",
+    "Time spent verifying the Digital-Signature of Stark Bank webhooks",
+)
+
+REDIS_OPERATION_SECONDS = Histogram(
+    "redis_operation_seconds",
+    "Time spent on Redis operations",
+    ["operation"],
+)
+
+REDIS_POOL_CONNECTIONS_IN_USE = Gauge(
+    "redis_pool_connections_in_use",
+    "Connections of a named Redis pool currently checked out",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+REDIS_POOL_MAX_CONNECTIONS = Gauge(
+    "redis_pool_max_connections",
+    "Connections a named Redis pool may open",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+REDIS_POOL_WAIT_SECONDS = Histogram(
+    "redis_pool_wait_seconds",
+    "Time taken to check out a connection of a named Redis pool, waiting for a free one or opening it",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+
+REDIS_POOL_CONNECTIONS_CREATED_TOTAL = Counter(
+    "redis_pool_connections_created_total",
+    "Connections opened by a named Redis pool",
+    ["pool"],
+)
+
+STARKBANK_REQUEST_SECONDS = Histogram(
+    "starkbank_request_seconds",
+    "Time spent on Stark Bank SDK calls",
+    ["resource", "method"],
+)
+
+WEBHOOK_REQUEST_SECONDS = Histogram(
+    "webhook_request_seconds",
+    "End-to-end latency of the Stark Bank webhook endpoint",
+    ["status_code"],
+)
+
+WEBHOOK_REJECTIONS_TOTAL = Counter(
+    "webhook_rejections_total",
+    "Stark Bank webhooks rejected, by the validation stage that rejected them",
+    ["stage"],
+)
+
+JOB_DURATION_SECONDS = Histogram(
+    "job_duration_seconds",
+    "Duration of scheduled job runs",
+    ["job"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+JOB_EVENTS_TOTAL = Counter(
+    "job_events_total",
+    "Items handled by scheduled jobs",
+    ["job", "outcome"],
+)
+
+STARKBANK_RETRIES_TOTAL = Counter(
+    "starkbank_retries_total",
+    "Stark Bank SDK calls retried after a transient failure",
+    ["resource", "method", "reason"],
+)
+
+STARKBANK_DUPLICATE_TRANSFERS_TOTAL = Counter(
+    "starkbank_duplicate_transfers_total",
+    "Transfers refused by Stark Bank for a reused external id, counted as sent",
+)
+
+CIRCUIT_BREAKER_STATE = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["breaker"],
+    multiprocess_mode="livemax",
+)
+
+CIRCUIT_BREAKER_REJECTIONS_TOTAL = Counter(
+    "circuit_breaker_rejections_total",
+    "Calls failed fast because the circuit breaker was open",
+    ["breaker"],
+)
+
+EVENT_REPLAY_FILTER_UNCONFIRMED_TOTAL = Counter(
+    "event_replay_filter_unconfirmed_total",
+    "Webhook events rejected on a replay filter hit without an exact match",
+)
+
+NEAR_CACHE_REQUESTS_TOTAL = Counter(
+    "near_cache_requests_total",
+    "Lookups on in-process near caches",
+    ["cache", "result"],
+)
+
+SINGLEFLIGHT_COALESCED_TOTAL = Counter(
+    "singleflight_coalesced_total",
+    "Calls that waited for an identical in-flight call instead of running",
+    ["group"],
+)
+
+
+RATE_LIMITER_TOKENS = Gauge(
+    "rate_limiter_tokens",
+    "Tokens left in a shared rate limiter bucket when last checked",
+    ["limiter"],
+    multiprocess_mode="livemostrecent",
+)
+
+RATE_LIMITER_CAPACITY = Gauge(
+    "rate_limiter_capacity",
+    "Burst capacity of a shared rate limiter bucket",
+    ["limiter"],
+    multiprocess_mode="livemax",
+)
+
+RATE_LIMITER_REFILL_RATE = Gauge(
+    "rate_limiter_refill_rate",
+    "Tokens per second currently added to a shared rate limiter bucket",
+    ["limiter"],
+    multiprocess_mode="livemostrecent",
+)
+
+RATE_LIMITER_REJECTIONS_TOTAL = Counter(
+    "rate_limiter_rejections_total",
+    "Calls rejected because a shared rate limiter bucket was empty",
+    ["limiter"],
+)
+
+RATE_LIMITER_PENALTIES_TOTAL = Counter(
+    "rate_limiter_penalties_total",
+    "Times the refill rate of a shared rate limiter was cut after a 429",
+    ["limiter"],
+)
+
+RATE_LIMITER_WAIT_SECONDS = Histogram(
+    "rate_limiter_wait_seconds",
+    "Time callers waited for a token of a shared rate limiter",
+    ["limiter", "priority"],
+)
+
+CONCURRENCY_LIMITER_IN_FLIGHT = Gauge(
+    "concurrency_limiter_in_flight",
+    "Calls currently admitted by a per-worker concurrency limiter",
+    ["limiter"],
+    multiprocess_mode="livesum",
+)
+
+CONCURRENCY_LIMITER_LIMIT = Gauge(
+    "concurrency_limiter_limit",
+    "Calls allowed in flight by per-worker concurrency limiters",
+    ["limiter"],
+    multiprocess_mode="livesum",
+)
+
+CONCURRENCY_LIMITER_REJECTIONS_TOTAL = Counter(
+    "concurrency_limiter_rejections_total",
+    "Calls rejected because a per-worker concurrency limit was reached",
+    ["limiter"],
+)
+
+
+WORK_QUEUE_ITEMS = Gauge(
+    "work_queue_items",
+    "Items of a Redis work queue shared by the fleet, when last checked",
+    ["queue", "state"],
+    multiprocess_mode="livemostrecent",
+)
+
+
+EVENT_ARCHIVE_RECORDS_TOTAL = Counter(
+    "event_archive_records_total",
+    "Records submitted to the local event archive, by what happened to them",
+    ["result"],
+)
+
+EVENT_ARCHIVE_FLUSH_SECONDS = Histogram(
+    "event_archive_flush_seconds",
+    "Time spent appending a batch of records to the local event archive",
+)
+
+
+DRAIN_IN_FLIGHT = Gauge(
+    "drain_in_flight",
+    "Units of work in flight that shutdown waits for",
+    ["tracker"],
+    multiprocess_mode="livesum",
+)
+
+DRAIN_WORK_TOTAL = Counter(
+    "drain_work_total",
+    "Work in flight at shutdown, by whether it finished before the deadline",
+    ["tracker", "result"],
+)
+
+
+LOG_RECORDS_TOTAL = Counter(
+    "log_records_total",
+    "Log records not written, sampled out or dropped on a full queue",
+    ["result"],
+)
+
+
+def get_metrics_registry() -> CollectorRegistry:
+    # uvicorn runs several worker processes, each one writing its samples
+    # to PROMETHEUS_MULTIPROC_DIR. Any worker can then serve the aggregate.
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(get_metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int) -> None:
+    # for the roles without an HTTP application
+    start_http_server(port, registry=get_metrics_registry())
@@ -0,0 +1,15 @@
+from functools import lru_cache
+from app.core.config import settings
+from app.core.redis_client import get_redis_client, key_namespace
+from app.services.work_queue.implementation import RedisWorkQueue
+
+
+@lru_cache(maxsize=1)
+def get_reconciliation_queue() -> RedisWorkQueue:
+    # the undelivered events of every workspace, for the whole fleet
+    return RedisWorkQueue(
+        get_redis_client(),
+        key_namespace("reconciliation"),
+        visibility_timeout=settings.RECONCILIATION_VISIBILITY_TIMEOUT_SECONDS,
+        max_attempts=settings.RECONCILIATION_MAX_ATTEMPTS,
+    )
@@ -0,0 +1,162 @@
+from functools import lru_cache, partial
+from urllib.parse import urlparse
+import redis
+from app.core.config import RedisPoolSettings, settings
+from app.services.redis_pool.implementation import (
+    AsyncInstrumentedConnectionPool,
+    AsyncInstrumentedSentinelConnectionPool,
+    InstrumentedConnectionPool,
+    InstrumentedSentinelConnectionPool,
+    RedisPoolRegistry,
+)
+
+
+def sentinel_addresses() -> list[tuple[str, int]]:
+    addresses = []
+    for sentinel in settings.REDIS_SENTINELS:
+        host, _, port = sentinel.rpartition(":")
+        addresses.append((host, int(port)))
+    return addresses
+
+
+def sentinel_arguments() -> dict:
+    # the servers a Sentinel returns are reached with what REDIS_URL says
+    # besides its host, the Sentinels themselves only share its TLS
+    url = urlparse(settings.REDIS_URL)
+    tls = url.scheme == "rediss"
+    arguments = {
+        "sentinels": sentinel_addresses(),
+        "sentinel_kwargs": {"ssl": True} if tls else {},
+        "db": int(url.path.lstrip("/") or 0),
+    }
+    if url.username:
+        arguments["username"] = url.username
+    if url.password:
+        arguments["password"] = url.password
+    if tls:
+        arguments["ssl"] = True
+    return arguments
+
+
+def pool_settings(name: str) -> RedisPoolSettings:
+    return settings.REDIS_POOLS.get(name, RedisPoolSettings())
+
+
+def connection_arguments(name: str) -> dict:
+    pool = pool_settings(name)
+    return {
+        "max_connections": pool.max_connections,
+        "socket_timeout": pool.socket_timeout,
+        "socket_connect_timeout": pool.socket_connect_timeout,
+        "health_check_interval": pool.health_check_interval,
+    }
+
+
+def create_redis_client(name: str = "default", read_only: bool = False):
+    """
+    A client for the configured topology, on a pool sized by the `name`
+    entry of REDIS_POOLS. With `read_only`, one that reads from the
+    replicas when REDIS_READ_FROM_REPLICAS is set: they may lag behind, so
+    it is only for checks that tolerate a stale answer.
+    """
+    replicas = read_only and settings.REDIS_READ_FROM_REPLICAS
+    arguments = connection_arguments(name)
+    if settings.REDIS_MODE == "cluster":
+        from redis.cluster import RedisCluster
+
+        # a pool per node, each one of max_connections
+        return RedisCluster.from_url(
+            settings.REDIS_URL,
+            read_from_replicas=replicas,
+            connection_pool_class=partial(
+                InstrumentedConnectionPool,
+                pool_name=name,
+                timeout=pool_settings(name).timeout,
+            ),
+            **arguments,
+        )
+
+    if settings.REDIS_MODE == "sentinel":
+        from redis.sentinel import Sentinel
+
+        sentinel = Sentinel(**sentinel_arguments())
+        # the Sentinel pools do not wait for a free connection, they fail
+        # once max_connections are in use
+        arguments.update(
+            connection_pool_class=InstrumentedSentinelConnectionPool,
+            pool_name=name,
+        )
+        if replicas:
+            return sentinel.slave_for(settings.REDIS_SENTINEL_SERVICE, **arguments)
+        # follows the failovers, reconnecting to the newly promoted master
+        return sentinel.master_for(settings.REDIS_SENTINEL_SERVICE, **arguments)
+
+    url = settings.REDIS_REPLICA_URL if replicas else settings.REDIS_URL
+    return redis.Redis(
+        connection_pool=InstrumentedConnectionPool.from_url(
+            url, pool_name=name, timeout=pool_settings(name).timeout, **arguments
+        )
+    )
+
+
+def create_async_redis_client(name: str = "async"):
+    import redis.asyncio
+
+    arguments = connection_arguments(name)
+    if settings.REDIS_MODE == "cluster":
+        from redis.asyncio.cluster import RedisCluster
+
+        # keeps its own connections per node, without a pool to instrument
+        return RedisCluster.from_url(settings.REDIS_URL, **arguments)
+
+    if settings.REDIS_MODE == "sentinel":
+        from redis.asyncio.sentinel import Sentinel
+
+        sentinel = Sentinel(**sentinel_arguments())
+        return sentinel.master_for(
+            settings.REDIS_SENTINEL_SERVICE,
+            connection_pool_class=AsyncInstrumentedSentinelConnectionPool,
+            pool_name=name,
+            **arguments,
+        )
+
+    return redis.asyncio.Redis(
+        connection_pool=AsyncInstrumentedConnectionPool.from_url(
+            settings.REDIS_URL,
+            pool_name=name,
+            timeout=pool_settings(name).timeout,
+            **arguments,
+        )
+    )
+
+
+def connect(name: str):
+    if name == "async":
+        return create_async_redis_client(name)
+    return create_redis_client(name, read_only=name == "replica")
+
+
+@lru_cache(maxsize=1)
+def get_redis_pool_registry() -> RedisPoolRegistry:
+    return RedisPoolRegistry(connect)
+
+
+def get_redis_client():
+    return get_redis_pool_registry().client("default")
+
+
+def get_redis_replica_client():
+    if not settings.REDIS_READ_FROM_REPLICAS:
+        return get_redis_client()
+    return get_redis_pool_registry().client("replica")
+
+
+def key_namespace(name: str) -> str:
+    """
+    `name` as the prefix of keys that one Lua script or transaction uses
+    together. On a cluster it becomes a hash tag, so all of them are in the
+    same slot; the other topologies keep the key names they always had.
+    """
+    if settings.REDIS_MODE == "cluster":
+        return f"{{{name}}}"
+    return name
@@ -0,0 +1,74 @@
+from functools import lru_cache
+from typing import Optional
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+from app.core.workspaces import get_workspace_registry
+from app.services.rate_limiter.implementation import RedisTokenBucket
+from app.services.resilience.implementation import (
+    CircuitBreaker,
+    ResilientCaller,
+    RetryPolicy,
+)
+from app.services.workspace_registry.implementation import Workspace
+
+
+def configure_starkbank_sdk() -> None:
+    import starkbank
+
+    starkbank.user = get_workspace_registry().default.project
+    starkbank.timeout = settings.STARKBANK_REQUEST_TIMEOUT_SECONDS
+
+
+def get_starkbank_rate_limiter(
+    resource: str, workspace: Workspace
+) -> Optional[RedisTokenBucket]:
+    rate = workspace.rate_limits.get(resource)
+    if rate is None:
+        return None
+
+    # one budget per resource and workspace, shared by the jobs and every
+    # webhook worker
+    return RedisTokenBucket(
+        get_redis_client(),
+        workspace.key(f"starkbank:{resource}"),
+        rate=rate,
+        capacity=settings.STARKBANK_RATE_LIMIT_BURST,
+        recovery=settings.STARKBANK_RATE_LIMIT_RECOVERY_SECONDS,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_starkbank_circuit_breaker(resource: str) -> CircuitBreaker:
+    # one breaker per Stark Bank resource, shared by every workspace:
+    # an outage of the API is not specific to one of them
+    return CircuitBreaker(
+        f"starkbank_{resource}",
+        failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout=settings.CIRCUIT_BREAKER_RECOVERY_SECONDS,
+    )
+
+
+def get_starkbank_caller(
+    resource: str, workspace: Optional[Workspace] = None
+) -> ResilientCaller:
+    return get_workspace_starkbank_caller(
+        resource, workspace or get_workspace_registry().default
+    )
+
+
+@lru_cache(maxsize=None)
+def get_workspace_starkbank_caller(
+    resource: str, workspace: Workspace
+) -> ResilientCaller:
+    return ResilientCaller(
+        resource,
+        get_starkbank_circuit_breaker(resource),
+        RetryPolicy(
+            max_attempts=settings.STARKBANK_MAX_ATTEMPTS,
+            base_delay=settings.STARKBANK_RETRY_BASE_DELAY_SECONDS,
+            max_delay=settings.STARKBANK_RETRY_MAX_DELAY_SECONDS,
+            deadline=settings.STARKBANK_CALL_DEADLINE_SECONDS,
+        ),
+        rate_limiter=get_starkbank_rate_limiter(resource, workspace),
+        low_priority_reserve=settings.STARKBANK_RATE_LIMIT_PRIORITY_RESERVE,
+    )
@@ -0,0 +1,17 @@
+from functools import lru_cache
+from typing import Optional
+from app.core.config import settings
+from app.core.redis_client import get_redis_client, key_namespace
+from app.services.transfer_sweep.implementation import RedisTransferSweeper
+from app.services.workspace_registry.implementation import Workspace
+
+
+@lru_cache(maxsize=None)
+def get_transfer_sweeper(workspace: Workspace) -> Optional[RedisTransferSweeper]:
+    if not settings.TRANSFER_SWEEP_ENABLED:
+        return None
+    # the pending totals and the ledger of each workspace under its
+    # namespace, in one cluster slot: the sweep scripts use them together
+    return RedisTransferSweeper(
+        get_redis_client(), namespace=key_namespace(workspace.key("sweep"))
+    )
@@ -0,0 +1,52 @@
+from functools import lru_cache
+from app.core.config import construct_private_key, settings
+from app.services.workspace_registry.implementation import Workspace, WorkspaceRegistry
+
+
+@lru_cache(maxsize=1)
+def get_workspace_registry() -> WorkspaceRegistry:
+    # built once per process, the workspaces keep their Project and clients
+    workspaces = [
+        Workspace(
+            project_id=settings.STARK_PROJECT_ID,
+            workspace_id=settings.STARK_WORKSPACE_ID,
+            environment=settings.STARK_ENVIRONMENT,
+            private_key=construct_private_key(
+                settings.STARKBANK_EC_PARAMETERS,
+                settings.STARKBANK_EC_PRIVATE_KEY,
+            ),
+            default_account=settings.default_account,
+            rate_limits=settings.STARKBANK_RATE_LIMITS,
+        )
+    ]
+    for workspace in settings.STARK_WORKSPACES:
+        workspaces.append(
+            Workspace(
+                project_id=workspace.project_id,
+                workspace_id=workspace.workspace_id,
+                environment=workspace.environment or settings.STARK_ENVIRONMENT,
+                private_key=construct_private_key(
+                    workspace.ec_parameters, workspace.ec_private_key
+                ),
+                default_account=workspace.default_account or settings.default_account,
+                rate_limits=(
+                    settings.STARKBANK_RATE_LIMITS
+                    if workspace.rate_limits is None
+                    else workspace.rate_limits
+                ),
+                namespace=f"workspace:{workspace.namespace or workspace.project_id}",
+            )
+        )
+    return WorkspaceRegistry(workspaces)
+
+
+@lru_cache(maxsize=None)
+def get_workspace_signature_verifier(workspace: Workspace):
+    # imported here, it pulls in starkbank and cryptography
+    from app.services.starkbank_signature_verifier.implementation import (
+        StarkBankSignatureVerifier,
+    )
+
+    return StarkBankSignatureVerifier(
+        workspace.project, timeout=settings.STARKBANK_REQUEST_TIMEOUT_SECONDS
+    )
@@ -0,0 +1,37 @@
+"""
+Starts the role selected by APP_ROLE:
+
+- all: the API, running the scheduled jobs too
+- api: the API only
+- scheduler: the scheduled jobs
+- worker: sends the transfers queued by the API in the outbox
+"""
+
+import os
+from app.core.config import settings
+
+APPLICATIONS = {
+    "all": "app.main:app",
+    "api": "app.entrypoints.api:app",
+}
+
+
+def main():
+    role = settings.APP_ROLE
+    if role in APPLICATIONS:
+        os.execvp(
+            "gunicorn",
+            ["gunicorn", "--config", "gunicorn.conf.py", APPLICATIONS[role]],
+        )
+    elif role == "scheduler":
+        from app.entrypoints import scheduler
+
+        scheduler.main()
+    else:
+        from app.entrypoints import worker
+
+        worker.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+from app.main import create_app
+
+# webhooks only, the jobs run in the scheduler role
+app = create_app(run_scheduler=False)
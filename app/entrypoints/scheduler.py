@@ -0,0 +1,154 @@
+import signal
+import redis
+import redis.asyncio
+from app.core.config import settings
+from app.core.drain import JOBS, drain_all
+from app.core.logs import configure_logging
+from app.core.metrics import start_metrics_server
+from app.core.redis_client import get_redis_client
+from app.core.resilience import configure_starkbank_sdk
+from app.core.async_runtime import get_async_redis_client, get_starkbank_executor
+from app.core.reconciliation import get_reconciliation_queue
+from app.jobs.invoice_random_people import (
+    invoice_random_people,
+    invoice_random_people_async,
+)
+from app.jobs.queue_undelivered_events import (
+    process_queued_events,
+    queue_undelivered_events,
+)
+from app.jobs.sweep_transfers import sweep_transfers, sweep_transfers_async
+from app.jobs.transfer_starkbank_undelivered_credited_invoices import (
+    transfer_starkbank_undelivered_credited_invoices,
+    transfer_starkbank_undelivered_credited_invoices_async,
+)
+from app.services.thread_lock.implementation import (
+    AsyncRedisThreadLock,
+    RedisThreadLock,
+)
+from concurrent.futures import Executor
+from functools import partial
+import asyncio
+
+
+def add_distributed_reconciliation_jobs(scheduler, redis_client: redis.Redis) -> None:
+    """
+    One scheduler of the fleet queues the undelivered events, all of them
+    handle the queue. Blocking: an `AsyncIOScheduler` runs them on the
+    thread pool of its event loop.
+    """
+    queue = get_reconciliation_queue()
+    scheduler.add_job(
+        lambda: queue_undelivered_events(RedisThreadLock(redis_client), queue),
+        "cron",
+        hour=1,
+    )
+    scheduler.add_job(
+        lambda: process_queued_events(queue),
+        "interval",
+        seconds=settings.RECONCILIATION_POLL_SECONDS,
+    )
+
+
+def add_jobs(scheduler, redis_client: redis.Redis) -> None:
+    if settings.RECONCILIATION_MODE == "distributed":
+        add_distributed_reconciliation_jobs(scheduler, redis_client)
+    else:
+        scheduler.add_job(
+            lambda: transfer_starkbank_undelivered_credited_invoices(
+                RedisThreadLock(redis_client)
+            ),
+            "cron",
+            hour=1,
+        )
+
+    scheduler.add_job(
+        lambda: invoice_random_people(8, 12, RedisThreadLock(redis_client)),
+        "cron",
+        hour="0,3,6,9,12,15,18,21",
+    )
+
+    if settings.TRANSFER_SWEEP_ENABLED:
+        scheduler.add_job(
+            lambda: sweep_transfers(RedisThreadLock(redis_client)),
+            "interval",
+            seconds=settings.TRANSFER_SWEEP_CHECK_SECONDS,
+        )
+
+
+def add_async_jobs(
+    scheduler, redis_client: redis.asyncio.Redis, executor: Executor
+) -> None:
+    """
+    The jobs as coroutines, for an `AsyncIOScheduler`. They share one lock
+    (and Redis connection pool) and the executor of the Stark Bank calls.
+    """
+    thread_lock = AsyncRedisThreadLock(redis_client)
+    if settings.RECONCILIATION_MODE == "distributed":
+        add_distributed_reconciliation_jobs(scheduler, get_redis_client())
+    else:
+        scheduler.add_job(
+            transfer_starkbank_undelivered_credited_invoices_async,
+            "cron",
+            hour=1,
+            args=[thread_lock, executor, settings.STARKBANK_MAX_CONCURRENT_CALLS],
+        )
+
+    scheduler.add_job(
+        invoice_random_people_async,
+        "cron",
+        hour="0,3,6,9,12,15,18,21",
+        args=[8, 12, thread_lock, executor],
+    )
+
+    if settings.TRANSFER_SWEEP_ENABLED:
+        scheduler.add_job(
+            sweep_transfers_async,
+            "interval",
+            seconds=settings.TRANSFER_SWEEP_CHECK_SECONDS,
+            args=[thread_lock, executor],
+        )
+
+
+async def run_async_scheduler():
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stopping.set)
+    loop.add_signal_handler(signal.SIGINT, stopping.set)
+
+    scheduler = AsyncIOScheduler()
+    add_async_jobs(scheduler, get_async_redis_client(), get_starkbank_executor())
+    scheduler.start()
+    await stopping.wait()
+    scheduler.shutdown(wait=False)
+    await loop.run_in_executor(
+        None, partial(drain_all, settings.SHUTDOWN_DRAIN_SECONDS, names=(JOBS,))
+    )
+
+
+def main():
+    configure_logging()
+    redis_client = get_redis_client()
+    redis_client.ping()
+    configure_starkbank_sdk()
+    # also answers the container health check, any path returns the metrics
+    start_metrics_server(settings.METRICS_PORT)
+
+    if settings.JOB_RUNTIME == "asyncio":
+        asyncio.run(run_async_scheduler())
+        return
+
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    scheduler = BlockingScheduler()
+    add_jobs(scheduler, redis_client)
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.shutdown(wait=False))
+    scheduler.start()
+    # lets the running jobs finish before the container stops
+    drain_all(settings.SHUTDOWN_DRAIN_SECONDS, names=(JOBS,))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import signal
+import socket
+import threading
+from app.core.config import settings
+from app.core.event_archive import get_event_archive_writer
+from app.core.logs import configure_logging
+from app.core.metrics import start_metrics_server
+from app.core.redis_client import get_redis_client, key_namespace
+from app.core.resilience import configure_starkbank_sdk, get_starkbank_caller
+from app.jobs.send_outbox_transfers import send_outbox_transfers
+from app.services.outbox.implementation import TRANSFERS, RedisOutbox
+from app.services.transfer_service.implementation import StarkBankTransferSender
+from app.services.workspace_registry.implementation import Workspace
+from functools import lru_cache
+
+
+def main():
+    configure_logging()
+    redis_client = get_redis_client()
+    redis_client.ping()
+    configure_starkbank_sdk()
+    # also answers the container health check, any path returns the metrics
+    start_metrics_server(settings.METRICS_PORT)
+
+    outbox = RedisOutbox(
+        redis_client,
+        key_namespace(TRANSFERS),
+        consumer_id=f"{socket.gethostname()}:{os.getpid()}",
+        heartbeat_ttl=int(settings.outbox_heartbeat_ttl.total_seconds()),
+    )
+
+    @lru_cache(maxsize=None)
+    def transfer_sender(workspace: Workspace) -> StarkBankTransferSender:
+        # they come from webhooks, ahead of the background jobs
+        return StarkBankTransferSender(
+            workspace.project,
+            get_starkbank_caller("transfer", workspace),
+            high_priority=True,
+        )
+
+    # the transfer in progress is finished before the container stops
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    send_outbox_transfers(
+        outbox,
+        transfer_sender,
+        stopping.is_set,
+        archive_writer=get_event_archive_writer(),
+    )
+
+
+if __name__ == "__main__":
+    main()
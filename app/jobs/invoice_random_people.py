@@ -1,30 +1,90 @@
-from app.core.config import settings
+from app.core.drain import JOBS, get_drain_tracker
+from app.core.job_history import (
+    count_job_events,
+    record_job_run,
+    record_job_run_async,
+)
+from app.core.workspaces import get_workspace_registry
 from app.models.types import Invoice
+from app.services.drain.implementation import DrainingError
 from app.services.invoice_service.implementation import StarkBankInvoiceSender
 from app.services.random_person_getter.implementation import RandomPersonGetter
-from app.services.thread_lock.interface import ThreadLock
+from app.services.thread_lock.interface import AsyncThreadLock, ThreadLock
+from concurrent.futures import Executor
+import asyncio
+import contextvars
 import random
 
+JOB_NAME = "invoice_random_people"
+
+
+def random_invoices(n_min: int, n_max: int) -> list[Invoice]:
+    if n_min < 0 or n_max < 0:
+        raise ValueError("n_min and n_max must be non-negative")
+    if n_min > n_max:
+        raise ValueError("n_min cannot be greater than n_max")
+
+    n = random.randint(n_min, n_max)
+    invoices = []
+    person_getter = RandomPersonGetter()
+    for _ in range(n):
+        person = person_getter.get_random_person()
+        amount = random.randint(100, 10000000000 - 1)
+        invoice = Invoice(amount=amount, person=person)
+        invoices.append(invoice)
+    return invoices
+
+
+def send_invoices(invoices: list[Invoice]):
+    if len(invoices) > 0:
+        # sample charges, only issued by the main workspace
+        invoice_sender = StarkBankInvoiceSender(
+            get_workspace_registry().default.project
+        )
+        try:
+            invoice_sender.send_batch(invoices)
+        except Exception:
+            count_job_events(JOB_NAME, "failed", len(invoices))
+            raise
+        count_job_events(JOB_NAME, "processed", len(invoices))
+
 
 def invoice_random_people(n_min: int, n_max: int, thread_lock: ThreadLock):
     lock_key = "job:invoice_random_people"
+    drain_tracker = get_drain_tracker(JOBS)
     if thread_lock.lock(lock_key, 600):
-        if n_min < 0 or n_max < 0:
-            raise ValueError("n_min and n_max must be non-negative")
-        if n_min > n_max:
-            raise ValueError("n_min cannot be greater than n_max")
-
-        n = random.randint(n_min, n_max)
-        invoices = []
-        invoice_sender = StarkBankInvoiceSender(settings.starkbank_project)
-        person_getter = RandomPersonGetter()
-        for _ in range(n):
-            person = person_getter.get_random_person()
-            amount = random.randint(100, 10000000000 - 1)
-            invoice = Invoice(amount=amount, person=person)
-            invoices.append(invoice)
-
-        if len(invoices) > 0:
-            invoice_sender.send_batch(invoices)
+        try:
+            with drain_tracker.track():
+                with record_job_run(JOB_NAME):
+                    send_invoices(random_invoices(n_min, n_max))
+        except DrainingError:
+            # shutting down, skipped until the next run
+            pass
 
         thread_lock.unlock(lock_key)
+
+
+async def invoice_random_people_async(
+    n_min: int, n_max: int, thread_lock: AsyncThreadLock, executor: Executor
+):
+    lock_key = "job:invoice_random_people"
+    drain_tracker = get_drain_tracker(JOBS)
+    if await thread_lock.lock(lock_key, 600):
+        loop = asyncio.get_running_loop()
+
+        try:
+            with drain_tracker.track():
+                async with record_job_run_async(JOB_NAME):
+                    invoices = random_invoices(n_min, n_max)
+                    # in the context of the run, which counts the invoices
+                    await loop.run_in_executor(
+                        executor,
+                        contextvars.copy_context().run,
+                        send_invoices,
+                        invoices,
+                    )
+        except DrainingError:
+            # shutting down, skipped until the next run
+            pass
+
+        await thread_lock.unlock(lock_key)
@@ -0,0 +1,205 @@
+from datetime import datetime
+import json
+import logging
+
+from app.core.config import settings
+from app.core.drain import JOBS, get_drain_tracker
+from app.core.event_archive import get_event_archive, get_event_archive_writer
+from app.core.job_history import count_job_events, record_job_run
+from app.core.metrics import WORK_QUEUE_ITEMS
+from app.core.workspaces import get_workspace_registry
+from app.jobs.transfer_starkbank_undelivered_credited_invoices import (
+    WorkspaceClients,
+    handle_event,
+    log_failure,
+    log_unavailable,
+    log_workspace_failure,
+)
+from app.models.types import StarkBankEvent
+from app.services.drain.implementation import DrainingError
+from app.services.resilience.implementation import (
+    CircuitOpenError,
+    RateLimitedError,
+    is_transient,
+)
+from app.services.thread_lock.interface import ThreadLock
+from app.services.work_queue.implementation import RedisWorkQueue
+from app.services.workspace_registry.implementation import Workspace
+
+QUEUE_JOB_NAME = "queue_undelivered_events"
+PROCESS_JOB_NAME = "process_queued_events"
+LOCK_KEY = "job:queue_undelivered_events"
+
+logger = logging.getLogger(__name__)
+
+
+def event_item(workspace: Workspace, event: StarkBankEvent) -> str:
+    # only what handling the event needs, the rest of the log is not kept
+    log = {"type": event.log["type"]}
+    invoice = event.log.get("invoice")
+    if invoice is not None:
+        log["invoice"] = {
+            "id": invoice.get("id"),
+            "amount": invoice["amount"],
+            "fee": invoice["fee"],
+        }
+    return json.dumps(
+        {
+            "workspace_id": workspace.workspace_id,
+            "id": event.id,
+            "created": event.created.isoformat(),
+            "subscription": event.subscription,
+            "log": log,
+        }
+    )
+
+
+def event_from_item(item: dict) -> StarkBankEvent:
+    # queued by the coordinator from events fetched from Stark Bank
+    return StarkBankEvent.model_construct(
+        created=datetime.fromisoformat(item["created"]),
+        id=item["id"],
+        log=item["log"],
+        subscription=item["subscription"],
+        workspaceId=item["workspace_id"],
+    )
+
+
+def queue_undelivered_events(thread_lock: ThreadLock, queue: RedisWorkQueue):
+    """
+    The coordinator: pages the undelivered events of every workspace into
+    `queue`, for `process_queued_events` to handle on every scheduler of
+    the fleet. Events still queued from an earlier run are not added again.
+    """
+    if not thread_lock.lock(LOCK_KEY, 3600):
+        return
+    drain_tracker = get_drain_tracker(JOBS)
+    try:
+        with record_job_run(QUEUE_JOB_NAME):
+            for workspace in get_workspace_registry():
+                page = {}
+                try:
+                    fetcher = WorkspaceClients(workspace).event_fetcher
+                    for event in fetcher.fetch_undelivered_events():
+                        if drain_tracker.draining:
+                            break
+                        page[f"{workspace.project_id}:{event.id}"] = event_item(
+                            workspace, event
+                        )
+                        if len(page) == settings.RECONCILIATION_BATCH_SIZE:
+                            count_job_events(QUEUE_JOB_NAME, "queued", queue.push(page))
+                            page = {}
+                except (CircuitOpenError, RateLimitedError) as e:
+                    log_unavailable(workspace, None, e)
+                except Exception:
+                    log_workspace_failure(workspace)
+                # what was fetched before a failure is queued all the same,
+                # the other workspaces are still paged
+                count_job_events(QUEUE_JOB_NAME, "queued", queue.push(page))
+    finally:
+        thread_lock.unlock(LOCK_KEY)
+
+
+def process_queued_events(queue: RedisWorkQueue):
+    """
+    A consumer, run by every scheduler: handles the queued events in batches
+    until the queue is empty. An event that fails is handed back to be tried
+    again after RECONCILIATION_RETRY_DELAY_SECONDS, one whose consumer dies
+    after the visibility timeout. After RECONCILIATION_MAX_ATTEMPTS failures
+    that are not Stark Bank being unavailable, it goes to the dead letters.
+    Transfers have external ids, so an event handled twice is not paid
+    twice. Runs that find the queue empty are not recorded in the job
+    history.
+    """
+    registry = get_workspace_registry()
+    event_archive = get_event_archive()
+    archive_writer = get_event_archive_writer()
+    drain_tracker = get_drain_tracker(JOBS)
+    retry_delay = settings.RECONCILIATION_RETRY_DELAY_SECONDS
+    clients = {}
+    # workspaces whose events are handed back until the next run
+    unavailable = set()
+
+    batch = (
+        []
+        if drain_tracker.draining
+        else queue.claim(settings.RECONCILIATION_BATCH_SIZE)
+    )
+    if not batch:
+        for state, count in queue.counts().items():
+            WORK_QUEUE_ITEMS.labels("reconciliation", state).set(count)
+        return
+
+    with record_job_run(PROCESS_JOB_NAME) as run:
+        while batch:
+
+            for index, (item_id, raw) in enumerate(batch):
+                if drain_tracker.draining:
+                    # shutting down, the rest goes to the other consumers
+                    queue.release([item_id for item_id, _ in batch[index:]])
+                    break
+
+                item = json.loads(raw)
+                workspace = registry.find_queued(item["workspace_id"])
+                if workspace is None:
+                    # no longer served by this deployment
+                    queue.ack([item_id])
+                    count_job_events(PROCESS_JOB_NAME, "failed")
+                    continue
+                if workspace.project_id in unavailable:
+                    queue.release([item_id], retry_delay)
+                    continue
+                # the timeout covers one event, not the whole batch
+                queue.extend([item_id for item_id, _ in batch[index:]])
+                if workspace.project_id not in clients:
+                    clients[workspace.project_id] = WorkspaceClients(workspace)
+                workspace_clients = clients[workspace.project_id]
+
+                event = event_from_item(item)
+                failed = False
+                # whether trying again later may succeed
+                transient = True
+                try:
+                    with drain_tracker.track():
+                        handle_event(
+                            event,
+                            workspace,
+                            workspace_clients.transfer_sender,
+                            workspace_clients.event_status_changer,
+                            event_archive,
+                            archive_writer,
+                            workspace_clients.transfer_sweeper,
+                        )
+                except DrainingError:
+                    queue.release([item_id])
+                    continue
+                except (CircuitOpenError, RateLimitedError) as e:
+                    failed = True
+                    unavailable.add(workspace.project_id)
+                    log_unavailable(workspace, event, e)
+                except Exception as e:
+                    failed = True
+                    transient = is_transient(e)
+                    log_failure(event)
+
+                if not failed:
+                    queue.ack([item_id])
+                elif transient:
+                    queue.release([item_id], retry_delay)
+                elif queue.fail([item_id], retry_delay):
+                    logger.error(
+                        "Gave up on event %s, moved to the dead letters",
+                        event.id,
+                        extra={"event_id": event.id},
+                    )
+                    count_job_events(PROCESS_JOB_NAME, "dead_lettered")
+                count_job_events(PROCESS_JOB_NAME, "failed" if failed else "processed")
+
+            # the backlog of the whole fleet, burning down
+            counts = queue.counts()
+            run.report(**counts)
+            for state, count in counts.items():
+                WORK_QUEUE_ITEMS.labels("reconciliation", state).set(count)
+            if drain_tracker.draining:
+                break
+            batch = queue.claim(settings.RECONCILIATION_BATCH_SIZE)
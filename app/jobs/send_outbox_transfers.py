@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import Callable, Optional
+import logging
+import time
+
+from app.core.metrics import JOB_EVENTS_TOTAL
+from app.core.workspaces import get_workspace_registry
+from app.models.types import ArchivedEvent, EventOutcome, credited_invoice_transfer
+from app.services.event_archive.implementation import BatchedEventArchiveWriter
+from app.services.outbox.implementation import RedisOutbox
+from app.services.resilience.implementation import (
+    CircuitOpenError,
+    RateLimitedError,
+    is_transient,
+)
+from app.services.transfer_service.interface import TransferSender
+from app.services.workspace_registry.implementation import Workspace
+
+JOB_NAME = "send_outbox_transfers"
+
+logger = logging.getLogger(__name__)
+
+
+def send_outbox_transfers(
+    outbox: RedisOutbox,
+    transfer_sender: Callable[[Workspace], TransferSender],
+    should_stop: Callable[[], bool],
+    claim_timeout: float = 5,
+    unavailable_delay: float = 5,
+    sleep: Callable[[float], None] = time.sleep,
+    archive_writer: Optional[BatchedEventArchiveWriter] = None,
+):
+    registry = get_workspace_registry()
+    outbox.recover_abandoned()
+    while not should_stop():
+        claimed = outbox.claim(claim_timeout)
+        if claimed is None:
+            # idle, a good time to pick up what dead workers left behind
+            outbox.recover_abandoned()
+            continue
+
+        raw, item = claimed
+        # items queued before there were other workspaces belong to the main one
+        workspace = registry.find_queued(
+            item.get("workspace_id", registry.default.workspace_id)
+        )
+        if workspace is None:
+            # no longer served by this deployment
+            logger.error(
+                "Dead-lettered the transfer of event %s, its workspace is not served",
+                item["event_id"],
+                extra={"event_id": item["event_id"]},
+            )
+            outbox.dead_letter(raw)
+            JOB_EVENTS_TOTAL.labels(JOB_NAME, "failed").inc()
+            continue
+
+        transfer = credited_invoice_transfer(
+            workspace.default_account,
+            item["amount"],
+            item["event_id"],
+            item.get("invoice_id"),
+        )
+        try:
+            transfer_sender(workspace).send(transfer)
+        except Exception as e:
+            if isinstance(e, (CircuitOpenError, RateLimitedError)) or is_transient(e):
+                # the transfer has an external id, sending it again is safe
+                logger.warning(
+                    "Could not send the transfer of event %s, retrying: %s",
+                    item["event_id"],
+                    e,
+                    extra={"event_id": item["event_id"]},
+                )
+                outbox.retry(raw)
+                JOB_EVENTS_TOTAL.labels(JOB_NAME, "retried").inc()
+                sleep(unavailable_delay)
+            else:
+                logger.exception(
+                    "Dead-lettered the transfer of event %s",
+                    item["event_id"],
+                    extra={"event_id": item["event_id"]},
+                )
+                outbox.dead_letter(raw)
+                JOB_EVENTS_TOTAL.labels(JOB_NAME, "failed").inc()
+        else:
+            outbox.ack(raw)
+            JOB_EVENTS_TOTAL.labels(JOB_NAME, "processed").inc()
+            # items queued before the creation time was added are not archived
+            if archive_writer is not None and "created" in item:
+                archive_writer.submit(
+                    ArchivedEvent.model_construct(
+                        event_id=item["event_id"],
+                        invoice_id=item.get("invoice_id"),
+                        created=datetime.fromisoformat(item["created"]),
+                        outcome=EventOutcome.TRANSFERRED,
+                        amount=item["amount"],
+                        source="worker",
+                    )
+                )
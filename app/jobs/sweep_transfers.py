@@ -0,0 +1,142 @@
+from concurrent.futures import Executor
+import asyncio
+import contextvars
+import logging
+
+from app.core.config import settings
+from app.core.drain import JOBS, get_drain_tracker
+from app.core.job_history import (
+    count_job_events,
+    record_job_run,
+    record_job_run_async,
+)
+from app.core.resilience import get_starkbank_caller
+from app.core.transfer_sweep import get_transfer_sweeper
+from app.core.workspaces import get_workspace_registry
+from app.models.types import MAX_AMOUNT, SweepBatch, Transfer
+from app.services.drain.implementation import DrainingError
+from app.services.resilience.implementation import (
+    CircuitOpenError,
+    RateLimitedError,
+    is_transient,
+)
+from app.services.thread_lock.interface import AsyncThreadLock, ThreadLock
+from app.services.transfer_service.implementation import StarkBankTransferSender
+from app.services.workspace_registry.implementation import Workspace
+
+JOB_NAME = "sweep_transfers"
+LOCK_KEY = "job:sweep_transfers"
+# the sweep was not sent, shutting down or Stark Bank refused it for now
+REFUSED_FOR_NOW = (DrainingError, CircuitOpenError, RateLimitedError)
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_transfers_of(batch: SweepBatch) -> list[Transfer]:
+    """
+    The transfers paying `batch`, split in parts below MAX_AMOUNT when the
+    credits add up to more. The same batch is always the same transfers,
+    sending them again is safe.
+    """
+    if batch.amount < MAX_AMOUNT:
+        parts = [(f"sweep-{batch.sweep_id}", batch.amount)]
+    else:
+        amounts = [MAX_AMOUNT - 1] * (batch.amount // (MAX_AMOUNT - 1))
+        if batch.amount % (MAX_AMOUNT - 1):
+            amounts.append(batch.amount % (MAX_AMOUNT - 1))
+        parts = [
+            (f"sweep-{batch.sweep_id}-{n}", amount)
+            for n, amount in enumerate(amounts, 1)
+        ]
+    return [
+        Transfer(
+            account=batch.account,
+            amount=amount,
+            external_id=external_id,
+            tags=[f"sweep/{batch.sweep_id}"],
+        )
+        for external_id, amount in parts
+    ]
+
+
+def send_sweep(sweeper, transfer_sender, batch: SweepBatch):
+    try:
+        # inside the handling: one bad batch must not stop the others
+        transfers = sweep_transfers_of(batch)
+        with get_drain_tracker(JOBS).track():
+            for transfer in transfers:
+                transfer_sender.send(transfer)
+    except Exception as e:
+        if isinstance(e, REFUSED_FOR_NOW) or is_transient(e):
+            # left open, sent again on a later run
+            logger.warning(
+                "Could not send sweep %s, left for a later run: %s",
+                batch.sweep_id,
+                e,
+                extra={"sweep_id": batch.sweep_id},
+            )
+            count_job_events(JOB_NAME, "retried", len(batch.event_ids))
+        else:
+            logger.exception(
+                "Sweep %s failed", batch.sweep_id, extra={"sweep_id": batch.sweep_id}
+            )
+            sweeper.fail(batch)
+            count_job_events(JOB_NAME, "failed", len(batch.event_ids))
+    else:
+        sweeper.complete(batch)
+        count_job_events(JOB_NAME, "processed", len(batch.event_ids))
+
+
+def send_due_sweeps():
+    for workspace in get_workspace_registry():
+        if get_drain_tracker(JOBS).draining:
+            break
+        send_due_workspace_sweeps(workspace)
+
+
+def send_due_workspace_sweeps(workspace: Workspace):
+    sweeper = get_transfer_sweeper(workspace)
+    if sweeper is None:
+        return
+
+    transfer_sender = StarkBankTransferSender(
+        workspace.project, get_starkbank_caller("transfer", workspace)
+    )
+    drain_tracker = get_drain_tracker(JOBS)
+    for account in sweeper.accounts():
+        if drain_tracker.draining:
+            break
+
+        # batches a previous run could not finish, before the new credits
+        batches = [sweeper.batch(account, id) for id in sweeper.open_batches(account)]
+        if sweeper.is_due(
+            account,
+            settings.TRANSFER_SWEEP_THRESHOLD,
+            settings.TRANSFER_SWEEP_INTERVAL_SECONDS,
+        ):
+            batches.append(sweeper.take(account))
+
+        for batch in batches:
+            if batch is not None:
+                send_sweep(sweeper, transfer_sender, batch)
+
+
+def sweep_transfers(thread_lock: ThreadLock):
+    if thread_lock.lock(LOCK_KEY, 600):
+        try:
+            with record_job_run(JOB_NAME):
+                send_due_sweeps()
+        finally:
+            thread_lock.unlock(LOCK_KEY)
+
+
+async def sweep_transfers_async(thread_lock: AsyncThreadLock, executor: Executor):
+    if await thread_lock.lock(LOCK_KEY, 600):
+        loop = asyncio.get_running_loop()
+        try:
+            async with record_job_run_async(JOB_NAME):
+                await loop.run_in_executor(
+                    executor, contextvars.copy_context().run, send_due_sweeps
+                )
+        finally:
+            await thread_lock.unlock(LOCK_KEY)
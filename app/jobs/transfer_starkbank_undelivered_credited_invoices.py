@@ -1,37 +1,310 @@
+from concurrent.futures import Executor
+from typing import Optional
+import asyncio
+import logging
+
 from app.services.starkbank_event_services.implementation import (
     StarkBankEventFetcher,
     StarkBankEventStatusChanger,
 )
 from app.services.transfer_service.implementation import StarkBankTransferSender
-from app.models.types import Transfer
+from app.services.resilience.implementation import (
+    CircuitOpenError,
+    RateLimitedError,
+)
+from app.services.drain.implementation import DrainingError
+from app.services.event_archive.implementation import (
+    BatchedEventArchiveWriter,
+    SQLiteEventArchive,
+)
+from app.services.transfer_sweep.implementation import RedisTransferSweeper
+from app.models.types import (
+    ArchivedEvent,
+    EventOutcome,
+    StarkBankEvent,
+    credited_invoice_transfer,
+)
 from app.core.config import settings
-from app.services.thread_lock.interface import ThreadLock
+from app.core.drain import JOBS, get_drain_tracker
+from app.core.event_archive import get_event_archive, get_event_archive_writer
+from app.core.resilience import get_starkbank_caller
+from app.core.transfer_sweep import get_transfer_sweeper
+from app.core.job_history import (
+    count_job_events,
+    record_job_run,
+    record_job_run_async,
+)
+from app.core.workspaces import get_workspace_registry
+from app.services.thread_lock.interface import AsyncThreadLock, ThreadLock
+from app.services.workspace_registry.implementation import Workspace
+
+JOB_NAME = "transfer_starkbank_undelivered_credited_invoices"
+
+logger = logging.getLogger(__name__)
+
+
+def handle_event(
+    event: StarkBankEvent,
+    workspace: Workspace,
+    transfer_sender: StarkBankTransferSender,
+    event_status_changer: StarkBankEventStatusChanger,
+    event_archive: Optional[SQLiteEventArchive],
+    archive_writer: Optional[BatchedEventArchiveWriter],
+    transfer_sweeper: Optional[RedisTransferSweeper] = None,
+):
+    def archive(outcome: EventOutcome, amount: Optional[int] = None):
+        if archive_writer is not None:
+            archive_writer.submit(
+                ArchivedEvent.model_construct(
+                    event_id=event.id,
+                    invoice_id=event.log.get("invoice", {}).get("id"),
+                    created=event.created,
+                    outcome=outcome,
+                    amount=amount,
+                    source=JOB_NAME,
+                )
+            )
+
+    if event_archive is not None and event_archive.is_done(event.id):
+        # already handled here, only the delivery is missing
+        pass
+    elif event.subscription == "invoice" and event.log["type"] == "credited":
+        transfer_amount = event.log["invoice"]["amount"] - event.log["invoice"]["fee"]
+        if transfer_sweeper is not None:
+            # paid with the other credits of the account by the next sweep
+            transfer_sweeper.credit(
+                workspace.default_account, event.id, transfer_amount
+            )
+            archive(EventOutcome.QUEUED, transfer_amount)
+        else:
+            transfer = credited_invoice_transfer(
+                workspace.default_account,
+                transfer_amount,
+                event.id,
+                event.log["invoice"].get("id"),
+            )
+            try:
+                transfer_sender.send(transfer)
+            except Exception:
+                archive(EventOutcome.FAILED, transfer_amount)
+                raise
+            archive(EventOutcome.TRANSFERRED, transfer_amount)
+    else:
+        archive(EventOutcome.SKIPPED)
+
+    # only mark as delivered once the transfer went through,
+    # otherwise the event is retried on the next run
+    event_status_changer.mark_as_delivered(event.id)
+
+
+def log_failure(event: StarkBankEvent):
+    # the event stays undelivered, it is tried again on the next run
+    logger.exception(
+        "Could not handle event %s", event.id, extra={"event_id": event.id}
+    )
+
+
+def log_unavailable(
+    workspace: Workspace, event: Optional[StarkBankEvent], error: Exception
+):
+    # without an event when fetching the backlog failed
+    extra = {"workspace_id": workspace.workspace_id}
+    if event is not None:
+        extra["event_id"] = event.id
+    logger.warning(
+        "Stark Bank is unavailable for %s, its backlog is left for later: %s",
+        workspace.workspace_id,
+        error,
+        extra=extra,
+    )
+
+
+def log_workspace_failure(workspace: Workspace):
+    # the other workspaces are still reconciled, this one on the next run
+    logger.exception(
+        "Could not reconcile workspace %s",
+        workspace.workspace_id,
+        extra={"workspace_id": workspace.workspace_id},
+    )
+
+
+class WorkspaceClients:
+    """
+    The Stark Bank clients of a workspace, with its own rate limit budgets.
+    """
+
+    def __init__(self, workspace: Workspace):
+        event_caller = get_starkbank_caller("event", workspace)
+        self.workspace = workspace
+        self.event_fetcher = StarkBankEventFetcher(
+            workspace.project,
+            event_caller,
+            page_size=settings.STARKBANK_EVENTS_PAGE_SIZE,
+            read_ahead=settings.STARKBANK_EVENTS_READ_AHEAD_PAGES,
+        )
+        self.event_status_changer = StarkBankEventStatusChanger(
+            workspace.project, event_caller
+        )
+        self.transfer_sender = StarkBankTransferSender(
+            workspace.project, get_starkbank_caller("transfer", workspace)
+        )
+        self.transfer_sweeper = get_transfer_sweeper(workspace)
 
 
 def transfer_starkbank_undelivered_credited_invoices(thread_lock: ThreadLock):
-    event_fetcher = StarkBankEventFetcher(settings.starkbank_project)
-    event_status_changer = StarkBankEventStatusChanger(settings.starkbank_project)
-    transfer_sender = StarkBankTransferSender(settings.starkbank_project)
-    for event in event_fetcher.fetch_undelivered_events():
+    with record_job_run(JOB_NAME):
+        event_archive = get_event_archive()
+        archive_writer = get_event_archive_writer()
+        drain_tracker = get_drain_tracker(JOBS)
+        for workspace in get_workspace_registry():
+            if drain_tracker.draining:
+                break
+            try:
+                reconcile_workspace(
+                    WorkspaceClients(workspace),
+                    thread_lock,
+                    event_archive,
+                    archive_writer,
+                )
+            except (CircuitOpenError, RateLimitedError) as e:
+                log_unavailable(workspace, None, e)
+            except Exception:
+                log_workspace_failure(workspace)
+
+
+def reconcile_workspace(
+    clients: WorkspaceClients,
+    thread_lock: ThreadLock,
+    event_archive: Optional[SQLiteEventArchive],
+    archive_writer: Optional[BatchedEventArchiveWriter],
+):
+    drain_tracker = get_drain_tracker(JOBS)
+    for event in clients.event_fetcher.fetch_undelivered_events():
+        if drain_tracker.draining:
+            # shutting down, the rest is left for the next run
+            break
+
         lock_key = f"event:{event.id}"
-        if thread_lock.lock(lock_key):
+        # expires if the process stops before the event is handled
+        if thread_lock.lock(lock_key, int(settings.event_lock_ttl.total_seconds())):
+            failed = False
+            unavailable = False
             try:
-                if event.subscription == "invoice" and event.log["type"] == "credited":
-                    transfer_amount = (
-                        event.log["invoice"]["amount"] - event.log["invoice"]["fee"]
-                    )
-                    transfer = Transfer(
-                        account=settings.default_account,
-                        amount=transfer_amount,
+                with drain_tracker.track():
+                    handle_event(
+                        event,
+                        clients.workspace,
+                        clients.transfer_sender,
+                        clients.event_status_changer,
+                        event_archive,
+                        archive_writer,
+                        clients.transfer_sweeper,
                     )
-                    try:
-                        transfer_sender.send(transfer)
-                    except Exception:
-                        # If transfer fails, we still want to mark the event as delivered
-                        pass
-                event_status_changer.mark_as_delivered(event.id)
+            except DrainingError:
+                break
+            except (CircuitOpenError, RateLimitedError) as e:
+                failed = True
+                unavailable = True
+                log_unavailable(clients.workspace, event, e)
             except Exception:
-                # If marking as delivered fails, we still want to unlock
-                pass
+                failed = True
+                log_failure(event)
             finally:
                 thread_lock.unlock(lock_key)
+            count_job_events(JOB_NAME, "failed" if failed else "processed")
+
+            if unavailable:
+                # Stark Bank is degraded or the budget of the workspace is
+                # spent, the rest of its backlog would fail too and is left
+                # for the next run
+                break
+
+
+async def transfer_starkbank_undelivered_credited_invoices_async(
+    thread_lock: AsyncThreadLock,
+    executor: Executor,
+    max_concurrency: int,
+):
+    """
+    Same as `transfer_starkbank_undelivered_credited_invoices`, handling up
+    to `max_concurrency` events at a time, of all the workspaces. The SDK
+    is blocking, so its calls run on `executor` while the locks go through
+    the async Redis client.
+    """
+    loop = asyncio.get_running_loop()
+    async with record_job_run_async(JOB_NAME):
+        event_archive = get_event_archive()
+        archive_writer = get_event_archive_writer()
+        drain_tracker = get_drain_tracker(JOBS)
+        pending = asyncio.Queue(maxsize=max_concurrency)
+        # workspaces whose backlog is left for the next run
+        unavailable = set()
+
+        def stopped(clients: WorkspaceClients):
+            return clients.workspace.project_id in unavailable or drain_tracker.draining
+
+        async def fetch_workspace(workspace: Workspace):
+            clients = WorkspaceClients(workspace)
+            events = clients.event_fetcher.fetch_undelivered_events()
+            while not stopped(clients):
+                # the next pages are fetched in the background
+                event = await loop.run_in_executor(executor, next, events, None)
+                if event is None:
+                    break
+                await pending.put((clients, event))
+
+        async def fetch():
+            try:
+                for workspace in get_workspace_registry():
+                    try:
+                        await fetch_workspace(workspace)
+                    except (CircuitOpenError, RateLimitedError) as e:
+                        log_unavailable(workspace, None, e)
+                    except Exception:
+                        log_workspace_failure(workspace)
+            finally:
+                for _ in range(max_concurrency):
+                    await pending.put(None)
+
+        async def process():
+            while (item := await pending.get()) is not None:
+                clients, event = item
+                if stopped(clients):
+                    continue
+
+                lock_key = f"event:{event.id}"
+                if not await thread_lock.lock(
+                    lock_key, int(settings.event_lock_ttl.total_seconds())
+                ):
+                    continue
+
+                failed = False
+                try:
+                    with drain_tracker.track():
+                        await loop.run_in_executor(
+                            executor,
+                            handle_event,
+                            event,
+                            clients.workspace,
+                            clients.transfer_sender,
+                            clients.event_status_changer,
+                            event_archive,
+                            archive_writer,
+                            clients.transfer_sweeper,
+                        )
+                except DrainingError:
+                    continue
+                except (CircuitOpenError, RateLimitedError) as e:
+                    failed = True
+                    # the rest of the backlog of the workspace is left for
+                    # the next run
+                    unavailable.add(clients.workspace.project_id)
+                    log_unavailable(clients.workspace, event, e)
+                except Exception:
+                    failed = True
+                    log_failure(event)
+                finally:
+                    await thread_lock.unlock(lock_key)
+                count_job_events(JOB_NAME, "failed" if failed else "processed")
+
+        await asyncio.gather(fetch(), *(process() for _ in range(max_concurrency)))
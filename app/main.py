@@ -1,20 +1,28 @@
 from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
+from app.api.v1.endpoints import admin
 from app.api.v1.endpoints import webhooks
 from app.api.v1.endpoints import health
 from app.api.v1.endpoints import index
-import starkbank
+from app.api.v1.endpoints import jobs
+from app.api.v1.endpoints import metrics
 import redis
 from app.core.config import settings
+from app.core.drain import drain_all
+from app.core.health import create_health_monitor
+from app.core.logs import RequestIdMiddleware, configure_logging
+from app.core.metrics import STARKBANK_REQUEST_SECONDS
+from app.core.redis_client import get_redis_client
+from app.core.resilience import configure_starkbank_sdk
+from app.core.workspaces import get_workspace_registry
 from contextlib import asynccontextmanager
-from apscheduler.schedulers.background import BackgroundScheduler
-from app.jobs.transfer_starkbank_undelivered_credited_invoices import (
-    transfer_starkbank_undelivered_credited_invoices,
-)
-from app.jobs.invoice_random_people import invoice_random_people
 from app.services.thread_lock.implementation import RedisThreadLock
+from app.services.workspace_registry.implementation import Workspace
+from typing import Optional
+import logging
 import time
 
-scheduler = BackgroundScheduler()
+logger = logging.getLogger(__name__)
 
 WEBHOOK_LOCK_KEY = "starkbank_webhook_lock"
 WEBHOOK_ID_KEY = "starkbank_webhook_id"
@@ -22,98 +30,169 @@ GET_WEBHOOK_ID_DELAY = 3
 MAX_GET_WEBHOOK_ID_ATTEMPTS = 20
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    redis_client = redis.from_url(settings.REDIS_URL)
-    try:
-        redis_client.ping()
-    except redis.ConnectionError as e:
-        raise
+def register_webhook(
+    redis_client: redis.Redis, workspace: Workspace
+) -> tuple[Optional[str], bool]:
+    """
+    Finds or creates the webhook of the workspace, once for the whole fleet.
+    Returns its ID, None while another process registers it, and whether
+    this process registered it.
+    """
+    import starkbank
 
-    starkbank.user = settings.starkbank_project
     webhook_url = settings.starkbank_invoices_webhook_url
-    webhook_id = None
-
-    webhook_id = redis_client.get(WEBHOOK_ID_KEY)
+    webhook_id = redis_client.get(workspace.key(WEBHOOK_ID_KEY))
     if webhook_id:
-        webhook_id = webhook_id.decode("utf-8")
+        return webhook_id.decode("utf-8"), False
+
+    thread_lock = RedisThreadLock(redis_client)
+    lock_key = workspace.key(WEBHOOK_LOCK_KEY)
+    if not thread_lock.lock(lock_key):
+        return None, False
+
+    with STARKBANK_REQUEST_SECONDS.labels("webhook", "query").time():
+        webhooks = list(starkbank.webhook.query(user=workspace.project))
+    for webhook in webhooks:
+        if webhook.url == webhook_url:
+            webhook_id = webhook.id
+            break
 
-    main_thread = False
     if webhook_id is None:
-        thread_lock = RedisThreadLock(redis_client)
-        if thread_lock.lock(WEBHOOK_LOCK_KEY):
-            main_thread = True
-            webhooks = starkbank.webhook.query()
-            for webhook in webhooks:
-                if webhook.url == webhook_url:
-                    webhook_id = webhook.id
-                    break
-
-            if webhook_id is None:
-                webhook = starkbank.webhook.create(
-                    url=webhook_url,
-                    subscriptions=["invoice"],
-                )
-                webhook_id = webhook.id
-
-            if webhook_id:
-                redis_client.set(WEBHOOK_ID_KEY, webhook_id)
-
-            thread_lock.unlock(WEBHOOK_LOCK_KEY)
-
-    scheduler.add_job(
-        lambda: transfer_starkbank_undelivered_credited_invoices(
-            RedisThreadLock(redis_client)
-        ),
-        "cron",
-        hour=1,
-    )
+        with STARKBANK_REQUEST_SECONDS.labels("webhook", "create").time():
+            webhook = starkbank.webhook.create(
+                url=webhook_url,
+                subscriptions=["invoice"],
+                user=workspace.project,
+            )
+        webhook_id = webhook.id
 
-    scheduler.add_job(
-        lambda: invoice_random_people(8, 12, RedisThreadLock(redis_client)),
-        "cron",
-        hour="0,3,6,9,12,15,18,21",
-    )
+    if webhook_id:
+        redis_client.set(workspace.key(WEBHOOK_ID_KEY), webhook_id)
+
+    thread_lock.unlock(lock_key)
+    return webhook_id, True
 
-    scheduler.start()
 
-    # the other threads will wait for the webhook ID to be set
+def wait_for_webhook_id(
+    redis_client: redis.Redis, workspace: Workspace, webhook_id: Optional[str]
+) -> str:
+    # the other processes wait for the webhook ID to be set
     get_webhook_id_attempts = 0
     while webhook_id is None and get_webhook_id_attempts < MAX_GET_WEBHOOK_ID_ATTEMPTS:
         time.sleep(GET_WEBHOOK_ID_DELAY)
-        webhook_id = redis_client.get(WEBHOOK_ID_KEY)
+        webhook_id = redis_client.get(workspace.key(WEBHOOK_ID_KEY))
         if webhook_id:
             webhook_id = webhook_id.decode("utf-8")
         get_webhook_id_attempts += 1
 
     # if the webhook ID is not set, it will raise an exception
     if webhook_id is None:
-        raise Exception("Could not get webhook ID")
+        raise Exception(f"Could not get webhook ID of {workspace.project_id}")
 
-    print(f"Using webhook with ID: {webhook_id}")
+    logger.info(
+        "Using webhook %s",
+        webhook_id,
+        extra={"webhook_id": webhook_id, "workspace_id": workspace.workspace_id},
+    )
+    return webhook_id
 
-    yield
-    scheduler.shutdown()
 
-    if main_thread:
-        if settings.ENVIRONMENT == "development":
-            print("Cleaning up Starkbank Invoices Webhook")
-            redis_client.delete(WEBHOOK_ID_KEY)
-            starkbank.webhook.delete(webhook_id)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # imported on startup rather than with this module: they are slow to
+    # import and only needed once the application runs
+    import starkbank
+
+    configure_logging()
+    redis_client = get_redis_client()
+    try:
+        redis_client.ping()
+    except redis.ConnectionError as e:
+        raise
+
+    configure_starkbank_sdk()
+    registrations = [
+        (workspace, *register_webhook(redis_client, workspace))
+        for workspace in get_workspace_registry()
+    ]
+
+    scheduler = None
+    if app.state.run_scheduler and settings.JOB_RUNTIME == "asyncio":
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        from app.core.async_runtime import (
+            get_async_redis_client,
+            get_starkbank_executor,
+        )
+        from app.entrypoints.scheduler import add_async_jobs
+
+        # on the application's event loop, no thread pool of its own
+        scheduler = AsyncIOScheduler()
+        add_async_jobs(scheduler, get_async_redis_client(), get_starkbank_executor())
+        scheduler.start()
+    elif app.state.run_scheduler:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from app.entrypoints.scheduler import add_jobs
+
+        scheduler = BackgroundScheduler()
+        add_jobs(scheduler, redis_client)
+        scheduler.start()
+
+    registrations = [
+        (workspace, wait_for_webhook_id(redis_client, workspace, webhook_id), owned)
+        for workspace, webhook_id, owned in registrations
+    ]
+
+    app.state.health_monitor = create_health_monitor(scheduler)
+    app.state.health_monitor.start()
 
+    yield
+    app.state.health_monitor.stop()
+    if scheduler is not None:
+        # no new runs, the runs in progress are drained below
+        scheduler.shutdown(wait=False)
+
+    # off the event loop: the requests and async jobs being drained need it
+    await run_in_threadpool(drain_all, settings.SHUTDOWN_DRAIN_SECONDS)
+
+    for workspace, webhook_id, owned in registrations:
+        if owned and settings.ENVIRONMENT == "development":
+            logger.info(
+                "Cleaning up the invoices webhook",
+                extra={
+                    "webhook_id": webhook_id,
+                    "workspace_id": workspace.workspace_id,
+                },
+            )
+            redis_client.delete(workspace.key(WEBHOOK_ID_KEY))
+            starkbank.webhook.delete(webhook_id, user=workspace.project)
+
+
+def create_app(run_scheduler: bool) -> FastAPI:
+    """
+    `run_scheduler` also runs the scheduled jobs in the API process,
+    otherwise they are left to the scheduler role.
+    """
+    app = FastAPI(
+        title="Stark Bank Challenge API",
+        description="API for a client that uses Stark Bank (or any other implemented bank)",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+    app.state.run_scheduler = run_scheduler
+    app.add_middleware(RequestIdMiddleware)
 
-app = FastAPI(
-    title="Stark Bank Challenge API",
-    description="API for a client that uses Stark Bank (or any other implemented bank)",
-    version="1.0.0",
-    lifespan=lifespan,
-)
+    # Include routers
+    app.include_router(index.router, tags=["index"])
+    app.include_router(webhooks.router, prefix="/api/v1/webhooks", tags=["webhooks"])
+    app.include_router(health.router, prefix="/health", tags=["health"])
+    app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+    app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+    app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
+    return app
 
-# Include routers
-app.include_router(index.router, tags=["index"])
-app.include_router(webhooks.router, prefix="/api/v1/webhooks", tags=["webhooks"])
-app.include_router(health.router, prefix="/health", tags=["health"])
 
+# every role in a single process
+app = create_app(run_scheduler=True)
 
 if __name__ == "__main__":
     import uvicorn
@@ -2,7 +2,7 @@ from pydantic import BaseModel
 from enum import Enum
 from pydantic import Field, field_validator
 import re
-from datetime import date, datetime
+from datetime import date, datetime, timezone
 from typing import Optional
 
 
@@ -61,13 +61,44 @@ class Account(BaseModel):
         return value
 
 
+MAX_AMOUNT = 10000000000
+
+
 class Transfer(BaseModel):
     account: Account
-    amount: int = Field(gt=0, lt=10000000000)
+    amount: int = Field(gt=0, lt=MAX_AMOUNT)
+    # unique among all transfers: Stark Bank refuses a second transfer with
+    # the same one, which makes creating it again safe
+    external_id: Optional[str] = Field(default=None, pattern=r"^[A-Za-z0-9_\-]+$")
+    tags: list[str] = Field(default_factory=list)
+
+
+def credited_invoice_transfer(
+    account: Account, amount: int, event_id: str, invoice_id: Optional[str] = None
+) -> Transfer:
+    """
+    The transfer of a credited invoice, identified by the invoice (credited
+    only once) or, without one, by the event, whoever sends it.
+
+    Built once per event from data already validated (the account) or
+    coming from Stark Bank, so only the amount is checked.
+    """
+    if not 0 < amount < MAX_AMOUNT:
+        raise ValueError(f"Invalid transfer amount: {amount}")
+
+    tags = [f"event/{event_id}"]
+    if invoice_id:
+        tags.append(f"invoice/{invoice_id}")
+    return Transfer.model_construct(
+        account=account,
+        amount=amount,
+        external_id=f"invoice-{invoice_id}" if invoice_id else f"event-{event_id}",
+        tags=tags,
+    )
 
 
 class Invoice(BaseModel):
-    amount: int = Field(gt=0, lt=10000000000)
+    amount: int = Field(gt=0, lt=MAX_AMOUNT)
     person: Person
     due_date: Optional[date] = None
 
@@ -78,3 +109,27 @@ class StarkBankEvent(BaseModel):
     log: dict  # TODO: create log models
     subscription: str
     workspaceId: str
+
+
+class EventOutcome(str, Enum):
+    TRANSFERRED = "transferred"
+    QUEUED = "queued"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+
+
+class ArchivedEvent(BaseModel):
+    event_id: str
+    invoice_id: Optional[str] = None
+    created: datetime
+    outcome: EventOutcome
+    amount: Optional[int] = None
+    source: str
+    archived: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class SweepBatch(BaseModel):
+    sweep_id: str
+    account: Account
+    amount: int
+    event_ids: list[str]
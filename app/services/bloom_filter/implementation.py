@@ -0,0 +1,91 @@
+from typing import Callable
+import hashlib
+import math
+import time
+
+import redis
+
+
+class RedisRotatingBloomFilter:
+    """
+    Time-bucketed Bloom filter stored as plain Redis strings and manipulated
+    with BITFIELD, so it works on any Redis (no RedisBloom module).
+
+    Members are added to the bucket of the current time and every bucket
+    expires after `retention` seconds, so memory stays fixed at roughly
+    `retention / bucket_seconds` filters of `capacity` members each.
+    Lookups check every live bucket; the per-bucket error rate is divided
+    by the number of buckets to keep the overall rate at `error_rate`.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        namespace: str,
+        capacity: int,
+        error_rate: float,
+        bucket_seconds: int,
+        retention: int,
+        clock: Callable[[], float] = time.time,
+    ):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        if bucket_seconds <= 0 or retention < bucket_seconds:
+            raise ValueError("retention must be at least one bucket long")
+
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self.clock = clock
+        # a member added at the very end of a bucket must still be found
+        # `retention` seconds later, hence the extra bucket
+        self.n_buckets = math.ceil(retention / bucket_seconds) + 1
+
+        bucket_error_rate = error_rate / self.n_buckets
+        self.n_bits = math.ceil(
+            -capacity * math.log(bucket_error_rate) / math.log(2) ** 2
+        )
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.n_buckets * math.ceil(self.n_bits / 8)
+
+    def add(self, member: str) -> None:
+        bucket = self.__current_bucket()
+        key = self.__bucket_key(bucket)
+        operation = self.redis_client.pipeline(transaction=False)
+        bitfield = operation.bitfield(key)
+        for offset in self.__offsets(member):
+            bitfield.set("u1", offset, 1)
+        bitfield.execute()
+        operation.expireat(key, (bucket + self.n_buckets) * self.bucket_seconds)
+        operation.execute()
+
+    def might_contain(self, member: str) -> bool:
+        offsets = self.__offsets(member)
+        current_bucket = self.__current_bucket()
+        operation = self.redis_client.pipeline(transaction=False)
+        for bucket in range(current_bucket - self.n_buckets + 1, current_bucket + 1):
+            bitfield = operation.bitfield(self.__bucket_key(bucket))
+            for offset in offsets:
+                bitfield.get("u1", offset)
+            bitfield.execute()
+
+        return any(all(bits) for bits in operation.execute())
+
+    def __offsets(self, member: str) -> list[int]:
+        # Kirsch-Mitzenmacher: k hashes derived from two independent ones
+        digest = hashlib.blake2b(member.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def __current_bucket(self) -> int:
+        return int(self.clock() // self.bucket_seconds)
+
+    def __bucket_key(self, bucket: int) -> str:
+        return f"{self.namespace}:{bucket}"
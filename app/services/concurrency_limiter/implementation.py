@@ -0,0 +1,44 @@
+import threading
+
+from app.core.metrics import (
+    CONCURRENCY_LIMITER_IN_FLIGHT,
+    CONCURRENCY_LIMITER_LIMIT,
+    CONCURRENCY_LIMITER_REJECTIONS_TOTAL,
+)
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the calls in flight in this process. Never waits: a call over the
+    limit is rejected so the caller can shed it.
+    """
+
+    def __init__(self, name: str, limit: int):
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        self.name = name
+        self.limit = limit
+        self.__in_flight = 0
+        self.__lock = threading.Lock()
+
+        CONCURRENCY_LIMITER_LIMIT.labels(name).set(limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+    def try_acquire(self) -> bool:
+        with self.__lock:
+            if self.__in_flight >= self.limit:
+                CONCURRENCY_LIMITER_REJECTIONS_TOTAL.labels(self.name).inc()
+                return False
+            self.__in_flight += 1
+            CONCURRENCY_LIMITER_IN_FLIGHT.labels(self.name).set(self.__in_flight)
+            return True
+
+    def release(self) -> None:
+        with self.__lock:
+            if self.__in_flight == 0:
+                raise RuntimeError("release called more times than acquire")
+            self.__in_flight -= 1
+            CONCURRENCY_LIMITER_IN_FLIGHT.labels(self.name).set(self.__in_flight)
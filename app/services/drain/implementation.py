@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+import threading
+
+from app.core.metrics import DRAIN_IN_FLIGHT, DRAIN_WORK_TOTAL
+
+
+class DrainingError(Exception):
+    def __init__(self, tracker_name: str):
+        super().__init__(f"{tracker_name} is draining, no new work is accepted")
+        self.tracker_name = tracker_name
+
+
+class DrainTracker:
+    """
+    Counts the units of work in flight, so shutdown can stop accepting new
+    ones and wait for the rest. The leases (lock keys, claimed items) of the
+    work still in flight at the drain deadline are left to expire: that work
+    may still be running, releasing them would let another process do it a
+    second time.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.__condition = threading.Condition()
+        self.__active: set[object] = set()
+        self.__draining = False
+
+    @property
+    def draining(self) -> bool:
+        return self.__draining
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.__active)
+
+    @contextmanager
+    def track(self):
+        token = object()
+        with self.__condition:
+            if self.__draining:
+                raise DrainingError(self.name)
+            self.__active.add(token)
+            DRAIN_IN_FLIGHT.labels(self.name).set(len(self.__active))
+        try:
+            yield
+        finally:
+            with self.__condition:
+                self.__active.discard(token)
+                DRAIN_IN_FLIGHT.labels(self.name).set(len(self.__active))
+                self.__condition.notify_all()
+
+    def stop_accepting(self) -> None:
+        with self.__condition:
+            self.__draining = True
+
+    def drain(self, timeout: float) -> tuple[int, int]:
+        """
+        Returns how much of the work in flight finished within `timeout`
+        seconds and how much was abandoned.
+        """
+        with self.__condition:
+            self.__draining = True
+            started = len(self.__active)
+            self.__condition.wait_for(lambda: not self.__active, timeout)
+            abandoned = len(self.__active)
+
+        drained = started - abandoned
+        DRAIN_WORK_TOTAL.labels(self.name, "drained").inc(drained)
+        DRAIN_WORK_TOTAL.labels(self.name, "abandoned").inc(abandoned)
+        return drained, abandoned
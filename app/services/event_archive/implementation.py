@@ -0,0 +1,200 @@
+from datetime import datetime, timezone
+from typing import Optional
+import queue
+import sqlite3
+import threading
+import time
+
+from app.core.metrics import EVENT_ARCHIVE_FLUSH_SECONDS, EVENT_ARCHIVE_RECORDS_TOTAL
+from app.models.types import ArchivedEvent, EventOutcome
+
+# the event needs no (other) transfer. Not QUEUED: the outbox may still
+# dead-letter the transfer, the worker archives TRANSFERRED once it is sent
+DONE_OUTCOMES = (
+    EventOutcome.TRANSFERRED.value,
+    EventOutcome.SKIPPED.value,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    invoice_id TEXT,
+    created TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    amount INTEGER,
+    source TEXT NOT NULL,
+    archived TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_event_id ON events (event_id);
+CREATE INDEX IF NOT EXISTS events_invoice_id ON events (invoice_id);
+CREATE INDEX IF NOT EXISTS events_created ON events (created);
+"""
+
+COLUMNS = "event_id, invoice_id, created, outcome, amount, source, archived"
+
+
+def to_utc_text(value: datetime) -> str:
+    # a single format, so the text order is the time order
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+class SQLiteEventArchive:
+    """
+    Append-only record of the handled events and their transfer outcome, in
+    a local SQLite database in WAL mode, so readers never block the writer.
+    An event has a row per attempt. Each thread uses its own connection.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.__local = threading.local()
+        connection = self.__connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+
+    def append(self, records: list[ArchivedEvent]) -> None:
+        connection = self.__connection()
+        with connection:
+            connection.executemany(
+                f"INSERT INTO events ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        record.event_id,
+                        record.invoice_id,
+                        to_utc_text(record.created),
+                        record.outcome.value,
+                        record.amount,
+                        record.source,
+                        to_utc_text(record.archived),
+                    )
+                    for record in records
+                ],
+            )
+
+    def is_done(self, event_id: str) -> bool:
+        placeholders = ", ".join("?" * len(DONE_OUTCOMES))
+        row = (
+            self.__connection()
+            .execute(
+                "SELECT 1 FROM events "
+                f"WHERE event_id = ? AND outcome IN ({placeholders}) LIMIT 1",
+                (event_id, *DONE_OUTCOMES),
+            )
+            .fetchone()
+        )
+        return row is not None
+
+    def find_by_event(self, event_id: str) -> list[ArchivedEvent]:
+        return self.__select("event_id = ?", (event_id,))
+
+    def find_by_invoice(self, invoice_id: str) -> list[ArchivedEvent]:
+        return self.__select("invoice_id = ?", (invoice_id,))
+
+    def find_created_between(
+        self, start: datetime, end: datetime
+    ) -> list[ArchivedEvent]:
+        return self.__select(
+            "created >= ? AND created < ?", (to_utc_text(start), to_utc_text(end))
+        )
+
+    def __select(self, where: str, parameters: tuple) -> list[ArchivedEvent]:
+        rows = self.__connection().execute(
+            f"SELECT {COLUMNS} FROM events WHERE {where} ORDER BY id", parameters
+        )
+        return [
+            ArchivedEvent(
+                event_id=event_id,
+                invoice_id=invoice_id,
+                created=datetime.fromisoformat(created),
+                outcome=outcome,
+                amount=amount,
+                source=source,
+                archived=datetime.fromisoformat(archived),
+            )
+            for event_id, invoice_id, created, outcome, amount, source, archived in rows
+        ]
+
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            # with WAL a commit is durable across crashes of the process, only
+            # an OS crash can lose the last transactions
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+        return connection
+
+
+class BatchedEventArchiveWriter:
+    """
+    Appends to the archive from a background thread, in batches of up to
+    `max_batch_size` records or whatever arrived within `flush_interval`
+    seconds, so callers never wait for the disk. Records are dropped, and
+    counted, when more than `max_pending` are waiting.
+    """
+
+    __STOP = object()
+
+    def __init__(
+        self,
+        archive: SQLiteEventArchive,
+        max_batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+    ):
+        self.archive = archive
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.__queue = queue.Queue(maxsize=max_pending)
+        self.__thread = threading.Thread(
+            target=self.__run, name="event-archive-writer", daemon=True
+        )
+        self.__thread.start()
+
+    def submit(self, record: ArchivedEvent) -> bool:
+        try:
+            self.__queue.put_nowait(record)
+        except queue.Full:
+            EVENT_ARCHIVE_RECORDS_TOTAL.labels("dropped").inc()
+            return False
+        return True
+
+    def flush(self) -> None:
+        self.__queue.join()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        self.__queue.put(self.__STOP)
+        self.__thread.join(timeout)
+
+    def __run(self) -> None:
+        while True:
+            batch = [self.__queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not self.__STOP and len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.__queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not self.__STOP]
+            try:
+                if records:
+                    with EVENT_ARCHIVE_FLUSH_SECONDS.time():
+                        self.archive.append(records)
+                    EVENT_ARCHIVE_RECORDS_TOTAL.labels("written").inc(len(records))
+            except Exception:
+                # the archive is a record, losing it must not stop the payments
+                EVENT_ARCHIVE_RECORDS_TOTAL.labels("failed").inc(len(records))
+            finally:
+                for _ in batch:
+                    self.__queue.task_done()
+
+            if len(records) < len(batch):
+                return
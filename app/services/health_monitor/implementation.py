@@ -0,0 +1,80 @@
+from typing import Callable, Iterable, Optional
+import threading
+import time
+
+READY = "ready"
+DEGRADED = "degraded"
+NOT_READY = "not_ready"
+
+
+class HealthMonitor:
+    """
+    Runs `checks` every `interval` seconds on a background thread and keeps
+    their latest results, so probes read a snapshot instead of reaching the
+    dependencies themselves.
+
+    A check returns what it saw, with `"ok": False` when the dependency is
+    degraded, and raises when it is unusable. A failed `required` check
+    makes the process not ready, any other one only degraded. So does a
+    snapshot older than `max_age`, the checks being stuck.
+    """
+
+    def __init__(
+        self,
+        checks: dict[str, Callable[[], dict]],
+        required: Iterable[str] = (),
+        interval: float = 5,
+        max_age: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.checks = checks
+        self.required = set(required)
+        self.interval = interval
+        self.max_age = 3 * interval if max_age is None else max_age
+        self.clock = clock
+        self.__results = None
+        self.__checked_at = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def refresh(self) -> None:
+        results = {}
+        for name, check in self.checks.items():
+            try:
+                results[name] = {"ok": True, **check()}
+            except Exception as e:
+                results[name] = {"ok": False, "error": str(e) or type(e).__name__}
+        # replaced at once, readers never see a snapshot half refreshed
+        self.__results, self.__checked_at = results, self.clock()
+
+    def snapshot(self) -> dict:
+        results, checked_at = self.__results, self.__checked_at
+        if results is None:
+            return {"status": NOT_READY, "checks": {}}
+
+        age = self.clock() - checked_at
+        failed = {name for name, result in results.items() if not result["ok"]}
+        if age > self.max_age or failed & self.required:
+            status = NOT_READY
+        elif failed:
+            status = DEGRADED
+        else:
+            status = READY
+        return {"status": status, "age_seconds": round(age, 3), "checks": results}
+
+    def start(self) -> None:
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="health-monitor", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            self.refresh()
+            self.__stop.wait(self.interval)
@@ -1,17 +1,31 @@
 import starkbank
+from typing import Optional
 from app.models.types import Invoice
+from app.core.resilience import get_starkbank_caller
 from app.services.invoice_service.interface import InvoiceSender
+from app.services.resilience.implementation import ResilientCaller
 
 
 class StarkBankInvoiceSender(InvoiceSender):
-    def __init__(self, starkbank_project: starkbank.Project):
+    def __init__(
+        self,
+        starkbank_project: starkbank.Project,
+        resilient_caller: Optional[ResilientCaller] = None,
+    ):
         self.starkbank_project = starkbank_project
+        self.resilient_caller = resilient_caller or get_starkbank_caller("invoice")
 
     def send_batch(self, invoices: list[Invoice]):
         stark_invoices = [
             self.__convert_to_starkbank_invoice(invoice) for invoice in invoices
         ]
-        starkbank.invoice.create(stark_invoices, user=self.starkbank_project)
+        self.resilient_caller.call(
+            "create",
+            starkbank.invoice.create,
+            stark_invoices,
+            user=self.starkbank_project,
+            idempotent=False,
+        )
 
     def send(self, invoice: Invoice):
         self.send_batch([invoice])
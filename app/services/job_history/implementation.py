@@ -0,0 +1,189 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+import json
+import logging
+import threading
+import time
+import uuid
+import redis
+
+from app.core.metrics import REDIS_OPERATION_SECONDS
+
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class JobRun:
+    """
+    A run of a scheduled job, with the items it handled by outcome and any
+    progress it reports. Changes are published at most every
+    `progress_interval` seconds while it runs, from the thread of the
+    history when `background`, so an event loop counting them never waits
+    for Redis.
+    """
+
+    def __init__(
+        self,
+        history: "RedisJobHistory",
+        job: str,
+        progress_interval: float,
+        clock: Callable[[], float],
+        background: bool = False,
+    ):
+        self.history = history
+        self.job = job
+        self.background = background
+        self.run_id = uuid.uuid4().hex
+        self.status = RUNNING
+        self.started_at = clock()
+        self.finished_at = None
+        self.error = None
+        self.counts = {}
+        self.progress = {}
+        self.progress_interval = progress_interval
+        self.clock = clock
+        self.__published_at = self.started_at
+        self.__lock = threading.Lock()
+
+    def count(self, outcome: str, amount: int = 1) -> None:
+        with self.__lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + amount
+        self.__publish_progress()
+
+    def report(self, **progress) -> None:
+        # e.g. the items left, to follow a backlog burning down
+        with self.__lock:
+            self.progress.update(progress)
+        self.__publish_progress()
+
+    def record(self) -> dict:
+        with self.__lock:
+            return {
+                "run_id": self.run_id,
+                "job": self.job,
+                "status": self.status,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "counts": dict(self.counts),
+                "progress": dict(self.progress),
+                "error": self.error,
+            }
+
+    def __publish_progress(self) -> None:
+        now = self.clock()
+        with self.__lock:
+            if now - self.__published_at < self.progress_interval:
+                return
+            self.__published_at = now
+        self.publish()
+
+    def publish(self) -> None:
+        if self.background:
+            self.history.publish_in_background(self)
+        else:
+            self.history.publish(self)
+
+
+class RedisJobHistory:
+    """
+    Records the runs of the scheduled jobs of the whole fleet: every change
+    of a run is appended to a capped Redis stream, and its latest state is
+    kept under its id for `ttl` seconds. Recording is best effort, a Redis
+    failure never fails the job.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        name: str = "jobs",
+        max_length: int = 10000,
+        ttl: int = 7 * 24 * 3600,
+        progress_interval: float = 5,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.redis_client = redis_client
+        self.stream_key = f"{name}:runs"
+        self.max_length = max_length
+        self.ttl = ttl
+        self.progress_interval = progress_interval
+        self.clock = clock
+        self.__prefix = f"{name}:run"
+        self.__publisher: Optional[ThreadPoolExecutor] = None
+        self.__publisher_lock = threading.Lock()
+
+    def start(self, job: str, background: bool = False) -> JobRun:
+        run = JobRun(self, job, self.progress_interval, self.clock, background)
+        run.publish()
+        return run
+
+    def finish(self, run: JobRun, error: Optional[BaseException] = None) -> None:
+        run.finished_at = self.clock()
+        if error is None:
+            run.status = SUCCEEDED
+        else:
+            run.status = FAILED
+            run.error = f"{type(error).__name__}: {error}"
+        run.publish()
+
+    def publish(self, run: JobRun) -> None:
+        record = json.dumps(run.record())
+        pipeline = self.redis_client.pipeline(transaction=False)
+        pipeline.xadd(
+            self.stream_key,
+            {"run_id": run.run_id, "run": record},
+            maxlen=self.max_length,
+            approximate=True,
+        )
+        pipeline.set(self.__run_key(run.run_id), record, ex=self.ttl)
+        try:
+            with REDIS_OPERATION_SECONDS.labels("job_history_publish").time():
+                pipeline.execute()
+        except redis.RedisError:
+            logger.warning("Could not record a job run", exc_info=True)
+
+    def publish_in_background(self, run: JobRun) -> Future:
+        # one thread, so the changes of a run are published in order
+        return self.__background().submit(self.publish, run)
+
+    def flush(self) -> Future:
+        """
+        Done once the changes published in the background so far are.
+        """
+        return self.__background().submit(lambda: None)
+
+    def __background(self) -> ThreadPoolExecutor:
+        with self.__publisher_lock:
+            if self.__publisher is None:
+                self.__publisher = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="job-history"
+                )
+            return self.__publisher
+
+    def run(self, run_id: str) -> Optional[dict]:
+        record = self.redis_client.get(self.__run_key(run_id))
+        return None if record is None else json.loads(record)
+
+    def runs(
+        self, job: Optional[str] = None, limit: int = 50, scan: int = 1000
+    ) -> list[dict]:
+        """
+        The latest state of the most recent runs, newest first, found among
+        the last `scan` changes recorded.
+        """
+        runs = {}
+        for _, fields in self.redis_client.xrevrange(self.stream_key, count=scan):
+            run_id = fields[b"run_id"].decode("utf-8")
+            if run_id in runs:
+                continue
+            record = json.loads(fields[b"run"])
+            if job is None or record["job"] == job:
+                runs[run_id] = record
+                if len(runs) == limit:
+                    break
+        return list(runs.values())
+
+    def __run_key(self, run_id: str) -> str:
+        return f"{self.__prefix}:{run_id}"
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+import threading
+import time
+
+from app.core.metrics import NEAR_CACHE_REQUESTS_TOTAL
+
+
+class TTLCache:
+    """
+    Small in-process set with a time-to-live per entry and LRU eviction
+    once `max_size` entries are stored.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.__entries: OrderedDict = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
+
+    def contains(self, key: Hashable) -> bool:
+        with self.__lock:
+            expires_at = self.__entries.get(key)
+            if expires_at is not None and expires_at <= self.clock():
+                del self.__entries[key]
+                expires_at = None
+
+            if expires_at is None:
+                NEAR_CACHE_REQUESTS_TOTAL.labels(self.name, "miss").inc()
+                return False
+
+            self.__entries.move_to_end(key)
+            NEAR_CACHE_REQUESTS_TOTAL.labels(self.name, "hit").inc()
+            return True
+
+    def add(self, key: Hashable) -> None:
+        with self.__lock:
+            self.__entries[key] = self.clock() + self.ttl
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
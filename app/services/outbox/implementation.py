@@ -0,0 +1,103 @@
+from typing import Optional
+import json
+
+from app.core.metrics import REDIS_OPERATION_SECONDS
+
+# credited invoices waiting for their transfer, filled by the webhook when
+# WEBHOOK_TRANSFER_MODE is "outbox" and drained by the worker role
+TRANSFERS = "transfers"
+
+
+class RedisOutbox:
+    """
+    Reliable Redis queue. A claimed item is moved to a processing list of
+    its consumer and stays there until it is acknowledged, so the items of
+    a consumer that dies (stops refreshing its heartbeat) are handed back
+    to the queue instead of being lost.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        name: str,
+        consumer_id: Optional[str] = None,
+        heartbeat_ttl: int = 60,
+    ):
+        self.redis_client = redis_client
+        self.consumer_id = consumer_id
+        self.heartbeat_ttl = heartbeat_ttl
+        self.queue_key = f"outbox:{name}"
+        self.dead_letter_key = f"outbox:{name}:dead"
+        self.consumers_key = f"outbox:{name}:consumers"
+        self.__prefix = f"outbox:{name}"
+
+    def push(self, item: dict) -> None:
+        with REDIS_OPERATION_SECONDS.labels("outbox_push").time():
+            self.redis_client.lpush(self.queue_key, json.dumps(item))
+
+    def claim(self, timeout: float) -> Optional[tuple[bytes, dict]]:
+        """
+        Waits up to `timeout` seconds for an item, returning the raw entry
+        (needed to acknowledge it) and the item.
+        """
+        self.heartbeat()
+        raw = self.redis_client.blmove(
+            self.queue_key,
+            self.__processing_key(self.consumer_id),
+            timeout,
+            "RIGHT",
+            "LEFT",
+        )
+        if raw is None:
+            return None
+        return raw, json.loads(raw)
+
+    def ack(self, raw: bytes) -> None:
+        self.redis_client.lrem(self.__processing_key(self.consumer_id), 1, raw)
+
+    def retry(self, raw: bytes) -> None:
+        # back at the end of the queue, after the items already waiting
+        pipeline = self.redis_client.pipeline()
+        pipeline.lrem(self.__processing_key(self.consumer_id), 1, raw)
+        pipeline.lpush(self.queue_key, raw)
+        pipeline.execute()
+
+    def dead_letter(self, raw: bytes) -> None:
+        pipeline = self.redis_client.pipeline()
+        pipeline.lrem(self.__processing_key(self.consumer_id), 1, raw)
+        pipeline.lpush(self.dead_letter_key, raw)
+        pipeline.execute()
+
+    def heartbeat(self) -> None:
+        pipeline = self.redis_client.pipeline()
+        pipeline.sadd(self.consumers_key, self.consumer_id)
+        pipeline.set(self.__heartbeat_key(self.consumer_id), "1", ex=self.heartbeat_ttl)
+        pipeline.execute()
+
+    def recover_abandoned(self) -> int:
+        """
+        Hands the items of consumers without a heartbeat back to the front of
+        the queue, returning how many were recovered.
+        """
+        recovered = 0
+        for consumer_id in self.redis_client.smembers(self.consumers_key):
+            consumer_id = consumer_id.decode("utf-8")
+            if self.redis_client.exists(self.__heartbeat_key(consumer_id)):
+                continue
+
+            processing_key = self.__processing_key(consumer_id)
+            while self.redis_client.lmove(
+                processing_key, self.queue_key, "RIGHT", "RIGHT"
+            ):
+                recovered += 1
+            self.redis_client.srem(self.consumers_key, consumer_id)
+        return recovered
+
+    def __len__(self) -> int:
+        return self.redis_client.llen(self.queue_key)
+
+    def __processing_key(self, consumer_id: str) -> str:
+        return f"{self.__prefix}:processing:{consumer_id}"
+
+    def __heartbeat_key(self, consumer_id: str) -> str:
+        return f"{self.__prefix}:heartbeat:{consumer_id}"
@@ -1,9 +1,11 @@
 from app.models.types import Person
-import faker
 
 
 class RandomPersonGetter:
     def __init__(self):
+        # faker takes long to import, only the invoice job needs it
+        import faker
+
         self.faker = faker.Faker("pt_BR")
 
     def get_random_person(self) -> Person:
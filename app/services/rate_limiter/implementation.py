@@ -0,0 +1,183 @@
+from typing import Callable, Optional
+
+from app.core.metrics import (
+    RATE_LIMITER_CAPACITY,
+    RATE_LIMITER_PENALTIES_TOTAL,
+    RATE_LIMITER_REFILL_RATE,
+    RATE_LIMITER_REJECTIONS_TOTAL,
+    RATE_LIMITER_TOKENS,
+)
+
+# The time of the Redis server, unless the caller gives one: the clocks of
+# the processes sharing a bucket may disagree.
+NOW = """
+local function now_or_server_time(given)
+    local now = tonumber(given)
+    if now then
+        return now
+    end
+    local time = redis.call('TIME')
+    return tonumber(time[1]) + tonumber(time[2]) / 1000000
+end
+"""
+
+# The rate a penalized bucket refills at: it grows back linearly from the
+# penalized rate, regaining the full rate over `recovery` seconds.
+CURRENT_RATE = """
+local function current_rate(state, rate, recovery, now)
+    local penalized_rate = tonumber(state[3])
+    if not penalized_rate then
+        return rate
+    end
+    local penalized_at = tonumber(state[4])
+    return math.min(rate, penalized_rate + rate * math.max(0, now - penalized_at) / recovery)
+end
+"""
+
+# Refills the bucket for the time elapsed since the last call and takes
+# the requested tokens if, after that, at least `reserve` tokens are left.
+# Runs atomically in Redis, so every process shares the same budget.
+TOKEN_BUCKET_SCRIPT = NOW + CURRENT_RATE + """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = now_or_server_time(ARGV[3])
+local requested = tonumber(ARGV[4])
+local reserve = tonumber(ARGV[5])
+local recovery = tonumber(ARGV[6])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'penalized_rate', 'penalized_at')
+local refill_rate = current_rate(state, rate, recovery, now)
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill_rate)
+
+local acquired = 0
+local wait = 0
+if tokens - requested >= reserve then
+    tokens = tokens - requested
+    acquired = 1
+else
+    wait = (requested + reserve - tokens) / refill_rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+if refill_rate >= rate then
+    redis.call('HDEL', KEYS[1], 'penalized_rate', 'penalized_at')
+end
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate + recovery))
+return {acquired, tostring(tokens), tostring(wait), tostring(refill_rate)}
+"""
+
+# Multiplicative decrease: cuts the current rate by `factor`, never below
+# `min_rate`, and empties the bucket so the burst stops right away.
+PENALIZE_SCRIPT = NOW + CURRENT_RATE + """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = now_or_server_time(ARGV[3])
+local factor = tonumber(ARGV[4])
+local min_rate = tonumber(ARGV[5])
+local recovery = tonumber(ARGV[6])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated', 'penalized_rate', 'penalized_at')
+local penalized_rate = math.max(min_rate, current_rate(state, rate, recovery, now) * factor)
+
+redis.call('HSET', KEYS[1], 'tokens', '0', 'updated', tostring(now),
+    'penalized_rate', tostring(penalized_rate), 'penalized_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / penalized_rate + recovery))
+return tostring(penalized_rate)
+"""
+
+
+class RedisTokenBucket:
+    """
+    Token bucket shared by every process through Redis: `rate` tokens are
+    added per second, up to `capacity`. The rate can be cut when the
+    upstream pushes back and recovers to `rate` over `recovery` seconds.
+    Time is read from the Redis server, or from `clock` when given.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        name: str,
+        rate: float,
+        capacity: float,
+        min_rate: Optional[float] = None,
+        recovery: float = 60,
+        clock: Optional[Callable[[], float]] = None,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if min_rate is not None and not 0 < min_rate <= rate:
+            raise ValueError("min_rate must be positive and not above rate")
+        if recovery <= 0:
+            raise ValueError("recovery must be positive")
+        self.redis_client = redis_client
+        self.name = name
+        self.key = f"ratelimit:{name}"
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate or rate / 10
+        self.recovery = recovery
+        self.clock = clock
+        self.__acquire_script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.__penalize_script = redis_client.register_script(PENALIZE_SCRIPT)
+
+        RATE_LIMITER_REFILL_RATE.labels(name).set(rate)
+        RATE_LIMITER_CAPACITY.labels(name).set(capacity)
+
+    def try_acquire(self, tokens: float = 1, reserve: float = 0) -> tuple[bool, float]:
+        """
+        Returns whether the tokens were taken and, if not, how many seconds
+        until they are available. `reserve` tokens are left in the bucket
+        for other callers.
+        """
+        acquired, remaining, wait, refill_rate = self.__acquire_script(
+            keys=[self.key],
+            args=[
+                self.rate,
+                self.capacity,
+                self.__now(),
+                tokens,
+                reserve,
+                self.recovery,
+            ],
+        )
+
+        RATE_LIMITER_TOKENS.labels(self.name).set(float(remaining))
+        RATE_LIMITER_REFILL_RATE.labels(self.name).set(float(refill_rate))
+        if not acquired:
+            RATE_LIMITER_REJECTIONS_TOTAL.labels(self.name).inc()
+        return bool(acquired), float(wait)
+
+    def penalize(self, factor: float = 0.5) -> float:
+        """
+        Cuts the refill rate of every process sharing the bucket, returning
+        the new rate.
+        """
+        if not 0 < factor < 1:
+            raise ValueError("factor must be between 0 and 1")
+        refill_rate = float(
+            self.__penalize_script(
+                keys=[self.key],
+                args=[
+                    self.rate,
+                    self.capacity,
+                    self.__now(),
+                    factor,
+                    self.min_rate,
+                    self.recovery,
+                ],
+            )
+        )
+
+        RATE_LIMITER_PENALTIES_TOTAL.labels(self.name).inc()
+        RATE_LIMITER_REFILL_RATE.labels(self.name).set(refill_rate)
+        RATE_LIMITER_TOKENS.labels(self.name).set(0)
+        return refill_rate
+
+    def __now(self) -> str:
+        # empty for the script to read the time of the server
+        return "" if self.clock is None else repr(self.clock())
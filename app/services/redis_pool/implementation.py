@@ -0,0 +1,106 @@
+from typing import Any, Callable
+import threading
+import time
+import redis
+import redis.asyncio
+import redis.asyncio.sentinel
+import redis.sentinel
+
+from app.core.metrics import (
+    REDIS_POOL_CONNECTIONS_CREATED_TOTAL,
+    REDIS_POOL_CONNECTIONS_IN_USE,
+    REDIS_POOL_MAX_CONNECTIONS,
+    REDIS_POOL_WAIT_SECONDS,
+)
+
+
+class PoolMetrics:
+    """
+    Mixin for the connection pools of redis-py, exporting under `pool_name`
+    the connections checked out, the time taken to check one out and the
+    connections opened.
+    """
+
+    def __init__(self, *args, pool_name: str = "default", **kwargs):
+        self.pool_name = pool_name
+        super().__init__(*args, **kwargs)
+        # summed with the other pools of the name, one per node on a cluster
+        REDIS_POOL_MAX_CONNECTIONS.labels(pool_name).inc(self.max_connections)
+
+    def make_connection(self):
+        REDIS_POOL_CONNECTIONS_CREATED_TOTAL.labels(self.pool_name).inc()
+        return super().make_connection()
+
+    def _checked_out(self, start: float) -> None:
+        REDIS_POOL_WAIT_SECONDS.labels(self.pool_name).observe(
+            time.perf_counter() - start
+        )
+        REDIS_POOL_CONNECTIONS_IN_USE.labels(self.pool_name).inc()
+
+    def _released(self) -> None:
+        REDIS_POOL_CONNECTIONS_IN_USE.labels(self.pool_name).dec()
+
+
+class SyncPoolMetrics(PoolMetrics):
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = super().get_connection(*args, **kwargs)
+        self._checked_out(start)
+        return connection
+
+    def release(self, connection) -> None:
+        self._released()
+        super().release(connection)
+
+
+class AsyncPoolMetrics(PoolMetrics):
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = await super().get_connection(*args, **kwargs)
+        self._checked_out(start)
+        return connection
+
+    async def release(self, connection) -> None:
+        self._released()
+        await super().release(connection)
+
+
+class InstrumentedConnectionPool(SyncPoolMetrics, redis.BlockingConnectionPool):
+    pass
+
+
+class InstrumentedSentinelConnectionPool(
+    SyncPoolMetrics, redis.sentinel.SentinelConnectionPool
+):
+    pass
+
+
+class AsyncInstrumentedConnectionPool(
+    AsyncPoolMetrics, redis.asyncio.BlockingConnectionPool
+):
+    pass
+
+
+class AsyncInstrumentedSentinelConnectionPool(
+    AsyncPoolMetrics, redis.asyncio.sentinel.SentinelConnectionPool
+):
+    pass
+
+
+class RedisPoolRegistry:
+    """
+    The Redis clients of the process by pool name. Each one is created by
+    `connect` the first time its name is asked for, then shared by every
+    module asking for it, so a process opens one pool per name.
+    """
+
+    def __init__(self, connect: Callable[[str], Any]):
+        self.connect = connect
+        self.__clients = {}
+        self.__lock = threading.Lock()
+
+    def client(self, name: str) -> Any:
+        with self.__lock:
+            if name not in self.__clients:
+                self.__clients[name] = self.connect(name)
+            return self.__clients[name]
@@ -0,0 +1,336 @@
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypeVar
+import random
+import threading
+import time
+
+import redis
+
+from app.core.metrics import (
+    CIRCUIT_BREAKER_REJECTIONS_TOTAL,
+    CIRCUIT_BREAKER_STATE,
+    RATE_LIMITER_WAIT_SECONDS,
+    STARKBANK_REQUEST_SECONDS,
+    STARKBANK_RETRIES_TOTAL,
+)
+from app.services.rate_limiter.implementation import RedisTokenBucket
+
+T = TypeVar("T")
+
+# the request surely did not reach Stark Bank, it is always safe to retry
+UNAVAILABLE = "unavailable"
+# the request may have been processed, only idempotent calls are retried
+SERVER_ERROR = "server_error"
+
+# The SDK drops the HTTP status of anything that is not 200, 400 or 500 and
+# raises UnknownError with the response body (or, for network failures,
+# "<requests exception name>: <cause>"), so those are classified by content.
+RATE_LIMITED_MARKERS = (
+    "too many requests",
+    "toomanyrequests",
+    "rate limit",
+    "ratelimit",
+)
+UNAVAILABLE_MARKERS = RATE_LIMITED_MARKERS + (
+    "connecttimeout",
+    "newconnectionerror",
+    "nameresolutionerror",
+    "service unavailable",
+    "temporarily unavailable",
+)
+SERVER_ERROR_MARKERS = (
+    "connectionerror",
+    "readtimeout",
+    "timeout",
+    "chunkedencodingerror",
+    "bad gateway",
+    "gateway timeout",
+    "gateway time-out",
+)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, breaker_name: str):
+        super().__init__(f"Circuit breaker '{breaker_name}' is open")
+        self.breaker_name = breaker_name
+
+
+class RateLimitedError(Exception):
+    def __init__(self, limiter_name: str):
+        super().__init__(f"Rate limiter '{limiter_name}' has no tokens left")
+        self.limiter_name = limiter_name
+
+
+def is_rate_limited(exception: Exception) -> bool:
+    import starkbank
+
+    if not isinstance(exception, starkbank.error.UnknownError):
+        return False
+    message = str(exception).lower()
+    return any(marker in message for marker in RATE_LIMITED_MARKERS)
+
+
+def classify_starkbank_error(exception: Exception) -> Optional[str]:
+    """
+    Returns UNAVAILABLE, SERVER_ERROR or None when the error is not transient
+    (invalid input, authentication, bugs...) and must not be retried.
+    """
+    import starkbank
+
+    if isinstance(exception, starkbank.error.InternalServerError):
+        return SERVER_ERROR
+
+    if isinstance(exception, starkbank.error.UnknownError):
+        message = str(exception).lower()
+        if any(marker in message for marker in UNAVAILABLE_MARKERS):
+            return UNAVAILABLE
+        if any(marker in message for marker in SERVER_ERROR_MARKERS):
+            return SERVER_ERROR
+
+    return None
+
+
+def is_transient(exception: Exception) -> bool:
+    """
+    Whether the same Stark Bank call may succeed later. Calls that create
+    resources can only be repeated when they are idempotent. A breaker or
+    budget refusing the call is not covered, callers handle those apart.
+    """
+    return classify_starkbank_error(exception) is not None
+
+
+class CircuitBreaker:
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.__lock = threading.Lock()
+        self.__failures = 0
+        self.__opened_at = None
+        self.__probing = False
+        self.__set_state(self.CLOSED)
+
+    @property
+    def state(self) -> int:
+        with self.__lock:
+            if self.__state == self.OPEN and self.__recovered():
+                return self.HALF_OPEN
+            return self.__state
+
+    def before_call(self) -> None:
+        with self.__lock:
+            if self.__state == self.CLOSED:
+                return
+
+            # after the recovery timeout a single probe call is let through
+            if self.__recovered() and not self.__probing:
+                self.__probing = True
+                self.__set_state(self.HALF_OPEN)
+                return
+
+        CIRCUIT_BREAKER_REJECTIONS_TOTAL.labels(self.name).inc()
+        raise CircuitOpenError(self.name)
+
+    def cancel_call(self) -> None:
+        """
+        The call let through by `before_call` was not made: a probe leaves
+        its place to the next call.
+        """
+        with self.__lock:
+            self.__probing = False
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__failures = 0
+            self.__probing = False
+            self.__opened_at = None
+            self.__set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self.__lock:
+            self.__failures += 1
+            if self.__probing or self.__failures >= self.failure_threshold:
+                self.__probing = False
+                self.__opened_at = self.clock()
+                self.__set_state(self.OPEN)
+
+    def __recovered(self) -> bool:
+        return (
+            self.__opened_at is not None
+            and self.clock() - self.__opened_at >= self.recovery_timeout
+        )
+
+    def __set_state(self, state: int) -> None:
+        self.__state = state
+        CIRCUIT_BREAKER_STATE.labels(self.name).set(state)
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 5,
+        deadline: float = 30,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt: int) -> float:
+        # "full jitter": spreads the retries of every worker hitting the same
+        # failure instead of having them come back in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class ResilientCaller:
+    """
+    Runs Stark Bank SDK calls of one resource behind a circuit breaker,
+    retrying transient failures with jittered exponential backoff until the
+    attempts or the per-call deadline run out.
+
+    With a rate limiter, every request first waits for a token. Low priority
+    calls leave `low_priority_reserve` tokens for the high priority ones, and
+    a 429 cuts the rate of the whole fleet.
+    """
+
+    def __init__(
+        self,
+        resource: str,
+        circuit_breaker: CircuitBreaker,
+        retry_policy: RetryPolicy,
+        rate_limiter: Optional[RedisTokenBucket] = None,
+        low_priority_reserve: float = 0,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.resource = resource
+        self.circuit_breaker = circuit_breaker
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.low_priority_reserve = low_priority_reserve
+        self.sleep = sleep
+        self.clock = clock
+
+    def call(
+        self,
+        method: str,
+        function: Callable[..., T],
+        *args,
+        idempotent: bool = True,
+        high_priority: bool = False,
+        **kwargs,
+    ) -> T:
+        deadline = self.clock() + self.retry_policy.deadline
+        attempt = 0
+        while True:
+            self.__admit(deadline, high_priority)
+            try:
+                with STARKBANK_REQUEST_SECONDS.labels(self.resource, method).time():
+                    result = function(*args, **kwargs)
+            except Exception as e:
+                reason = self.__record_failure(e)
+                if reason is None:
+                    raise
+
+                attempt += 1
+                retryable = reason == UNAVAILABLE or idempotent
+                if not retryable or attempt >= self.retry_policy.max_attempts:
+                    raise
+
+                delay = self.retry_policy.backoff(attempt)
+                if self.clock() + delay >= deadline:
+                    raise
+
+                STARKBANK_RETRIES_TOTAL.labels(self.resource, method, reason).inc()
+                self.sleep(delay)
+                continue
+
+            self.circuit_breaker.record_success()
+            return result
+
+    @contextmanager
+    def guard(
+        self, acquire: bool = True, high_priority: bool = False
+    ) -> Iterator[None]:
+        """
+        Circuit breaker without retries, for work that cannot be replayed
+        safely such as advancing the SDK's lazy query generators. `acquire`
+        tells whether the work makes a request and needs a token.
+        """
+        if acquire:
+            self.__admit(self.clock() + self.retry_policy.deadline, high_priority)
+        else:
+            self.circuit_breaker.before_call()
+        try:
+            yield
+        except Exception as e:
+            self.__record_failure(e)
+            raise
+        self.circuit_breaker.record_success()
+
+    def __admit(self, deadline: float, high_priority: bool) -> None:
+        # the breaker first, an open circuit must not spend the tokens of the
+        # fleet; a probe that gets no token is given back
+        self.circuit_breaker.before_call()
+        try:
+            self.__acquire(deadline, high_priority)
+        except RateLimitedError:
+            self.circuit_breaker.cancel_call()
+            raise
+
+    def __acquire(self, deadline: float, high_priority: bool) -> None:
+        if self.rate_limiter is None:
+            return
+
+        reserve = 0 if high_priority else self.low_priority_reserve
+        priority = "high" if high_priority else "low"
+        start = self.clock()
+        try:
+            while True:
+                try:
+                    acquired, wait = self.rate_limiter.try_acquire(reserve=reserve)
+                except redis.RedisError:
+                    # fail open, losing Redis must not stop the payments
+                    return
+                if acquired:
+                    return
+
+                # jittered, so the waiting workers do not all come back at once
+                delay = wait + random.uniform(0, wait)
+                if self.clock() + delay >= deadline:
+                    raise RateLimitedError(self.rate_limiter.name)
+                self.sleep(delay)
+        finally:
+            RATE_LIMITER_WAIT_SECONDS.labels(self.rate_limiter.name, priority).observe(
+                self.clock() - start
+            )
+
+    def __record_failure(self, exception: Exception) -> Optional[str]:
+        if self.rate_limiter is not None and is_rate_limited(exception):
+            try:
+                self.rate_limiter.penalize()
+            except redis.RedisError:
+                pass
+
+        reason = classify_starkbank_error(exception)
+        if reason is None:
+            # the upstream answered, it is not degraded
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+        return reason
@@ -0,0 +1,67 @@
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread in the current process
+    (event loop, scheduler threads, executor threads) at a fixed interval
+    and aggregates them in the collapsed-stack format used by flamegraph.pl
+    and speedscope: "thread;outer_frame;...;inner_frame count".
+    """
+
+    def __init__(self, interval: float = 0.01):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+        self.__running = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self.__running.locked()
+
+    def profile(self, duration: float) -> str:
+        if duration <= 0:
+            raise ValueError("duration must be positive")
+        if not self.__running.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+
+        try:
+            stacks = self.__sample(duration)
+        finally:
+            self.__running.release()
+
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+    def __sample(self, duration: float) -> Counter:
+        stacks = Counter()
+        sampler_thread_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+
+        while time.monotonic() < deadline:
+            thread_names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_thread_id:
+                    continue
+
+                frames = []
+                while frame is not None:
+                    frames.append(self.__frame_label(frame))
+                    frame = frame.f_back
+                frames.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(reversed(frames))] += 1
+
+            time.sleep(self.interval)
+
+        return stacks
+
+    @staticmethod
+    def __frame_label(frame) -> str:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        return f"{code.co_name} ({filename}:{code.co_firstlineno})"
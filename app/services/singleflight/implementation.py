@@ -0,0 +1,64 @@
+from typing import Awaitable, Callable, Hashable, TypeVar
+import asyncio
+
+from app.core.metrics import SINGLEFLIGHT_COALESCED_TOTAL
+
+T = TypeVar("T")
+
+
+class LeaderCancelledError(Exception):
+    pass
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function and the others wait for its result instead of running it again.
+    Calls are only shared while in flight, nothing is cached afterwards.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.__calls: dict = {}
+
+    async def do(
+        self,
+        key: Hashable,
+        function: Callable[[], Awaitable[T]],
+        share_errors: bool = True,
+    ) -> tuple[T, bool]:
+        """
+        Returns the result and whether it was shared by another caller.
+        With `share_errors=False` a waiting caller runs the function itself
+        when the call it waited on failed.
+        """
+        while True:
+            future = self.__calls.get(key)
+            if future is None:
+                return await self.__lead(key, function), False
+
+            SINGLEFLIGHT_COALESCED_TOTAL.labels(self.name).inc()
+            try:
+                return await asyncio.shield(future), True
+            except Exception:
+                if share_errors:
+                    raise
+
+    async def __lead(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        future = asyncio.get_running_loop().create_future()
+        self.__calls[key] = future
+        try:
+            result = await function()
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelledError())
+            future.exception()  # retrieved, even when nobody was waiting
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.__calls[key]
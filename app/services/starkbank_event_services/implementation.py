@@ -1,64 +1,174 @@
 import starkbank
 from app.models.types import StarkBankEvent
-from typing import Generator
+from app.core.resilience import get_starkbank_caller
+from app.services.resilience.implementation import ResilientCaller
+from typing import Generator, Iterable, Optional, TypeVar
+import contextvars
+import queue
+import threading
+
+T = TypeVar("T")
+
+# the most events the API returns per request
+EVENTS_PAGE_SIZE = 100
+
+# marks the end of the pages, with the exception that ended them if any
+_DONE = object()
+
+
+def prefetched(items: Iterable[T], read_ahead: int) -> Generator[T, None, None]:
+    """
+    Iterates `items` on a background thread, at most `read_ahead` items
+    ahead of the caller, so producing the next ones overlaps with the
+    caller's work on the current one. An exception raised by `items` is
+    raised to the caller, in order. Closing the generator stops the thread
+    after the item it is producing, if any.
+    """
+    buffer = queue.Queue(maxsize=read_ahead)
+    stopped = threading.Event()
+
+    def put(entry) -> bool:
+        if stopped.is_set():
+            return False
+        # a put blocked on a full buffer is freed by the caller emptying it
+        buffer.put(entry)
+        return not stopped.is_set()
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((_DONE, e))
+        else:
+            put((_DONE, None))
+
+    thread = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(produce,),
+        name="prefetch",
+        daemon=True,
+    )
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        while True:
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                break
+
+
+def public_fields(resource) -> dict:
+    # the SDK resources keep their fields as plain instance attributes
+    return {
+        name: value
+        for name, value in vars(resource).items()
+        if not name.startswith("_") and not callable(value)
+    }
+
+
+def event_from_starkbank(starkbank_event: starkbank.Event) -> StarkBankEvent:
+    """
+    The application model of an event fetched from Stark Bank. The SDK
+    already parsed it from an authenticated response, so it is trusted and
+    built without validating it again.
+    """
+    log = starkbank_event.log
+    log_dict = {
+        "id": log.id,
+        "created": log.created,
+        "type": log.type,
+        "errors": log.errors,
+    }
+    for name, value in public_fields(log).items():
+        if name in log_dict:
+            continue
+        if hasattr(value, "__dict__"):
+            log_dict[name] = public_fields(value)
+        else:
+            log_dict[name] = value
+
+    return StarkBankEvent.model_construct(
+        created=starkbank_event.created,
+        id=starkbank_event.id,
+        log=log_dict,
+        subscription=starkbank_event.subscription,
+        workspaceId=starkbank_event.workspace_id,
+    )
 
 
 class StarkBankEventFetcher:
-    def __init__(self, starkbank_project: starkbank.Project):
+    """
+    Pages through the undelivered events, `page_size` at a time. With a
+    `read_ahead`, the next pages are fetched in the background while the
+    caller handles the current one, up to `read_ahead` pages ahead.
+    """
+
+    def __init__(
+        self,
+        starkbank_project: starkbank.Project,
+        resilient_caller: Optional[ResilientCaller] = None,
+        page_size: int = EVENTS_PAGE_SIZE,
+        read_ahead: int = 0,
+    ):
         self.starkbank_project = starkbank_project
+        self.resilient_caller = resilient_caller or get_starkbank_caller("event")
+        self.page_size = page_size
+        self.read_ahead = read_ahead
+
+    def fetch_undelivered_event_pages(
+        self,
+    ) -> Generator[list[StarkBankEvent], None, None]:
+        cursor = None
+        while True:
+            # each page is a request of its own, retried on its own
+            events, cursor = self.resilient_caller.call(
+                "query",
+                starkbank.event.page,
+                cursor=cursor,
+                limit=self.page_size,
+                is_delivered=False,
+                user=self.starkbank_project,
+            )
+            yield [event_from_starkbank(event) for event in events]
+            if not cursor:
+                break
 
     def fetch_undelivered_events(self) -> Generator[StarkBankEvent, None, None]:
-        events = starkbank.event.query(is_delivered=False, user=self.starkbank_project)
-        for event in events:
-            yield self.__convert_to_application_model(event)
-
-    def __convert_to_application_model(
-        self, starkbank_event: starkbank.Event
-    ) -> StarkBankEvent:
-        log = starkbank_event.log
-        log_dict = {
-            "id": log.id,
-            "created": log.created,
-            "type": log.type,
-            "errors": log.errors,
-        }
-
-        for attr_name in dir(log):
-            if attr_name.startswith("_"):
-                continue
-
-            if attr_name in log_dict:
-                continue
-
-            attr_value = getattr(log, attr_name)
-
-            if callable(attr_value):
-                continue
-
-            if hasattr(attr_value, "__dict__"):
-                sub_dict = {}
-                for sub_attr in dir(attr_value):
-                    if sub_attr.startswith("_"):
-                        continue
-                    sub_value = getattr(attr_value, sub_attr)
-                    if not callable(sub_value):
-                        sub_dict[sub_attr] = sub_value
-                log_dict[attr_name] = sub_dict
-            else:
-                log_dict[attr_name] = attr_value
-
-        return StarkBankEvent(
-            created=starkbank_event.created,
-            id=starkbank_event.id,
-            log=log_dict,
-            subscription=starkbank_event.subscription,
-            workspaceId=starkbank_event.workspace_id,
-        )
+        pages = self.fetch_undelivered_event_pages()
+        if self.read_ahead > 0:
+            pages = prefetched(pages, self.read_ahead)
+        try:
+            for page in pages:
+                yield from page
+        finally:
+            pages.close()
 
 
 class StarkBankEventStatusChanger:
-    def __init__(self, starkbank_project: starkbank.Project):
+    def __init__(
+        self,
+        starkbank_project: starkbank.Project,
+        resilient_caller: Optional[ResilientCaller] = None,
+    ):
         self.starkbank_project = starkbank_project
+        self.resilient_caller = resilient_caller or get_starkbank_caller("event")
 
     def mark_as_delivered(self, event_id: str) -> None:
-        starkbank.event.update(event_id, is_delivered=True, user=self.starkbank_project)
+        self.resilient_caller.call(
+            "update",
+            starkbank.event.update,
+            event_id,
+            is_delivered=True,
+            user=self.starkbank_project,
+        )
@@ -9,7 +9,8 @@ from cryptography.hazmat.primitives import serialization
 
 
 class StarkBankSignatureVerifier:
-    def __init__(self, starkbank_project: Project):
+    def __init__(self, starkbank_project: Project, timeout: float = 10):
+        self.timeout = timeout
         self.api_url = (
             "https://sandbox.api.starkbank.com"
             if starkbank_project.environment == "sandbox"
@@ -37,7 +38,7 @@ class StarkBankSignatureVerifier:
         raise Exception("No valid public key found for the signature datetime")
 
     def __get_public_keys(self):
-        response = requests.get(f"{self.api_url}/v2/public-key")
+        response = requests.get(f"{self.api_url}/v2/public-key", timeout=self.timeout)
         if response.status_code != 200:
             raise Exception(f"Failed to get signatures: {response.status_code}")
         public_keys = [
@@ -0,0 +1,126 @@
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable
+import json
+import logging
+import queue
+import random
+
+from app.core.metrics import LOG_RECORDS_TOTAL
+
+# attributes of every record, the others were given with `extra`
+STANDARD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None)).keys()
+) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the fields given with `extra` and the
+    ones added by the filters of the handler.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in STANDARD_ATTRIBUTES and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds the fields returned by `context` to the records, in the thread that
+    logs them: the correlation ids live in its context variables. Fields
+    given with `extra` are kept.
+    """
+
+    def __init__(self, context: Callable[[], dict]):
+        super().__init__()
+        self.context = context
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, value in self.context().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps a `rate` share of the debug records, and all the others. The kept
+    debug records carry the rate, to count the dropped ones back.
+    """
+
+    def __init__(self, rate: float, draw: Callable[[], float] = random.random):
+        super().__init__()
+        self.rate = rate
+        self.draw = draw
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if self.draw() >= self.rate:
+            LOG_RECORDS_TOTAL.labels("sampled_out").inc()
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Only enqueues the records, the listener formats and writes them. A
+    record that finds the queue full is dropped rather than making the
+    caller wait.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the arguments and the traceback may change or go away before the
+        # listener gets to them, serialising is left to the listener
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_TOTAL.labels("dropped").inc()
+
+
+class LogPipeline:
+    """
+    Records logged through `handler` are written to `output` by a background
+    thread, up to `max_pending` of them waiting.
+    """
+
+    def __init__(self, output: logging.Handler, max_pending: int = 10000):
+        self.output = output
+        self.handler = NonBlockingQueueHandler(queue.Queue(maxsize=max_pending))
+        self.__listener = QueueListener(
+            self.handler.queue, output, respect_handler_level=True
+        )
+        self.__running = False
+
+    def start(self) -> None:
+        self.__listener.start()
+        self.__running = True
+
+    def stop(self) -> None:
+        # writes what is still queued
+        if self.__running:
+            self.__listener.stop()
+            self.__running = False
+        self.output.flush()
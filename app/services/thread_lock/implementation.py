@@ -1,5 +1,7 @@
-from app.services.thread_lock.interface import ThreadLock
+from app.services.thread_lock.interface import AsyncThreadLock, ThreadLock
+from app.core.metrics import REDIS_OPERATION_SECONDS
 import redis
+import redis.asyncio
 
 
 class RedisThreadLock(ThreadLock):
@@ -7,8 +9,22 @@ class RedisThreadLock(ThreadLock):
         self.redis_client = redis_client
 
     def lock(self, key: str, max_lock_time: int = 9999999999999) -> bool:
-        return self.redis_client.set(key, "1", ex=max_lock_time, nx=True)
+        with REDIS_OPERATION_SECONDS.labels("lock").time():
+            return self.redis_client.set(key, "1", ex=max_lock_time, nx=True)
 
     def unlock(self, key: str) -> None:
-        self.redis_client.delete(key)
-    
\ No newline at end of file
+        with REDIS_OPERATION_SECONDS.labels("unlock").time():
+            self.redis_client.delete(key)
+
+
+class AsyncRedisThreadLock(AsyncThreadLock):
+    def __init__(self, redis_client: redis.asyncio.Redis):
+        self.redis_client = redis_client
+
+    async def lock(self, key: str, max_lock_time: int = 9999999999999) -> bool:
+        with REDIS_OPERATION_SECONDS.labels("lock").time():
+            return await self.redis_client.set(key, "1", ex=max_lock_time, nx=True)
+
+    async def unlock(self, key: str) -> None:
+        with REDIS_OPERATION_SECONDS.labels("unlock").time():
+            await self.redis_client.delete(key)
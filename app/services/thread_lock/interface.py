@@ -9,3 +9,13 @@ class ThreadLock(ABC):
     @abstractmethod
     def unlock(self, key: str) -> None:
         pass
+
+
+class AsyncThreadLock(ABC):
+    @abstractmethod
+    async def lock(self, key: str, max_lock_time: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def unlock(self, key: str) -> None:
+        pass
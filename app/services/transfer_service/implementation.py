@@ -1,15 +1,52 @@
 import starkbank
+from typing import Optional
 from app.models.types import Transfer
+from app.core.metrics import STARKBANK_DUPLICATE_TRANSFERS_TOTAL
+from app.core.resilience import get_starkbank_caller
+from app.services.resilience.implementation import ResilientCaller
 from app.services.transfer_service.interface import TransferSender
 
+# the code of the input error Stark Bank answers a reused external id with.
+# It also covers malformed ids, which the ids derived from events never are
+REUSED_EXTERNAL_ID_CODE = "invalidExternalId"
+
+
+def is_duplicate_external_id(exception: starkbank.error.InputErrors) -> bool:
+    return bool(exception.errors) and all(
+        error.code == REUSED_EXTERNAL_ID_CODE for error in exception.errors
+    )
+
 
 class StarkBankTransferSender(TransferSender):
-    def __init__(self, starkbank_project: starkbank.Project):
+    def __init__(
+        self,
+        starkbank_project: starkbank.Project,
+        resilient_caller: Optional[ResilientCaller] = None,
+        high_priority: bool = False,
+    ):
         self.starkbank_project = starkbank_project
+        self.resilient_caller = resilient_caller or get_starkbank_caller("transfer")
+        self.high_priority = high_priority
 
     def send(self, transfer: Transfer):
-        transfer = self.__converto_to_starkbank_transfer(transfer)
-        starkbank.transfer.create([transfer], user=self.starkbank_project)
+        starkbank_transfer = self.__converto_to_starkbank_transfer(transfer)
+        try:
+            # Without an external id, creating a transfer twice pays twice,
+            # so it is only retried when the request surely did not reach
+            # Stark Bank. With one, the second is refused.
+            self.resilient_caller.call(
+                "create",
+                starkbank.transfer.create,
+                [starkbank_transfer],
+                user=self.starkbank_project,
+                idempotent=transfer.external_id is not None,
+                high_priority=self.high_priority,
+            )
+        except starkbank.error.InputErrors as e:
+            if transfer.external_id is None or not is_duplicate_external_id(e):
+                raise
+            # an earlier attempt (or another process) already created it
+            STARKBANK_DUPLICATE_TRANSFERS_TOTAL.inc()
 
     def __converto_to_starkbank_transfer(self, transfer: Transfer):
         return starkbank.Transfer(
@@ -20,6 +57,8 @@ class StarkBankTransferSender(TransferSender):
             name=transfer.account.name,
             tax_id=transfer.account.tax_id,
             amount=transfer.amount,
+            external_id=transfer.external_id,
+            tags=transfer.tags or None,
             rules=[
                 starkbank.transfer.Rule(
                     key="resendingLimit",
@@ -0,0 +1,224 @@
+from typing import Callable, Optional
+import json
+import time
+import uuid
+
+from app.core.metrics import REDIS_OPERATION_SECONDS
+from app.models.types import Account, SweepBatch
+
+# KEYS: credited marker, pending, total, accounts, last sweep
+# ARGV: event id, amount, marker ttl, account key, account, now
+CREDIT_SCRIPT = """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[3]) then
+    return false
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[4], ARGV[4], ARGV[5])
+-- the interval of an account never swept starts at its first credit
+redis.call('SET', KEYS[5], ARGV[6], 'NX')
+return redis.call('INCRBY', KEYS[3], ARGV[2])
+"""
+
+# KEYS: pending, total, batch, last sweep, open batches
+# ARGV: sweep id, now
+TAKE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+redis.call('RENAME', KEYS[1], KEYS[3])
+local total = redis.call('GET', KEYS[2])
+redis.call('DEL', KEYS[2])
+redis.call('SET', KEYS[4], ARGV[2])
+redis.call('SADD', KEYS[5], ARGV[1])
+return tonumber(total)
+"""
+
+
+def account_key(account: Account) -> str:
+    return f"{account.bank_code}:{account.branch}:{account.account}"
+
+
+class RedisTransferSweeper:
+    """
+    Nets credited invoices into one transfer per destination account. Each
+    credit is added atomically to the pending total of its account, once
+    per event. A sweep moves everything pending to a batch, which stays open
+    until it is completed (recorded in the ledger with the events it pays)
+    or failed. An open batch is sent again as the same transfer.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        namespace: str = "sweep",
+        credited_ttl: int = 7 * 24 * 3600,
+        ledger_max_length: int = 100000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.credited_ttl = credited_ttl
+        self.ledger_max_length = ledger_max_length
+        self.clock = clock
+        self.accounts_key = f"{namespace}:accounts"
+        self.ledger_key = f"{namespace}:ledger"
+        self.__credit = redis_client.register_script(CREDIT_SCRIPT)
+        self.__take = redis_client.register_script(TAKE_SCRIPT)
+
+    def credit(self, account: Account, event_id: str, amount: int) -> bool:
+        """
+        Returns False when the event was already credited.
+        """
+        key = account_key(account)
+        with REDIS_OPERATION_SECONDS.labels("sweep_credit").time():
+            total = self.__credit(
+                keys=[
+                    f"{self.namespace}:credited:{event_id}",
+                    self.__key(key, "pending"),
+                    self.__key(key, "total"),
+                    self.accounts_key,
+                    self.__key(key, "last"),
+                ],
+                args=[
+                    event_id,
+                    amount,
+                    self.credited_ttl,
+                    key,
+                    account.model_dump_json(),
+                    self.clock(),
+                ],
+            )
+        return total is not None
+
+    def accounts(self) -> list[Account]:
+        return [
+            Account.model_validate_json(raw)
+            for raw in self.redis_client.hvals(self.accounts_key)
+        ]
+
+    def pending_amount(self, account: Account) -> int:
+        return int(
+            self.redis_client.get(self.__key(account_key(account), "total")) or 0
+        )
+
+    def is_due(self, account: Account, threshold: int, interval: float) -> bool:
+        """
+        Whether the pending amount reached `threshold` or the last sweep was
+        `interval` seconds ago. An account never swept counts the interval
+        from its first credit.
+        """
+        key = account_key(account)
+        total, last = self.redis_client.mget(
+            self.__key(key, "total"), self.__key(key, "last")
+        )
+        if not total or int(total) <= 0:
+            return False
+        if int(total) >= threshold:
+            return True
+        # credited before the first credit recorded the time
+        return last is not None and self.clock() - float(last) >= interval
+
+    def take(self, account: Account) -> Optional[SweepBatch]:
+        key = account_key(account)
+        sweep_id = uuid.uuid4().hex
+        batch_key = self.__batch_key(key, sweep_id)
+        with REDIS_OPERATION_SECONDS.labels("sweep_take").time():
+            amount = self.__take(
+                keys=[
+                    self.__key(key, "pending"),
+                    self.__key(key, "total"),
+                    batch_key,
+                    self.__key(key, "last"),
+                    self.__key(key, "batches"),
+                ],
+                args=[sweep_id, self.clock()],
+            )
+        if amount is None:
+            return None
+        return self.batch(account, sweep_id)
+
+    def batch(self, account: Account, sweep_id: str) -> Optional[SweepBatch]:
+        credits = self.redis_client.hgetall(
+            self.__batch_key(account_key(account), sweep_id)
+        )
+        if not credits:
+            return None
+        return SweepBatch(
+            sweep_id=sweep_id,
+            account=account,
+            amount=sum(int(amount) for amount in credits.values()),
+            event_ids=sorted(event_id.decode() for event_id in credits),
+        )
+
+    def complete(self, batch: SweepBatch) -> None:
+        key = account_key(batch.account)
+        pipeline = self.redis_client.pipeline()
+        self.__record(pipeline, batch, "sent")
+        pipeline.delete(self.__batch_key(key, batch.sweep_id))
+        pipeline.srem(self.__key(key, "batches"), batch.sweep_id)
+        pipeline.execute()
+
+    def fail(self, batch: SweepBatch) -> None:
+        # not retried any more, the batch is kept for someone to check
+        key = account_key(batch.account)
+        pipeline = self.redis_client.pipeline()
+        self.__record(pipeline, batch, "failed")
+        pipeline.smove(
+            self.__key(key, "batches"), self.__key(key, "failed"), batch.sweep_id
+        )
+        pipeline.execute()
+
+    def open_batches(self, account: Account) -> list[str]:
+        """
+        The batches taken but neither completed nor failed: their
+        transfer may still have to be sent.
+        """
+        return self.__members(account, "batches")
+
+    def failed_batches(self, account: Account) -> list[str]:
+        return self.__members(account, "failed")
+
+    def ledger(self, count: int = 100) -> list[dict]:
+        """
+        The latest ledger entries, newest first.
+        """
+        return [
+            {
+                "sweep_id": fields[b"sweep_id"].decode(),
+                "account": fields[b"account"].decode(),
+                "amount": int(fields[b"amount"]),
+                "event_ids": json.loads(fields[b"event_ids"]),
+                "status": fields[b"status"].decode(),
+                "created": float(fields[b"created"]),
+            }
+            for _, fields in self.redis_client.xrevrange(self.ledger_key, count=count)
+        ]
+
+    def __record(self, client, batch: SweepBatch, status: str) -> None:
+        client.xadd(
+            self.ledger_key,
+            {
+                "sweep_id": batch.sweep_id,
+                "account": account_key(batch.account),
+                "amount": batch.amount,
+                "event_ids": json.dumps(batch.event_ids),
+                "status": status,
+                "created": self.clock(),
+            },
+            maxlen=self.ledger_max_length,
+            approximate=True,
+        )
+
+    def __members(self, account: Account, name: str) -> list[str]:
+        return sorted(
+            member.decode()
+            for member in self.redis_client.smembers(
+                self.__key(account_key(account), name)
+            )
+        )
+
+    def __key(self, account_key: str, name: str) -> str:
+        return f"{self.namespace}:{account_key}:{name}"
+
+    def __batch_key(self, account_key: str, sweep_id: str) -> str:
+        return f"{self.namespace}:{account_key}:batch:{sweep_id}"
@@ -0,0 +1,211 @@
+from typing import Callable, Optional
+
+from app.core.metrics import REDIS_OPERATION_SECONDS
+from app.services.rate_limiter.implementation import NOW
+
+# KEYS: items, ready, dead
+# ARGV: id, payload, id, payload...
+PUSH_SCRIPT = """
+local added = 0
+for i = 1, #ARGV, 2 do
+    if redis.call('HEXISTS', KEYS[3], ARGV[i]) == 0
+        and redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+        redis.call('RPUSH', KEYS[2], ARGV[i])
+        added = added + 1
+    end
+end
+return added
+"""
+
+# KEYS: items, ready, in flight
+# ARGV: now (empty for the time of the server), visibility timeout, count
+CLAIM_SCRIPT = NOW + """
+local now = now_or_server_time(ARGV[1])
+local visible_at = now + tonumber(ARGV[2])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now)
+for _, id in ipairs(expired) do
+    redis.call('ZREM', KEYS[3], id)
+    redis.call('RPUSH', KEYS[2], id)
+end
+local claimed = {}
+for _ = 1, tonumber(ARGV[3]) do
+    local id = redis.call('LPOP', KEYS[2])
+    if not id then
+        break
+    end
+    local payload = redis.call('HGET', KEYS[1], id)
+    if payload then
+        redis.call('ZADD', KEYS[3], visible_at, id)
+        table.insert(claimed, id)
+        table.insert(claimed, payload)
+    end
+end
+return claimed
+"""
+
+# KEYS: items, in flight, attempts
+# ARGV: ids
+ACK_SCRIPT = """
+for _, id in ipairs(ARGV) do
+    redis.call('HDEL', KEYS[1], id)
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('HDEL', KEYS[3], id)
+end
+"""
+
+# KEYS: in flight
+# ARGV: now, delay, ids
+VISIBLE_AT_SCRIPT = NOW + """
+local visible_at = now_or_server_time(ARGV[1]) + tonumber(ARGV[2])
+for i = 3, #ARGV do
+    redis.call('ZADD', KEYS[1], 'XX', visible_at, ARGV[i])
+end
+"""
+
+# KEYS: items, in flight, attempts, dead
+# ARGV: now, delay, max attempts, ids
+FAIL_SCRIPT = NOW + """
+local visible_at = now_or_server_time(ARGV[1]) + tonumber(ARGV[2])
+local dead = {}
+for i = 4, #ARGV do
+    local id = ARGV[i]
+    local payload = redis.call('HGET', KEYS[1], id)
+    if payload then
+        local attempts = redis.call('HINCRBY', KEYS[3], id, 1)
+        if attempts >= tonumber(ARGV[3]) then
+            redis.call('HSET', KEYS[4], id, payload)
+            redis.call('HDEL', KEYS[1], id)
+            redis.call('ZREM', KEYS[2], id)
+            redis.call('HDEL', KEYS[3], id)
+            table.insert(dead, id)
+        else
+            redis.call('ZADD', KEYS[2], 'XX', visible_at, id)
+        end
+    end
+end
+return dead
+"""
+
+
+class RedisWorkQueue:
+    """
+    Queue of items shared by the whole fleet, each one pushed once until it
+    is acknowledged. A claimed item is invisible for `visibility_timeout`
+    seconds: one not acknowledged by then, its consumer having died or
+    being stuck, is handed to the next consumer. Items are strings, by id.
+    One that failed `max_attempts` times goes to the dead letters, and is
+    not pushed again. Time is read from the Redis server, so the clocks of
+    the consumers do not matter, or from `clock` when given.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        name: str,
+        visibility_timeout: float = 300,
+        max_attempts: int = 5,
+        clock: Optional[Callable[[], float]] = None,
+    ):
+        self.redis_client = redis_client
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.items_key = f"{name}:items"
+        self.ready_key = f"{name}:ready"
+        self.in_flight_key = f"{name}:in_flight"
+        self.attempts_key = f"{name}:attempts"
+        self.dead_letter_key = f"{name}:dead"
+        self.__push = redis_client.register_script(PUSH_SCRIPT)
+        self.__claim = redis_client.register_script(CLAIM_SCRIPT)
+        self.__ack = redis_client.register_script(ACK_SCRIPT)
+        self.__fail = redis_client.register_script(FAIL_SCRIPT)
+        self.__visible_at = redis_client.register_script(VISIBLE_AT_SCRIPT)
+
+    def push(self, items: dict[str, str]) -> int:
+        """
+        Returns how many were added, the others being queued already.
+        """
+        if not items:
+            return 0
+        args = [value for item in items.items() for value in item]
+        with REDIS_OPERATION_SECONDS.labels("work_queue_push").time():
+            return self.__push(
+                keys=[self.items_key, self.ready_key, self.dead_letter_key],
+                args=args,
+            )
+
+    def claim(self, count: int) -> list[tuple[str, str]]:
+        with REDIS_OPERATION_SECONDS.labels("work_queue_claim").time():
+            claimed = self.__claim(
+                keys=[self.items_key, self.ready_key, self.in_flight_key],
+                args=[self.__now(), self.visibility_timeout, count],
+            )
+        return [
+            (claimed[i].decode("utf-8"), claimed[i + 1].decode("utf-8"))
+            for i in range(0, len(claimed), 2)
+        ]
+
+    def ack(self, ids: list[str]) -> None:
+        if ids:
+            with REDIS_OPERATION_SECONDS.labels("work_queue_ack").time():
+                self.__ack(
+                    keys=[self.items_key, self.in_flight_key, self.attempts_key],
+                    args=ids,
+                )
+
+    def extend(self, ids: list[str]) -> None:
+        """
+        Keeps claimed items invisible for another `visibility_timeout`
+        seconds, while a slow consumer still works on them.
+        """
+        if ids:
+            with REDIS_OPERATION_SECONDS.labels("work_queue_extend").time():
+                self.__visible_at(
+                    keys=[self.in_flight_key],
+                    args=[self.__now(), self.visibility_timeout, *ids],
+                )
+
+    def release(self, ids: list[str], delay: float = 0) -> None:
+        """
+        Hands claimed items back, to be claimed again after `delay` seconds.
+        """
+        if ids:
+            self.__visible_at(
+                keys=[self.in_flight_key], args=[self.__now(), delay, *ids]
+            )
+
+    def fail(self, ids: list[str], delay: float = 0) -> list[str]:
+        """
+        Hands back claimed items that failed, to be claimed again after
+        `delay` seconds. Returns the ones moved to the dead letters instead.
+        """
+        if not ids:
+            return []
+        with REDIS_OPERATION_SECONDS.labels("work_queue_fail").time():
+            dead = self.__fail(
+                keys=[
+                    self.items_key,
+                    self.in_flight_key,
+                    self.attempts_key,
+                    self.dead_letter_key,
+                ],
+                args=[self.__now(), delay, self.max_attempts, *ids],
+            )
+        return [id.decode("utf-8") for id in dead]
+
+    def dead_letters(self) -> dict[str, str]:
+        return {
+            id.decode("utf-8"): item.decode("utf-8")
+            for id, item in self.redis_client.hgetall(self.dead_letter_key).items()
+        }
+
+    def counts(self) -> dict[str, int]:
+        pipeline = self.redis_client.pipeline()
+        pipeline.llen(self.ready_key)
+        pipeline.zcard(self.in_flight_key)
+        ready, in_flight = pipeline.execute()
+        return {"ready": ready, "in_flight": in_flight}
+
+    def __now(self) -> str:
+        # empty for the scripts to read the time of the server
+        return "" if self.clock is None else repr(self.clock())
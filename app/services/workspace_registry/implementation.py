@@ -0,0 +1,89 @@
+from functools import cached_property
+from typing import TYPE_CHECKING, Iterator, Optional
+from app.models.types import Account
+
+if TYPE_CHECKING:
+    import starkbank
+
+
+class Workspace:
+    """
+    A Stark Bank workspace served by this deployment, with what its calls,
+    transfers and Redis keys need. The Project is built (parsing the
+    private key) the first time it is used, then kept.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        workspace_id: str,
+        environment: str,
+        private_key: str,
+        default_account: Account,
+        rate_limits: dict[str, float],
+        namespace: str = "",
+    ):
+        # the API credential its calls are signed with
+        self.project_id = project_id
+        # the Stark Bank workspace, named by the events it sends
+        self.workspace_id = workspace_id
+        self.environment = environment
+        self.private_key = private_key
+        self.default_account = default_account
+        self.rate_limits = rate_limits
+        self.namespace = namespace
+
+    @cached_property
+    def project(self) -> "starkbank.Project":
+        import starkbank
+
+        return starkbank.Project(
+            environment=self.environment,
+            id=self.project_id,
+            private_key=self.private_key,
+        )
+
+    def key(self, name: str) -> str:
+        # the main workspace keeps the keys it had before there were others
+        if not self.namespace:
+            return name
+        return f"{self.namespace}:{name}"
+
+    def __repr__(self) -> str:
+        return f"Workspace({self.workspace_id!r})"
+
+
+class WorkspaceRegistry:
+    """
+    The workspaces of the deployment by Stark Bank workspace id, the first
+    one being the default for work that does not say which workspace it
+    belongs to.
+    """
+
+    def __init__(self, workspaces: list[Workspace]):
+        if not workspaces:
+            raise ValueError("At least one workspace is needed")
+        self.default = workspaces[0]
+        self.workspaces = {
+            workspace.workspace_id: workspace for workspace in workspaces
+        }
+        self.__by_project = {
+            workspace.project_id: workspace for workspace in workspaces
+        }
+
+    def get(self, workspace_id: Optional[str]) -> Optional[Workspace]:
+        return self.workspaces.get(workspace_id)
+
+    def get_by_project(self, project_id: Optional[str]) -> Optional[Workspace]:
+        return self.__by_project.get(project_id)
+
+    def find_queued(self, workspace_id: Optional[str]) -> Optional[Workspace]:
+        # items queued before the workspace ids were configured name the
+        # project instead
+        return self.get(workspace_id) or self.get_by_project(workspace_id)
+
+    def __iter__(self) -> Iterator[Workspace]:
+        return iter(self.workspaces.values())
+
+    def __len__(self) -> int:
+        return len(self.workspaces)
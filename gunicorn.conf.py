@@ -0,0 +1,63 @@
+# Production server: gunicorn preforking uvicorn workers.
+#
+# With preload_app the application (FastAPI, pydantic, starkbank,
+# cryptography, the parsed settings and the Stark Bank public keys) is
+# loaded once in the master and shared with the workers through
+# copy-on-write pages, instead of being loaded again by each worker.
+# Connections and threads (Redis pools, the job scheduler) are only
+# created in the workers, by the application lifespan.
+import gc
+import importlib
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+# picks uvloop and httptools when they are installed
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+accesslog = "-"
+
+
+# imported lazily by the application, loaded here so the workers share them
+PRELOADED_MODULES = (
+    "starkbank",
+    "app.services.transfer_service.implementation",
+)
+if os.getenv("APP_ROLE", "all") == "all":
+    # the API process runs the scheduled jobs too
+    PRELOADED_MODULES += (
+        "apscheduler.schedulers.background",
+        "app.entrypoints.scheduler",
+        "faker",
+    )
+
+
+def when_ready(server):
+    from app.core.workspaces import (
+        get_workspace_registry,
+        get_workspace_signature_verifier,
+    )
+
+    for module in PRELOADED_MODULES:
+        importlib.import_module(module)
+
+    try:
+        for workspace in get_workspace_registry():
+            get_workspace_signature_verifier(workspace)
+    except Exception as e:
+        # the workers fetch the keys on their first webhook instead
+        server.log.warning(f"Could not preload Stark Bank public keys: {e}")
+
+    # Everything allocated so far lives as long as the process. Moving it out
+    # of the collector's reach keeps the collections in the workers from
+    # writing to (and so copying) the shared pages.
+    gc.collect()
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
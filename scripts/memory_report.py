@@ -0,0 +1,133 @@
+"""
+Memory used by a server and its workers, read from /proc (Linux only).
+
+    python scripts/memory_report.py <pid>
+    python scripts/memory_report.py \
+        "uvicorn app.main:app --workers 4" \
+        "gunicorn -c gunicorn.conf.py app.main:app"
+
+Given commands, each one is started, left to warm up and reported, so the
+per-worker memory of the server modes can be compared. RSS counts shared
+pages in every process, PSS splits them between the processes sharing them
+and USS is what each process would free on exit.
+"""
+
+import argparse
+import os
+import shlex
+import signal
+import subprocess
+import time
+import urllib.request
+
+
+def read_memory(pid: int) -> dict:
+    memory = {"rss": 0, "pss": 0, "uss": 0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            field, value = line.split(":", 1)
+            kilobytes = int(value.split()[0]) if value.strip() else 0
+            if field == "Rss":
+                memory["rss"] = kilobytes
+            elif field == "Pss":
+                memory["pss"] = kilobytes
+            elif field in ("Private_Clean", "Private_Dirty"):
+                memory["uss"] += kilobytes
+    return memory
+
+
+def read_parent_pids() -> dict:
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces, the fields after it do not
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        parents[int(entry)] = int(fields[1])
+    return parents
+
+
+def process_tree(root_pid: int) -> list[int]:
+    parents = read_parent_pids()
+    tree = [root_pid]
+    for pid in tree:
+        tree.extend(child for child, parent in parents.items() if parent == pid)
+    return tree
+
+
+def command_line(pid: int) -> str:
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return f.read().replace(b"\0", b" ").decode(errors="replace").strip()
+
+
+def report(root_pid: int, title: str) -> None:
+    print(title)
+    print(f"{'pid':>8} {'rss MB':>8} {'pss MB':>8} {'uss MB':>8}  command")
+    totals = {"rss": 0, "pss": 0, "uss": 0}
+    for pid in process_tree(root_pid):
+        try:
+            memory = read_memory(pid)
+            command = command_line(pid)
+        except OSError:
+            continue
+        for key in totals:
+            totals[key] += memory[key]
+        print(
+            f"{pid:>8} {memory['rss'] / 1024:>8.1f} {memory['pss'] / 1024:>8.1f} "
+            f"{memory['uss'] / 1024:>8.1f}  {command[:60]}"
+        )
+    print(
+        f"{'total':>8} {totals['rss'] / 1024:>8.1f} {totals['pss'] / 1024:>8.1f} "
+        f"{totals['uss'] / 1024:>8.1f}"
+    )
+    print()
+
+
+def warm_up(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.5)
+
+
+def run_and_report(command: str, warmup: float, url: str) -> None:
+    process = subprocess.Popen(shlex.split(command), start_new_session=True)
+    try:
+        time.sleep(warmup)
+        if url:
+            warm_up(url, warmup)
+        report(process.pid, command)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("targets", nargs="+", help="server pids or commands")
+    parser.add_argument(
+        "--warmup", type=float, default=10, help="seconds to wait for the workers"
+    )
+    parser.add_argument(
+        "--url",
+        default="http://localhost:8000/health",
+        help="requested before reporting a command, empty to skip",
+    )
+    args = parser.parse_args()
+
+    for target in args.targets:
+        if target.isdigit():
+            report(int(target), f"pid {target}")
+        else:
+            run_and_report(target, args.warmup, args.url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Time and memory per event of the event-to-transfer pipeline.
+
+    python scripts/pipeline_benchmark.py
+    python scripts/pipeline_benchmark.py --events 50000
+
+Each credited invoice event goes from the SDK resource to the application
+event, then to a transfer and to the `starkbank.Transfer` that would be
+sent. "validated" is the pipeline validating every step again, as it used
+to; "trusted" is the one in use, validating only at the trust boundary.
+Memory is what the records of all events keep allocated, measured with
+tracemalloc in a separate pass so it does not slow the timed one.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starkcore.utils.api import from_api_json  # noqa: E402
+from starkbank.event.__event import _resource as event_resource  # noqa: E402
+from app.models.types import (  # noqa: E402
+    Account,
+    AccountType,
+    StarkBankEvent,
+    Transfer,
+    credited_invoice_transfer,
+)
+from app.services.starkbank_event_services.implementation import (  # noqa: E402
+    event_from_starkbank,
+)
+from app.services.transfer_service.implementation import (  # noqa: E402
+    StarkBankTransferSender,
+)
+
+ACCOUNT_FIELDS = dict(
+    bank_code="20018183",
+    branch="0001",
+    account="6341320293482496",
+    name="Stark Bank S.A.",
+    tax_id="20.018.183/0001-80",
+    account_type=AccountType.PAYMENT,
+)
+
+
+class NoCall:
+    # stands in for the resilient caller, nothing is sent
+    def call(self, method, function, *args, **kwargs):
+        return None
+
+
+def starkbank_events(count: int) -> list:
+    created = "2025-01-01T12:00:00.000000+00:00"
+    return [
+        from_api_json(
+            event_resource,
+            {
+                "id": str(5000000000000000 + i),
+                "created": created,
+                "isDelivered": False,
+                "subscription": "invoice",
+                "workspaceId": "5000000000000000",
+                "log": {
+                    "id": str(6000000000000000 + i),
+                    "created": created,
+                    "type": "credited",
+                    "errors": [],
+                    "invoice": {
+                        "id": str(7000000000000000 + i),
+                        "amount": 10000 + i,
+                        "fee": 50,
+                        "status": "paid",
+                        "name": "Jane Doe",
+                        "taxId": "012.345.678-90",
+                        "due": created,
+                        "created": created,
+                        "updated": created,
+                        "tags": [],
+                        "descriptions": [],
+                        "discounts": [],
+                    },
+                },
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def validated_event(starkbank_event) -> StarkBankEvent:
+    # the conversion as it was: attributes found with dir(), then validated
+    log = starkbank_event.log
+    log_dict = {"id": log.id, "created": log.created, "type": log.type}
+    log_dict["errors"] = log.errors
+    for name in dir(log):
+        value = getattr(log, name)
+        if name.startswith("_") or name in log_dict or callable(value):
+            continue
+        if hasattr(value, "__dict__"):
+            log_dict[name] = {
+                sub_name: getattr(value, sub_name)
+                for sub_name in dir(value)
+                if not sub_name.startswith("_")
+                and not callable(getattr(value, sub_name))
+            }
+        else:
+            log_dict[name] = value
+    return StarkBankEvent(
+        created=starkbank_event.created,
+        id=starkbank_event.id,
+        log=log_dict,
+        subscription=starkbank_event.subscription,
+        workspaceId=starkbank_event.workspace_id,
+    )
+
+
+def validated(starkbank_event) -> Transfer:
+    event = validated_event(starkbank_event)
+    invoice = event.log["invoice"]
+    return Transfer(
+        # the default account used to be a new Account on every access
+        account=Account(**ACCOUNT_FIELDS),
+        amount=invoice["amount"] - invoice["fee"],
+        external_id=f"invoice-{invoice['id']}",
+        tags=[f"event/{event.id}", f"invoice/{invoice['id']}"],
+    )
+
+
+def trusted(account: Account):
+    def pipeline(starkbank_event) -> Transfer:
+        event = event_from_starkbank(starkbank_event)
+        invoice = event.log["invoice"]
+        return credited_invoice_transfer(
+            account, invoice["amount"] - invoice["fee"], event.id, invoice["id"]
+        )
+
+    return pipeline
+
+
+def run(pipeline, events: list, sender: StarkBankTransferSender) -> list:
+    transfers = []
+    for starkbank_event in events:
+        transfer = pipeline(starkbank_event)
+        sender.send(transfer)
+        transfers.append(transfer)
+    return transfers
+
+
+def measure(name: str, pipeline, events: list, repeat: int) -> None:
+    sender = StarkBankTransferSender(None, resilient_caller=NoCall())
+    run(pipeline, events[:100], sender)
+
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run(pipeline, events, sender)
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    transfers = run(pipeline, events, sender)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    statistics = after.compare_to(before, "filename")
+    retained = sum(stat.size_diff for stat in statistics)
+    blocks = sum(stat.count_diff for stat in statistics)
+    del transfers
+
+    count = len(events)
+    print(
+        f"{name:>10} {best / count * 1e6:>10.1f} "
+        f"{retained / count:>12.0f} {blocks / count:>10.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    events = starkbank_events(args.events)
+    account = Account(**ACCOUNT_FIELDS)
+    print(f"{args.events} events, best of {args.repeat} runs")
+    print(f"{'pipeline':>10} {'us/event':>10} {'bytes/event':>12} {'blocks/event':>10}")
+    measure("validated", validated, events, args.repeat)
+    measure("trusted", trusted(account), events, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
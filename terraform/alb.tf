@@ -24,7 +24,7 @@ resource "aws_lb_target_group" "app" {
     protocol            = "HTTP"
     matcher             = "200"
     timeout             = 5
-    path                = "/health"
+    path                = "/health/ready"
     unhealthy_threshold = 5
   }
 
@@ -7,6 +7,66 @@ resource "aws_ecs_cluster" "main" {
   }
 }
 
+locals {
+  container_environment = [
+    {
+      name  = "ENVIRONMENT"
+      value = var.environment
+    },
+    {
+      name  = "REDIS_URL"
+      value = "redis://${aws_elasticache_cluster.redis.cache_nodes[0].address}:6379/0"
+    },
+    {
+      name  = "STARK_ENVIRONMENT"
+      value = "sandbox"
+    },
+    {
+      name  = "API_EXTERNAL_URL"
+      value = "https://${var.domain_name}"
+    },
+    {
+      name  = "WEBHOOK_TRANSFER_MODE"
+      value = var.split_roles ? var.webhook_transfer_mode : "inline"
+    }
+  ]
+
+  container_secrets = [
+    {
+      name      = "STARK_PROJECT_ID"
+      valueFrom = "${aws_secretsmanager_secret.app_secrets.arn}:STARK_PROJECT_ID::"
+    },
+    {
+      name      = "STARK_WORKSPACE_ID"
+      valueFrom = "${aws_secretsmanager_secret.app_secrets.arn}:STARK_WORKSPACE_ID::"
+    },
+    {
+      name      = "STARKBANK_EC_PARAMETERS"
+      valueFrom = "${aws_secretsmanager_secret.app_secrets.arn}:STARKBANK_EC_PARAMETERS::"
+    },
+    {
+      name      = "STARKBANK_EC_PRIVATE_KEY"
+      valueFrom = "${aws_secretsmanager_secret.app_secrets.arn}:STARKBANK_EC_PRIVATE_KEY::"
+    }
+  ]
+
+  # roles without HTTP traffic, only run when the roles are split
+  background_roles = {
+    for role, sizing in {
+      scheduler = {
+        cpu           = var.scheduler_cpu
+        memory        = var.scheduler_memory
+        desired_count = 1
+      }
+      worker = {
+        cpu           = var.worker_cpu
+        memory        = var.worker_memory
+        desired_count = var.worker_desired_count
+      }
+    } : role => sizing if var.split_roles
+  }
+}
+
 resource "aws_ecs_task_definition" "app" {
   family                   = "${var.app_name}-task"
   network_mode             = "awsvpc"
@@ -23,7 +83,7 @@ resource "aws_ecs_task_definition" "app" {
       essential = true
 
       healthCheck = {
-        command     = ["CMD-SHELL", "curl -f http://localhost:${var.container_port}/health || exit 1"]
+        command     = ["CMD-SHELL", "curl -f http://localhost:${var.container_port}/health/live || exit 1"]
         interval    = 30
         timeout     = 5
         retries     = 3
@@ -37,39 +97,14 @@ resource "aws_ecs_task_definition" "app" {
         }
       ]
 
-      environment = [
-        {
-          name  = "ENVIRONMENT"
-          value = var.environment
-        },
-        {
-          name  = "REDIS_URL"
-          value = "redis://${aws_elasticache_cluster.redis.cache_nodes[0].address}:6379/0"
-        },
+      environment = concat(local.container_environment, [
         {
-          name  = "STARK_ENVIRONMENT"
-          value = "sandbox"
-        },
-        {
-          name  = "API_EXTERNAL_URL"
-          value = "https://${var.domain_name}"
+          name  = "APP_ROLE"
+          value = var.split_roles ? "api" : "all"
         }
-      ]
+      ])
 
-      secrets = [
-        {
-          name      = "STARK_PROJECT_ID"
-          valueFrom = "${aws_secretsmanager_secret.app_secrets.arn}:STARK_PROJECT_ID::"
-        },
-        {
-          name      = "STARKBANK_EC_PARAMETERS"
-          valueFrom = "${aws_secretsmanager_secret.app_secrets.arn}:STARKBANK_EC_PARAMETERS::"
-        },
-        {
-          name      = "STARKBANK_EC_PRIVATE_KEY"
-          valueFrom = "${aws_secretsmanager_secret.app_secrets.arn}:STARKBANK_EC_PRIVATE_KEY::"
-        }
-      ]
+      secrets = local.container_secrets
 
       logConfiguration = {
         logDriver = "awslogs"
@@ -117,6 +152,77 @@ resource "aws_ecs_service" "app" {
   depends_on = [aws_lb_listener.https]
 }
 
+resource "aws_ecs_task_definition" "background" {
+  for_each = local.background_roles
+
+  family                   = "${var.app_name}-${each.key}-task"
+  network_mode             = "awsvpc"
+  requires_compatibilities = ["FARGATE"]
+  cpu                      = each.value.cpu
+  memory                   = each.value.memory
+  execution_role_arn       = aws_iam_role.ecs_task_execution_role.arn
+  task_role_arn            = aws_iam_role.ecs_task_role.arn
+
+  container_definitions = jsonencode([
+    {
+      name      = "${var.app_name}-${each.key}-container"
+      image     = "${aws_ecr_repository.main.repository_url}:latest"
+      essential = true
+
+      # served by the metrics server of the role
+      healthCheck = {
+        command     = ["CMD-SHELL", "curl -f http://localhost:${var.container_port}/health/live || exit 1"]
+        interval    = 30
+        timeout     = 5
+        retries     = 3
+        startPeriod = 60
+      }
+
+      environment = concat(local.container_environment, [
+        {
+          name  = "APP_ROLE"
+          value = each.key
+        }
+      ])
+
+      secrets = local.container_secrets
+
+      logConfiguration = {
+        logDriver = "awslogs"
+        options = {
+          awslogs-group         = "/ecs/${var.app_name}"
+          awslogs-region        = var.aws_region
+          awslogs-stream-prefix = each.key
+        }
+      }
+    }
+  ])
+}
+
+resource "aws_ecs_service" "background" {
+  for_each = local.background_roles
+
+  name            = "${var.app_name}-${each.key}-service"
+  cluster         = aws_ecs_cluster.main.id
+  task_definition = aws_ecs_task_definition.background[each.key].arn
+  desired_count   = each.value.desired_count
+  launch_type     = "FARGATE"
+
+  enable_execute_command = true
+  force_new_deployment   = true
+
+  deployment_circuit_breaker {
+    enable   = true
+    rollback = true
+  }
+
+  network_configuration {
+    security_groups  = [aws_security_group.ecs_tasks.id]
+    subnets          = module.vpc.private_subnets
+    assign_public_ip = false
+  }
+}
+
 # CloudWatch Log Group
 resource "aws_cloudwatch_log_group" "app" {
   name              = "/ecs/${var.app_name}"
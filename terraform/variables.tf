@@ -46,6 +46,48 @@ variable "desired_count" {
   default     = 1
 }
 
+variable "split_roles" {
+  description = "Run the scheduler and the worker as their own services instead of inside the API"
+  type        = bool
+  default     = false
+}
+
+variable "webhook_transfer_mode" {
+  description = "inline: the API sends the transfers, outbox: the worker service does (only with split_roles)"
+  type        = string
+  default     = "outbox"
+}
+
+variable "scheduler_cpu" {
+  description = "CPU units for the scheduler container (1024 = 1 CPU)"
+  type        = number
+  default     = 256
+}
+
+variable "scheduler_memory" {
+  description = "Memory in MB for the scheduler container"
+  type        = number
+  default     = 512
+}
+
+variable "worker_cpu" {
+  description = "CPU units for the worker container (1024 = 1 CPU)"
+  type        = number
+  default     = 256
+}
+
+variable "worker_memory" {
+  description = "Memory in MB for the worker container"
+  type        = number
+  default     = 512
+}
+
+variable "worker_desired_count" {
+  description = "Number of worker containers to run"
+  type        = number
+  default     = 1
+}
+
 variable "redis_node_type" {
   description = "ElastiCache Redis node type"
   type        = string
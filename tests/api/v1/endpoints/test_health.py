@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import Mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.v1.endpoints import health
+from app.services.drain.implementation import DrainTracker
+from app.services.health_monitor.implementation import DEGRADED, NOT_READY, READY
+
+
+@pytest.fixture
+def health_monitor():
+    monitor = Mock()
+    monitor.snapshot.return_value = {"status": READY, "checks": {}}
+    return monitor
+
+
+@pytest.fixture
+def drain_tracker(monkeypatch):
+    tracker = DrainTracker("test_health")
+    monkeypatch.setattr(health, "get_drain_tracker", lambda name: tracker)
+    return tracker
+
+
+@pytest.fixture
+def client(health_monitor, drain_tracker):
+    app = FastAPI()
+    app.include_router(health.router, prefix="/health")
+    app.dependency_overrides[health.get_health_monitor] = lambda: health_monitor
+    return TestClient(app)
+
+
+def test_liveness_does_not_look_at_the_dependencies(client, health_monitor):
+    health_monitor.snapshot.return_value = {"status": NOT_READY, "checks": {}}
+
+    response = client.get("/health/live")
+
+    assert response.status_code == 200
+    health_monitor.snapshot.assert_not_called()
+
+
+@pytest.mark.parametrize("path", ["/health", "/health/ready"])
+def test_readiness_serves_the_snapshot(client, health_monitor, path):
+    health_monitor.snapshot.return_value = {"status": DEGRADED, "checks": {}}
+
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert response.json() == {"status": DEGRADED, "checks": {}}
+
+
+def test_not_ready_snapshot_is_503(client, health_monitor):
+    health_monitor.snapshot.return_value = {"status": NOT_READY, "checks": {}}
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["detail"]["status"] == NOT_READY
+
+
+def test_draining_process_is_not_ready(client, drain_tracker):
+    drain_tracker.stop_accepting()
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["detail"]["draining"] is True
+
+
+def test_not_ready_without_a_monitor(client):
+    client.app.dependency_overrides[health.get_health_monitor] = lambda: None
+
+    assert client.get("/health/ready").status_code == 503
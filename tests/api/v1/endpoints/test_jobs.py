@@ -0,0 +1,56 @@
+import fakeredis
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.v1.endpoints import jobs
+from app.core.config import settings
+from app.core.job_history import get_job_history
+from app.services.job_history.implementation import RedisJobHistory
+
+HEADERS = {"Authorization": "Bearer secret"}
+
+
+@pytest.fixture
+def history():
+    return RedisJobHistory(fakeredis.FakeRedis())
+
+
+@pytest.fixture
+def client(history, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    app = FastAPI()
+    app.include_router(jobs.router, prefix="/api/v1/jobs")
+    app.dependency_overrides[get_job_history] = lambda: history
+    return TestClient(app)
+
+
+def test_lists_the_recent_runs(client, history):
+    run = history.start("sweep_transfers")
+    history.finish(run)
+    history.start("invoice_random_people")
+
+    response = client.get(
+        "/api/v1/jobs", params={"job": "sweep_transfers"}, headers=HEADERS
+    )
+
+    assert response.status_code == 200
+    assert [run["run_id"] for run in response.json()["runs"]] == [run.run_id]
+
+
+def test_gets_a_run(client, history):
+    run = history.start("process_queued_events")
+
+    response = client.get(f"/api/v1/jobs/{run.run_id}", headers=HEADERS)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "running"
+
+
+def test_an_unknown_run_is_not_found(client):
+    response = client.get("/api/v1/jobs/missing", headers=HEADERS)
+
+    assert response.status_code == 404
+
+
+def test_requires_the_admin_token(client):
+    assert client.get("/api/v1/jobs").status_code == 401
@@ -0,0 +1,414 @@
+import json
+import pytest
+import fakeredis
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, Mock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from app.api.v1.endpoints import webhooks
+from app.core.config import settings
+from app.models.types import Account, AccountType, EventOutcome
+from app.services.concurrency_limiter.implementation import ConcurrencyLimiter
+from app.services.drain.implementation import DrainTracker
+from app.services.near_cache.implementation import TTLCache
+from app.services.outbox.implementation import RedisOutbox
+from app.services.rate_limiter.implementation import RedisTokenBucket
+from app.services.workspace_registry.implementation import (
+    Workspace,
+    WorkspaceRegistry,
+)
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def signature_verifier():
+    verifier = Mock()
+    verifier.check_signature.return_value = True
+    return verifier
+
+
+@pytest.fixture
+def processed_events():
+    return TTLCache("test_processed_events", max_size=100, ttl=60)
+
+
+@pytest.fixture
+def rate_limiter(redis_client):
+    return RedisTokenBucket(redis_client, "test_webhook", rate=1, capacity=100)
+
+
+@pytest.fixture
+def concurrency_limiter():
+    return ConcurrencyLimiter("test_webhook", limit=10)
+
+
+@pytest.fixture
+def drain_tracker():
+    return DrainTracker("test_webhook")
+
+
+@pytest.fixture
+def other_account():
+    return Account(
+        bank_code="341",
+        branch="0001",
+        account="1234567",
+        name="Other Account",
+        tax_id="123.456.789-00",
+        account_type=AccountType.CHECKING,
+    )
+
+
+@pytest.fixture
+def workspace_registry(other_account):
+    return WorkspaceRegistry(
+        [
+            Workspace(
+                settings.STARK_PROJECT_ID,
+                settings.STARK_WORKSPACE_ID,
+                "sandbox",
+                "private-key",
+                settings.default_account,
+                rate_limits={},
+            ),
+            Workspace(
+                "other-project",
+                "other-workspace",
+                "sandbox",
+                "private-key",
+                other_account,
+                rate_limits={},
+                namespace="workspace:other",
+            ),
+        ]
+    )
+
+
+@pytest.fixture
+def client(
+    redis_client,
+    workspace_registry,
+    signature_verifier,
+    processed_events,
+    rate_limiter,
+    concurrency_limiter,
+    drain_tracker,
+):
+    app = FastAPI()
+    app.include_router(webhooks.router, prefix="/api/v1/webhooks")
+    app.dependency_overrides[webhooks.get_redis_client] = lambda: redis_client
+    app.dependency_overrides[webhooks.get_workspace_registry] = (
+        lambda: workspace_registry
+    )
+    app.dependency_overrides[webhooks.get_event_replay_filter] = lambda: None
+    app.dependency_overrides[webhooks.get_processed_events_cache] = (
+        lambda: processed_events
+    )
+    app.dependency_overrides[webhooks.get_signature_verifier] = (
+        lambda: signature_verifier
+    )
+    app.dependency_overrides[webhooks.get_webhook_rate_limiter] = lambda: rate_limiter
+    app.dependency_overrides[webhooks.get_webhook_concurrency_limiter] = (
+        lambda: concurrency_limiter
+    )
+    app.dependency_overrides[webhooks.get_event_archive_writer] = lambda: None
+    app.dependency_overrides[webhooks.get_webhook_drain_tracker] = lambda: drain_tracker
+    app.dependency_overrides[webhooks.get_webhook_transfer_sweeper] = lambda: None
+    return TestClient(app)
+
+
+def make_body(event_id="event-1", minutes_ago=1, workspace_id=None, log_type="created"):
+    created = datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)
+    return {
+        "event": {
+            "created": created.isoformat(),
+            "id": event_id,
+            "log": {"type": log_type},
+            "subscription": "invoice",
+            "workspaceId": workspace_id or settings.STARK_WORKSPACE_ID,
+        }
+    }
+
+
+def post(client, body, signature="signature"):
+    headers = {"Content-Type": "application/json"}
+    if signature:
+        headers["Digital-Signature"] = signature
+    return client.post(
+        "/api/v1/webhooks/starkbank", content=json.dumps(body), headers=headers
+    )
+
+
+def rejections(stage):
+    return REGISTRY.get_sample_value("webhook_rejections_total", {"stage": stage}) or 0
+
+
+def test_valid_webhook_is_accepted(client, signature_verifier):
+    response = post(client, make_body())
+
+    assert response.status_code == 200
+    signature_verifier.check_signature.assert_called_once()
+
+
+def test_old_event_is_rejected_before_signature(client, signature_verifier):
+    before = rejections("age")
+
+    response = post(client, make_body(minutes_ago=60 * 24))
+
+    assert response.status_code == 410
+    assert rejections("age") == before + 1
+    signature_verifier.check_signature.assert_not_called()
+
+
+def test_events_are_routed_by_workspace_not_project_id(client, signature_verifier):
+    response = post(client, make_body(workspace_id=settings.STARK_PROJECT_ID))
+
+    assert response.status_code == 403
+    signature_verifier.check_signature.assert_not_called()
+
+
+def test_foreign_workspace_is_rejected_before_signature(client, signature_verifier):
+    before = rejections("workspace")
+
+    response = post(client, make_body(workspace_id="another-workspace"))
+
+    assert response.status_code == 403
+    assert rejections("workspace") == before + 1
+    signature_verifier.check_signature.assert_not_called()
+
+
+def test_processed_event_is_rejected_before_signature(
+    client, signature_verifier, redis_client, processed_events
+):
+    redis_client.set("webhook:event:event-1", "1")
+    processed_events.add("event-2")
+    before = rejections("dedupe")
+
+    first = post(client, make_body(event_id="event-1"))
+    second = post(client, make_body(event_id="event-2"))
+
+    assert first.status_code == 409
+    assert second.status_code == 409
+    assert rejections("dedupe") == before + 2
+    signature_verifier.check_signature.assert_not_called()
+
+
+def test_dedupe_check_reads_from_the_replica(client, redis_client, monkeypatch):
+    replica_client = fakeredis.FakeRedis()
+    replica_client.set("webhook:event:event-1", "1")
+    monkeypatch.setattr(settings, "REDIS_READ_FROM_REPLICAS", True)
+
+    with patch.object(
+        webhooks, "get_redis_replica_client", return_value=replica_client
+    ):
+        response = post(client, make_body(event_id="event-1"))
+
+    assert response.status_code == 409
+    assert redis_client.get("webhook:event:event-1") is None
+
+
+def test_invalid_signature_is_rejected(client, signature_verifier):
+    signature_verifier.check_signature.return_value = False
+    before = rejections("signature")
+
+    response = post(client, make_body())
+
+    assert response.status_code == 401
+    assert rejections("signature") == before + 1
+
+
+def test_missing_signature_is_rejected(client, signature_verifier):
+    response = post(client, make_body(), signature=None)
+
+    assert response.status_code == 401
+    signature_verifier.check_signature.assert_not_called()
+
+
+def test_unsigned_credited_event_sends_no_transfer(client, signature_verifier):
+    signature_verifier.check_signature.return_value = False
+    body = make_body(log_type="credited")
+    body["event"]["log"]["invoice"] = {"amount": 1000, "fee": 10}
+
+    with patch(
+        "app.services.transfer_service.implementation.StarkBankTransferSender"
+    ) as mock_sender:
+        response = post(client, body)
+
+    assert response.status_code == 401
+    mock_sender.assert_not_called()
+
+
+def test_rate_limited_request_is_shed(client, redis_client):
+    bucket = RedisTokenBucket(redis_client, "test_webhook", rate=1, capacity=100)
+    while bucket.try_acquire()[0]:
+        pass
+
+    response = post(client, make_body())
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_unsigned_request_spends_no_token(client, rate_limiter, signature_verifier):
+    signature_verifier.check_signature.return_value = False
+
+    with patch.object(rate_limiter, "try_acquire", wraps=rate_limiter.try_acquire):
+        response = post(client, make_body())
+
+        assert response.status_code == 401
+        rate_limiter.try_acquire.assert_not_called()
+
+
+def test_request_over_concurrency_limit_is_shed(
+    client, concurrency_limiter, signature_verifier
+):
+    while concurrency_limiter.try_acquire():
+        pass
+
+    response = post(client, make_body())
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    signature_verifier.check_signature.assert_not_called()
+
+
+def test_concurrency_slot_is_released(client, concurrency_limiter):
+    post(client, make_body(event_id="event-1"))
+    post(client, make_body(event_id="event-2", minutes_ago=60 * 24))
+
+    assert concurrency_limiter.in_flight == 0
+
+
+def test_requests_are_tracked_until_answered(client, drain_tracker):
+    in_flight = []
+    with patch.object(
+        webhooks,
+        "validate_event_age",
+        new=AsyncMock(
+            side_effect=lambda schema: in_flight.append(drain_tracker.in_flight)
+        ),
+    ):
+        post(client, make_body())
+
+    assert in_flight == [1]
+    assert drain_tracker.in_flight == 0
+
+
+def test_draining_refuses_new_requests(client, drain_tracker, signature_verifier):
+    drain_tracker.stop_accepting()
+
+    response = post(client, make_body())
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    signature_verifier.check_signature.assert_not_called()
+
+
+def test_rate_limiter_failure_admits_request(client, rate_limiter):
+    with patch.object(
+        rate_limiter, "try_acquire", side_effect=webhooks.redis.ConnectionError
+    ):
+        response = post(client, make_body())
+
+    assert response.status_code == 200
+
+
+def test_outbox_mode_queues_the_transfer(client, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_TRANSFER_MODE", "outbox")
+    outbox = RedisOutbox(redis_client, "test_transfers", consumer_id="test")
+    client.app.dependency_overrides[webhooks.get_transfer_outbox] = lambda: outbox
+    body = make_body(log_type="credited")
+    body["event"]["log"]["invoice"] = {"id": "invoice-1", "amount": 1000, "fee": 10}
+
+    with patch(
+        "app.services.transfer_service.implementation.StarkBankTransferSender"
+    ) as mock_sender:
+        response = post(client, body)
+
+    assert response.status_code == 200
+    mock_sender.assert_not_called()
+    assert outbox.claim(0.1)[1] == {
+        "workspace_id": settings.STARK_WORKSPACE_ID,
+        "event_id": "event-1",
+        "invoice_id": "invoice-1",
+        "created": body["event"]["created"],
+        "amount": 990,
+    }
+    assert redis_client.exists("webhook:event:event-1")
+
+
+def test_outcomes_are_archived(client, redis_client):
+    archive_writer = Mock()
+    client.app.dependency_overrides[webhooks.get_event_archive_writer] = (
+        lambda: archive_writer
+    )
+    outbox = RedisOutbox(redis_client, "test_transfers", consumer_id="test")
+    client.app.dependency_overrides[webhooks.get_transfer_outbox] = lambda: outbox
+    body = make_body(event_id="event-2", log_type="credited")
+    body["event"]["log"]["invoice"] = {"id": "invoice-1", "amount": 1000, "fee": 10}
+
+    post(client, make_body(event_id="event-1"))
+    post(client, body)
+
+    skipped, queued = [call[0][0] for call in archive_writer.submit.call_args_list]
+    assert (skipped.event_id, skipped.outcome) == ("event-1", EventOutcome.SKIPPED)
+    assert (queued.event_id, queued.outcome) == ("event-2", EventOutcome.QUEUED)
+    assert (queued.invoice_id, queued.amount) == ("invoice-1", 990)
+    assert queued.source == "webhook"
+
+
+def test_sweep_mode_credits_the_account(client):
+    transfer_sweeper = Mock()
+    client.app.dependency_overrides[webhooks.get_webhook_transfer_sweeper] = (
+        lambda: transfer_sweeper
+    )
+    body = make_body(log_type="credited")
+    body["event"]["log"]["invoice"] = {"id": "invoice-1", "amount": 1000, "fee": 10}
+
+    with patch(
+        "app.services.transfer_service.implementation.StarkBankTransferSender"
+    ) as mock_sender:
+        response = post(client, body)
+
+    assert response.status_code == 200
+    mock_sender.assert_not_called()
+    transfer_sweeper.credit.assert_called_once_with(
+        settings.default_account, "event-1", 990
+    )
+
+
+def test_events_are_routed_to_their_workspace(
+    client, redis_client, monkeypatch, other_account
+):
+    monkeypatch.setattr(settings, "WEBHOOK_TRANSFER_MODE", "outbox")
+    outbox = RedisOutbox(redis_client, "test_transfers", consumer_id="test")
+    client.app.dependency_overrides[webhooks.get_transfer_outbox] = lambda: outbox
+    body = make_body(workspace_id="other-workspace", log_type="credited")
+    body["event"]["log"]["invoice"] = {"id": "invoice-1", "amount": 1000, "fee": 10}
+
+    response = post(client, body)
+
+    assert response.status_code == 200
+    assert outbox.claim(0.1)[1]["workspace_id"] == "other-workspace"
+    assert redis_client.exists("workspace:other:webhook:event:event-1")
+    assert not redis_client.exists("webhook:event:event-1")
+    assert post(client, body).status_code == 409
+
+
+def test_sweep_mode_credits_the_account_of_the_workspace(client, other_account):
+    transfer_sweeper = Mock()
+    client.app.dependency_overrides[webhooks.get_webhook_transfer_sweeper] = (
+        lambda: transfer_sweeper
+    )
+    body = make_body(workspace_id="other-workspace", log_type="credited")
+    body["event"]["log"]["invoice"] = {"id": "invoice-1", "amount": 1000, "fee": 10}
+
+    response = post(client, body)
+
+    assert response.status_code == 200
+    transfer_sweeper.credit.assert_called_once_with(other_account, "event-1", 990)
@@ -0,0 +1,54 @@
+from unittest.mock import Mock, patch
+import pytest
+from app.core.health import check_public_keys, check_starkbank, scheduler_check
+from app.services.resilience.implementation import CircuitBreaker
+
+
+def test_open_circuit_breaker_fails_the_starkbank_check(monkeypatch):
+    breakers = {
+        "invoice": Mock(state=CircuitBreaker.CLOSED),
+        "transfer": Mock(state=CircuitBreaker.OPEN),
+    }
+    monkeypatch.setattr(
+        "app.core.health.settings.STARKBANK_RATE_LIMITS", {"invoice": 5, "transfer": 5}
+    )
+
+    with patch("app.core.health.get_starkbank_circuit_breaker", breakers.get):
+        result = check_starkbank()
+
+    assert result == {
+        "ok": False,
+        "circuit_breakers": {"invoice": "closed", "transfer": "open"},
+    }
+
+
+def test_public_keys_are_checked_per_workspace():
+    loaded, unreachable = Mock(workspace_id="loaded"), Mock(workspace_id="unreachable")
+
+    def verifier(workspace):
+        if workspace is unreachable:
+            raise ConnectionError("Stark Bank is unreachable")
+        return Mock()
+
+    with patch(
+        "app.core.health.get_workspace_registry", return_value=[loaded, unreachable]
+    ), patch("app.core.health.get_workspace_signature_verifier", verifier):
+        result = check_public_keys()
+
+    assert result == {
+        "ok": False,
+        "workspaces": {
+            "loaded": "loaded",
+            "unreachable": "Stark Bank is unreachable",
+        },
+    }
+
+
+def test_scheduler_check():
+    assert scheduler_check(None)() == {"enabled": False}
+    assert scheduler_check(Mock(running=True, get_jobs=lambda: [1, 2]))() == {
+        "enabled": True,
+        "jobs": 2,
+    }
+    with pytest.raises(RuntimeError):
+        scheduler_check(Mock(running=False))()
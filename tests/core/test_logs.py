@@ -0,0 +1,63 @@
+import fakeredis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core import job_history
+from app.core.job_history import record_job_run
+from app.core.logs import (
+    RequestIdMiddleware,
+    current_event_id,
+    current_request_id,
+    log_context,
+)
+from app.services.job_history.implementation import RedisJobHistory
+
+
+def test_log_context_is_empty_outside_of_any_work():
+    assert log_context() == {}
+
+
+def test_log_context_has_the_ids_of_the_current_work(monkeypatch):
+    history = RedisJobHistory(fakeredis.FakeRedis())
+    monkeypatch.setattr(job_history, "get_job_history", lambda: history)
+    request_token = current_request_id.set("request-1")
+    event_token = current_event_id.set("event-1")
+    try:
+        with record_job_run("sweep_transfers") as run:
+            context = log_context()
+    finally:
+        current_event_id.reset(event_token)
+        current_request_id.reset(request_token)
+
+    assert context == {
+        "request_id": "request-1",
+        "event_id": "event-1",
+        "job": "sweep_transfers",
+        "job_run_id": run.run_id,
+    }
+
+
+def client():
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/")
+    async def root():
+        return {"request_id": current_request_id.get()}
+
+    return TestClient(app)
+
+
+def test_requests_keep_the_id_they_come_with():
+    response = client().get("/", headers={"X-Request-ID": "from-the-balancer"})
+
+    assert response.json() == {"request_id": "from-the-balancer"}
+    assert response.headers["X-Request-ID"] == "from-the-balancer"
+
+
+def test_requests_without_an_id_get_one():
+    response = client().get("/")
+
+    request_id = response.json()["request_id"]
+    assert request_id
+    assert response.headers["X-Request-ID"] == request_id
+    assert current_request_id.get() is None
@@ -0,0 +1,34 @@
+from unittest.mock import patch
+from prometheus_client import REGISTRY, CollectorRegistry
+from app.core.metrics import (
+    JOB_EVENTS_TOTAL,
+    get_metrics_registry,
+    render_metrics,
+)
+
+
+def test_default_registry_without_multiprocess_dir(monkeypatch):
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    assert get_metrics_registry() is REGISTRY
+
+
+def test_multiprocess_registry_when_dir_is_set(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    with patch("app.core.metrics.multiprocess.MultiProcessCollector") as mock_collector:
+        registry = get_metrics_registry()
+
+        assert isinstance(registry, CollectorRegistry)
+        assert registry is not REGISTRY
+        mock_collector.assert_called_once_with(registry)
+
+
+def test_render_metrics_exposes_histograms(monkeypatch):
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    JOB_EVENTS_TOTAL.labels("test_job", "processed").inc()
+
+    content, content_type = render_metrics()
+
+    assert content_type.startswith("text/plain")
+    assert b"starkbank_signature_verification_seconds" in content
+    assert b"webhook_request_seconds" in content
+    assert b'job_events_total{job="test_job",outcome="processed"}' in content
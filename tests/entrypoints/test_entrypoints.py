@@ -0,0 +1,85 @@
+import subprocess
+import sys
+from unittest.mock import Mock, patch
+from app.entrypoints import __main__ as entrypoint
+from app.core.config import settings
+from app.entrypoints.scheduler import add_async_jobs, add_jobs
+import asyncio
+
+
+def test_api_roles_exec_gunicorn():
+    with patch.object(entrypoint, "settings") as mock_settings, patch(
+        "os.execvp"
+    ) as mock_execvp:
+        mock_settings.APP_ROLE = "api"
+        entrypoint.main()
+
+    mock_execvp.assert_called_once_with(
+        "gunicorn",
+        ["gunicorn", "--config", "gunicorn.conf.py", "app.entrypoints.api:app"],
+    )
+
+
+def test_scheduler_role_runs_the_scheduler():
+    with patch.object(entrypoint, "settings") as mock_settings, patch(
+        "app.entrypoints.scheduler.main"
+    ) as mock_main:
+        mock_settings.APP_ROLE = "scheduler"
+        entrypoint.main()
+
+    mock_main.assert_called_once()
+
+
+def test_worker_role_runs_the_worker():
+    with patch.object(entrypoint, "settings") as mock_settings, patch(
+        "app.entrypoints.worker.main"
+    ) as mock_main:
+        mock_settings.APP_ROLE = "worker"
+        entrypoint.main()
+
+    mock_main.assert_called_once()
+
+
+def test_add_jobs_schedules_both_jobs():
+    scheduler = Mock()
+
+    add_jobs(scheduler, Mock())
+
+    assert scheduler.add_job.call_count == 2
+
+
+def test_add_async_jobs_schedules_coroutines():
+    scheduler = Mock()
+
+    add_async_jobs(scheduler, Mock(), Mock())
+
+    assert scheduler.add_job.call_count == 2
+    for call in scheduler.add_job.call_args_list:
+        assert asyncio.iscoroutinefunction(call.args[0])
+
+
+def test_distributed_reconciliation_runs_on_every_scheduler(monkeypatch):
+    monkeypatch.setattr(settings, "RECONCILIATION_MODE", "distributed")
+    scheduler = Mock()
+
+    with patch("app.entrypoints.scheduler.get_reconciliation_queue"):
+        add_jobs(scheduler, Mock())
+
+    triggers = [call.args[1] for call in scheduler.add_job.call_args_list]
+    assert triggers == ["cron", "interval", "cron"]
+
+
+def test_api_role_does_not_import_the_jobs():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, app.entrypoints.api; "
+            "print([m for m in sys.modules if m.startswith(('app.jobs', 'apscheduler'))])",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
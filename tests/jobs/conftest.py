@@ -0,0 +1,12 @@
+import fakeredis
+import pytest
+from app.core import job_history
+from app.services.job_history.implementation import RedisJobHistory
+
+
+@pytest.fixture(autouse=True)
+def history(monkeypatch):
+    # the jobs record their runs, kept away from any real Redis
+    history = RedisJobHistory(fakeredis.FakeRedis())
+    monkeypatch.setattr(job_history, "get_job_history", lambda: history)
+    return history
@@ -0,0 +1,303 @@
+import json
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+import fakeredis
+import pytest
+from app.jobs.queue_undelivered_events import (
+    event_from_item,
+    event_item,
+    process_queued_events,
+    queue_undelivered_events,
+)
+from app.models.types import Account, AccountType, StarkBankEvent
+from app.services.drain.implementation import DrainTracker
+from app.services.resilience.implementation import CircuitOpenError
+from app.services.work_queue.implementation import RedisWorkQueue
+from app.services.workspace_registry.implementation import WorkspaceRegistry
+
+JOB_MODULE = "app.jobs.queue_undelivered_events"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def account():
+    return Account(
+        bank_code="341",
+        branch="0001",
+        account="1234567",
+        name="Test Account",
+        tax_id="123.456.789-00",
+        account_type=AccountType.CHECKING,
+    )
+
+
+@pytest.fixture
+def workspace(account):
+    workspace = Mock(
+        project_id="test-project",
+        workspace_id="test-workspace",
+        default_account=account,
+    )
+    workspace.key.side_effect = lambda name: name
+    return workspace
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def queue(clock):
+    return RedisWorkQueue(
+        fakeredis.FakeRedis(), "reconciliation", visibility_timeout=300, clock=clock
+    )
+
+
+@pytest.fixture
+def clients():
+    clients = Mock()
+    clients.transfer_sweeper = None
+    return clients
+
+
+@pytest.fixture(autouse=True)
+def job_environment(workspace, clients):
+    with patch(
+        f"{JOB_MODULE}.get_workspace_registry",
+        return_value=WorkspaceRegistry([workspace]),
+    ), patch(f"{JOB_MODULE}.WorkspaceClients", return_value=clients), patch(
+        f"{JOB_MODULE}.get_drain_tracker", return_value=DrainTracker("test")
+    ), patch(
+        f"{JOB_MODULE}.get_event_archive", return_value=None
+    ), patch(
+        f"{JOB_MODULE}.get_event_archive_writer", return_value=None
+    ):
+        yield
+
+
+def credited_event(event_id, amount=1000):
+    return StarkBankEvent.model_construct(
+        id=event_id,
+        subscription="invoice",
+        log={
+            "type": "credited",
+            "errors": [],
+            "invoice": {"id": f"invoice-{event_id}", "amount": amount, "fee": 100},
+        },
+        created=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        workspaceId="test-workspace",
+    )
+
+
+def test_items_keep_what_handling_the_event_needs(workspace):
+    event = credited_event("1")
+
+    restored = event_from_item(json.loads(event_item(workspace, event)))
+
+    assert restored.id == "1"
+    assert restored.created == event.created
+    assert restored.subscription == "invoice"
+    assert restored.log == {
+        "type": "credited",
+        "invoice": {"id": "invoice-1", "amount": 1000, "fee": 100},
+    }
+
+
+def test_coordinator_queues_the_undelivered_events_once(queue, clients):
+    clients.event_fetcher.fetch_undelivered_events.side_effect = lambda: iter(
+        [credited_event(str(i)) for i in range(25)]
+    )
+    thread_lock = Mock()
+    thread_lock.lock.return_value = True
+
+    queue_undelivered_events(thread_lock, queue)
+    queue_undelivered_events(thread_lock, queue)
+
+    assert queue.counts() == {"ready": 25, "in_flight": 0}
+    assert thread_lock.unlock.call_count == 2
+
+
+def test_coordinator_queues_the_other_workspaces_when_one_fails(queue, account):
+    failing = Mock(
+        project_id="failing-project", workspace_id="failing", default_account=account
+    )
+    other = Mock(
+        project_id="other-project", workspace_id="other", default_account=account
+    )
+
+    def events(fetched, error=None):
+        yield from fetched
+        if error is not None:
+            raise error
+
+    fetchers = {
+        "failing-project": lambda: events(
+            [credited_event("1"), credited_event("2")], RuntimeError("page failed")
+        ),
+        "other-project": lambda: events([credited_event("3")]),
+    }
+    thread_lock = Mock()
+    thread_lock.lock.return_value = True
+
+    with patch(
+        f"{JOB_MODULE}.get_workspace_registry",
+        return_value=WorkspaceRegistry([failing, other]),
+    ), patch(
+        f"{JOB_MODULE}.WorkspaceClients",
+        side_effect=lambda workspace: Mock(
+            event_fetcher=Mock(fetch_undelivered_events=fetchers[workspace.project_id])
+        ),
+    ):
+        queue_undelivered_events(thread_lock, queue)
+
+    # the events fetched before the failure are queued too
+    assert queue.counts() == {"ready": 3, "in_flight": 0}
+    thread_lock.unlock.assert_called_once()
+
+
+def test_coordinator_runs_once_for_the_fleet(queue, clients):
+    thread_lock = Mock()
+    thread_lock.lock.return_value = False
+
+    queue_undelivered_events(thread_lock, queue)
+
+    clients.event_fetcher.fetch_undelivered_events.assert_not_called()
+
+
+def test_queued_events_are_transferred_and_acknowledged(
+    queue, clients, workspace, account
+):
+    queue.push(
+        {
+            f"test-workspace:{i}": event_item(workspace, credited_event(str(i)))
+            for i in range(15)
+        }
+    )
+
+    process_queued_events(queue)
+
+    assert clients.transfer_sender.send.call_count == 15
+    transfer = clients.transfer_sender.send.call_args_list[0].args[0]
+    assert transfer.account == account
+    assert transfer.amount == 900
+    assert transfer.external_id == "invoice-invoice-0"
+    assert clients.event_status_changer.mark_as_delivered.call_count == 15
+    assert queue.counts() == {"ready": 0, "in_flight": 0}
+
+
+def test_failed_event_is_retried_after_the_delay(
+    queue, clients, workspace, clock, monkeypatch
+):
+    monkeypatch.setattr(f"{JOB_MODULE}.settings.RECONCILIATION_RETRY_DELAY_SECONDS", 60)
+    queue.push({"test-workspace:1": event_item(workspace, credited_event("1"))})
+    clients.transfer_sender.send.side_effect = [Exception("failed"), None]
+
+    process_queued_events(queue)
+    assert queue.counts() == {"ready": 0, "in_flight": 1}
+
+    clock.now += 60
+    process_queued_events(queue)
+
+    assert clients.transfer_sender.send.call_count == 2
+    assert queue.counts() == {"ready": 0, "in_flight": 0}
+
+
+def test_unavailable_workspace_hands_its_events_back(queue, clients, workspace):
+    queue.push(
+        {
+            f"test-workspace:{i}": event_item(workspace, credited_event(str(i)))
+            for i in range(3)
+        }
+    )
+    clients.transfer_sender.send.side_effect = CircuitOpenError("starkbank_transfer")
+
+    process_queued_events(queue)
+
+    # the first one opened the breaker, the others were not tried
+    assert clients.transfer_sender.send.call_count == 1
+    assert queue.counts() == {"ready": 0, "in_flight": 3}
+
+
+def test_consumer_records_its_progress_through_the_backlog(
+    queue, clients, workspace, history
+):
+    queue.push(
+        {
+            f"test-workspace:{i}": event_item(workspace, credited_event(str(i)))
+            for i in range(15)
+        }
+    )
+
+    process_queued_events(queue)
+
+    [run] = history.runs()
+    assert run["job"] == "process_queued_events"
+    assert run["counts"] == {"processed": 15}
+    assert run["progress"] == {"ready": 0, "in_flight": 0}
+
+
+def test_consumer_does_not_record_the_runs_that_find_nothing(queue, history):
+    process_queued_events(queue)
+
+    assert history.runs() == []
+
+
+def test_slow_batches_keep_their_events_invisible(queue, clients, workspace, clock):
+    queue.push(
+        {
+            f"test-workspace:{i}": event_item(workspace, credited_event(str(i)))
+            for i in range(3)
+        }
+    )
+    other_consumer = []
+
+    def slow_send(transfer):
+        # each event takes most of the visibility timeout
+        clock.now += 250
+        other_consumer.extend(queue.claim(10))
+
+    clients.transfer_sender.send.side_effect = slow_send
+
+    process_queued_events(queue)
+
+    assert other_consumer == []
+    assert clients.transfer_sender.send.call_count == 3
+
+
+def test_event_failing_for_good_goes_to_the_dead_letters(
+    workspace, clients, clock, history
+):
+    queue = RedisWorkQueue(
+        fakeredis.FakeRedis(), "reconciliation", max_attempts=2, clock=clock
+    )
+    queue.push({"test-workspace:1": event_item(workspace, credited_event("1"))})
+    clients.transfer_sender.send.side_effect = ValueError("invalid transfer")
+
+    for _ in range(3):
+        process_queued_events(queue)
+        clock.now += 3600
+
+    assert clients.transfer_sender.send.call_count == 2
+    assert list(queue.dead_letters()) == ["test-workspace:1"]
+    assert queue.counts() == {"ready": 0, "in_flight": 0}
+
+
+def test_unavailable_stark_bank_does_not_count_as_an_attempt(workspace, clients, clock):
+    queue = RedisWorkQueue(
+        fakeredis.FakeRedis(), "reconciliation", max_attempts=1, clock=clock
+    )
+    queue.push({"test-workspace:1": event_item(workspace, credited_event("1"))})
+    clients.transfer_sender.send.side_effect = CircuitOpenError("starkbank_transfer")
+
+    process_queued_events(queue)
+
+    assert queue.dead_letters() == {}
+    assert queue.counts() == {"ready": 0, "in_flight": 1}
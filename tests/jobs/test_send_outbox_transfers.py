@@ -0,0 +1,197 @@
+import pytest
+import starkbank
+from unittest.mock import Mock, patch
+from app.jobs.send_outbox_transfers import send_outbox_transfers
+from app.models.types import Account, AccountType, EventOutcome
+from app.services.resilience.implementation import CircuitOpenError
+from app.services.workspace_registry.implementation import (
+    Workspace,
+    WorkspaceRegistry,
+)
+
+
+@pytest.fixture
+def mock_account():
+    return Account(
+        bank_code="341",
+        branch="0001",
+        account="1234567",
+        name="Test Account",
+        tax_id="123.456.789-00",
+        account_type=AccountType.CHECKING,
+    )
+
+
+def registry_of(*workspaces):
+    return WorkspaceRegistry(
+        [
+            Workspace(
+                f"{workspace_id}-project",
+                workspace_id,
+                "sandbox",
+                "private-key",
+                account,
+                rate_limits={},
+            )
+            for workspace_id, account in workspaces
+        ]
+    )
+
+
+def run_once(outbox, transfer_sender, mock_account, item=None, registry=None):
+    item = item or {"event_id": "1", "amount": 1000}
+    outbox.claim.side_effect = [(b"raw", item), None]
+    calls = iter([False, False, True])
+    with patch(
+        "app.jobs.send_outbox_transfers.get_workspace_registry",
+        return_value=registry or registry_of(("main", mock_account)),
+    ):
+        send_outbox_transfers(
+            outbox, lambda workspace: transfer_sender, lambda: next(calls), sleep=Mock()
+        )
+
+
+def test_sends_and_acknowledges(mock_account):
+    outbox = Mock()
+    transfer_sender = Mock()
+
+    run_once(outbox, transfer_sender, mock_account)
+
+    transfer = transfer_sender.send.call_args[0][0]
+    assert transfer.amount == 1000
+    assert transfer.account == mock_account
+    assert transfer.external_id == "event-1"
+    outbox.ack.assert_called_once_with(b"raw")
+    assert outbox.recover_abandoned.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        CircuitOpenError("transfer"),
+        starkbank.error.UnknownError(
+            "ConnectionError: (Caused by NewConnectionError('refused'))"
+        ),
+        # the outcome is unknown, but the external id makes a retry safe
+        starkbank.error.InternalServerError(),
+    ],
+)
+def test_retries_transient_errors(mock_account, error):
+    outbox = Mock()
+    transfer_sender = Mock()
+    transfer_sender.send.side_effect = error
+
+    run_once(outbox, transfer_sender, mock_account)
+
+    outbox.retry.assert_called_once_with(b"raw")
+    outbox.ack.assert_not_called()
+    outbox.dead_letter.assert_not_called()
+
+
+def test_dead_letters_other_errors(mock_account):
+    outbox = Mock()
+    transfer_sender = Mock()
+    transfer_sender.send.side_effect = starkbank.error.InputErrors(
+        [{"code": "invalidAccountNumber", "message": "Invalid account number"}]
+    )
+
+    run_once(outbox, transfer_sender, mock_account)
+
+    outbox.dead_letter.assert_called_once_with(b"raw")
+    outbox.retry.assert_not_called()
+
+
+def test_sends_from_the_workspace_of_the_item(mock_account):
+    other_account = mock_account.model_copy(update={"name": "Other Account"})
+    registry = registry_of(("main", mock_account), ("other", other_account))
+    outbox = Mock()
+    transfer_senders = {"main": Mock(), "other": Mock()}
+    outbox.claim.side_effect = [
+        (b"raw", {"workspace_id": "other", "event_id": "1", "amount": 1000}),
+        None,
+    ]
+    calls = iter([False, False, True])
+
+    with patch(
+        "app.jobs.send_outbox_transfers.get_workspace_registry", return_value=registry
+    ):
+        send_outbox_transfers(
+            outbox,
+            lambda workspace: transfer_senders[workspace.workspace_id],
+            lambda: next(calls),
+            sleep=Mock(),
+        )
+
+    transfer_senders["main"].send.assert_not_called()
+    transfer = transfer_senders["other"].send.call_args[0][0]
+    assert transfer.account == other_account
+    outbox.ack.assert_called_once_with(b"raw")
+
+
+def test_items_queued_with_the_project_id_find_their_workspace(mock_account):
+    other_account = mock_account.model_copy(update={"name": "Other Account"})
+    registry = registry_of(("main", mock_account), ("other", other_account))
+    outbox = Mock()
+    transfer_sender = Mock()
+
+    run_once(
+        outbox,
+        transfer_sender,
+        mock_account,
+        item={"workspace_id": "other-project", "event_id": "1", "amount": 1000},
+        registry=registry,
+    )
+
+    assert transfer_sender.send.call_args[0][0].account == other_account
+    outbox.ack.assert_called_once_with(b"raw")
+
+
+def test_dead_letters_items_of_unknown_workspaces(mock_account):
+    outbox = Mock()
+    transfer_sender = Mock()
+
+    run_once(
+        outbox,
+        transfer_sender,
+        mock_account,
+        item={"workspace_id": "gone", "event_id": "1", "amount": 1000},
+    )
+
+    transfer_sender.send.assert_not_called()
+    outbox.dead_letter.assert_called_once_with(b"raw")
+
+
+def test_archives_sent_transfers(mock_account):
+    outbox = Mock()
+    outbox.claim.side_effect = [
+        (
+            b"raw",
+            {
+                "event_id": "1",
+                "invoice_id": "invoice-1",
+                "created": "2025-01-01T12:00:00+00:00",
+                "amount": 1000,
+            },
+        ),
+        None,
+    ]
+    archive_writer = Mock()
+    calls = iter([False, False, True])
+
+    with patch(
+        "app.jobs.send_outbox_transfers.get_workspace_registry",
+        return_value=registry_of(("main", mock_account)),
+    ):
+        send_outbox_transfers(
+            outbox,
+            lambda workspace: Mock(),
+            lambda: next(calls),
+            sleep=Mock(),
+            archive_writer=archive_writer,
+        )
+
+    archived = archive_writer.submit.call_args[0][0]
+    assert archived.event_id == "1"
+    assert archived.invoice_id == "invoice-1"
+    assert archived.outcome == EventOutcome.TRANSFERRED
+    assert archived.source == "worker"
@@ -0,0 +1,145 @@
+import fakeredis
+import pytest
+import starkbank
+from unittest.mock import Mock, patch
+from app.jobs.sweep_transfers import sweep_transfers
+from app.models.types import Account, AccountType
+from app.services.drain.implementation import DrainTracker
+from app.services.resilience.implementation import CircuitOpenError
+from app.services.transfer_sweep.implementation import RedisTransferSweeper
+
+
+@pytest.fixture
+def account():
+    return Account(
+        bank_code="341",
+        branch="0001",
+        account="1234567",
+        name="Test Account",
+        tax_id="123.456.789-00",
+        account_type=AccountType.CHECKING,
+    )
+
+
+@pytest.fixture
+def sweeper(account):
+    sweeper = RedisTransferSweeper(fakeredis.FakeRedis())
+    sweeper.credit(account, "event-1", 900)
+    sweeper.credit(account, "event-2", 100)
+    return sweeper
+
+
+def run(sweeper, transfer_sender, threshold=1000):
+    thread_lock = Mock()
+    thread_lock.lock.return_value = True
+    with patch(
+        "app.jobs.sweep_transfers.get_transfer_sweeper", return_value=sweeper
+    ), patch(
+        "app.jobs.sweep_transfers.StarkBankTransferSender",
+        return_value=transfer_sender,
+    ), patch(
+        "app.jobs.sweep_transfers.get_drain_tracker",
+        return_value=DrainTracker("test_sweep"),
+    ), patch(
+        "app.jobs.sweep_transfers.settings"
+    ) as mock_settings:
+        mock_settings.TRANSFER_SWEEP_THRESHOLD = threshold
+        mock_settings.TRANSFER_SWEEP_INTERVAL_SECONDS = 3600
+        sweep_transfers(thread_lock)
+    thread_lock.unlock.assert_called_once_with("job:sweep_transfers")
+
+
+def test_sends_one_transfer_for_all_credits(sweeper, account):
+    transfer_sender = Mock()
+
+    run(sweeper, transfer_sender)
+
+    transfer = transfer_sender.send.call_args[0][0]
+    assert (transfer.account, transfer.amount) == (account, 1000)
+    assert sweeper.ledger()[0]["event_ids"] == ["event-1", "event-2"]
+    assert sweeper.pending_amount(account) == 0
+
+
+def test_waits_for_threshold_or_interval(sweeper, account):
+    transfer_sender = Mock()
+    # swept once, so the interval counts from now
+    sweeper.complete(sweeper.take(account))
+    sweeper.credit(account, "event-3", 100)
+
+    run(sweeper, transfer_sender, threshold=1000)
+
+    transfer_sender.send.assert_not_called()
+    assert sweeper.pending_amount(account) == 100
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        CircuitOpenError("transfer"),
+        starkbank.error.UnknownError(
+            "ConnectionError: (Caused by NewConnectionError('refused'))"
+        ),
+        starkbank.error.UnknownError("ReadTimeout"),
+    ],
+)
+def test_sends_the_same_transfer_again_after_a_transient_error(sweeper, account, error):
+    transfer_sender = Mock()
+    transfer_sender.send.side_effect = [error, None]
+
+    run(sweeper, transfer_sender)
+    sweeper.credit(account, "event-3", 100)
+    run(sweeper, transfer_sender)
+
+    first, second = [c.args[0] for c in transfer_sender.send.call_args_list]
+    assert second == first
+    assert first.external_id == f"sweep-{sweeper.ledger()[0]['sweep_id']}"
+    assert sweeper.ledger()[0]["event_ids"] == ["event-1", "event-2"]
+    # not due yet, the new credit waits for the next sweep
+    assert sweeper.pending_amount(account) == 100
+    assert sweeper.open_batches(account) == []
+
+
+def test_fails_the_batch_on_other_errors(sweeper, account):
+    transfer_sender = Mock()
+    transfer_sender.send.side_effect = starkbank.error.InputErrors(
+        [{"code": "invalidAccountNumber", "message": "Invalid account number"}]
+    )
+
+    run(sweeper, transfer_sender)
+    run(sweeper, transfer_sender)
+
+    transfer_sender.send.assert_called_once()
+    assert sweeper.ledger()[0]["status"] == "failed"
+    assert len(sweeper.failed_batches(account)) == 1
+
+
+def test_credits_above_the_maximum_amount_are_split(account):
+    sweeper = RedisTransferSweeper(fakeredis.FakeRedis())
+    sweeper.credit(account, "event-1", 6000000000)
+    sweeper.credit(account, "event-2", 6000000000)
+    transfer_sender = Mock()
+
+    run(sweeper, transfer_sender)
+
+    transfers = [c.args[0] for c in transfer_sender.send.call_args_list]
+    assert [t.amount for t in transfers] == [9999999999, 2000000001]
+    sweep_id = sweeper.ledger()[0]["sweep_id"]
+    assert [t.external_id for t in transfers] == [
+        f"sweep-{sweep_id}-1",
+        f"sweep-{sweep_id}-2",
+    ]
+    assert sweeper.open_batches(account) == []
+
+
+def test_a_batch_that_cannot_be_sent_does_not_stop_the_others(account):
+    other = account.model_copy(update={"account": "7654321"})
+    sweeper = RedisTransferSweeper(fakeredis.FakeRedis())
+    sweeper.credit(account, "event-1", 1000)
+    sweeper.credit(other, "event-2", 1000)
+    transfer_sender = Mock()
+    transfer_sender.send.side_effect = [ValueError("invalid"), None]
+
+    run(sweeper, transfer_sender)
+
+    assert transfer_sender.send.call_count == 2
+    assert len(sweeper.failed_batches(account) + sweeper.failed_batches(other)) == 1
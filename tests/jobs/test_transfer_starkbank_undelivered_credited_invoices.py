@@ -1,12 +1,41 @@
+import asyncio
+import threading
 import pytest
-from unittest.mock import Mock, patch
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, Mock, patch
 from app.jobs.transfer_starkbank_undelivered_credited_invoices import (
     transfer_starkbank_undelivered_credited_invoices,
+    transfer_starkbank_undelivered_credited_invoices_async,
 )
-from app.models.types import StarkBankEvent, Transfer, Account, AccountType
+from app.models.types import (
+    ArchivedEvent,
+    EventOutcome,
+    StarkBankEvent,
+    Transfer,
+    Account,
+    AccountType,
+)
+from app.services.drain.implementation import DrainTracker
+from app.services.event_archive.implementation import SQLiteEventArchive
+from app.services.resilience.implementation import (
+    CircuitOpenError,
+    RateLimitedError,
+)
+from app.services.workspace_registry.implementation import Workspace
 from datetime import datetime
 
 
+def workspace_of(account):
+    return Mock(
+        spec=Workspace,
+        project_id="test-project",
+        workspace_id="test-workspace",
+        project="test-project",
+        default_account=account,
+        rate_limits={},
+    )
+
+
 @pytest.fixture
 def mock_thread_lock():
     mock = Mock()
@@ -87,12 +116,14 @@ def test_transfer_starkbank_undelivered_credited_invoices_basic(
     ) as mock_status_changer, patch(
         "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
     ) as mock_transfer_sender, patch(
-        "app.jobs.transfer_starkbank_undelivered_credited_invoices.settings"
-    ) as mock_settings:
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry:
 
         # Setup mocks
         fetcher_instance = Mock()
-        fetcher_instance.fetch_undelivered_events.return_value = [mock_credited_invoice_event]
+        fetcher_instance.fetch_undelivered_events.return_value = [
+            mock_credited_invoice_event
+        ]
         mock_fetcher.return_value = fetcher_instance
 
         status_changer_instance = Mock()
@@ -101,15 +132,19 @@ def test_transfer_starkbank_undelivered_credited_invoices_basic(
         transfer_sender_instance = Mock()
         mock_transfer_sender.return_value = transfer_sender_instance
 
-        mock_settings.default_account = mock_account
-        mock_settings.starkbank_project = "test-project"
+        mock_registry.return_value = [workspace_of(mock_account)]
 
         # Run function
         transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
 
         # Verify thread lock was used correctly
-        mock_thread_lock.lock.assert_called_once_with(f"event:{mock_credited_invoice_event.id}")
-        mock_thread_lock.unlock.assert_called_once_with(f"event:{mock_credited_invoice_event.id}")
+        # expires after twice the longest handling of an event
+        mock_thread_lock.lock.assert_called_once_with(
+            f"event:{mock_credited_invoice_event.id}", 160
+        )
+        mock_thread_lock.unlock.assert_called_once_with(
+            f"event:{mock_credited_invoice_event.id}"
+        )
 
         # Verify transfer was sent with correct amount
         transfer_sender_instance.send.assert_called_once()
@@ -138,8 +173,8 @@ def test_transfer_starkbank_undelivered_credited_invoices_filtering(
     ) as mock_status_changer, patch(
         "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
     ) as mock_transfer_sender, patch(
-        "app.jobs.transfer_starkbank_undelivered_credited_invoices.settings"
-    ) as mock_settings:
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry:
 
         # Setup mocks
         fetcher_instance = Mock()
@@ -156,8 +191,7 @@ def test_transfer_starkbank_undelivered_credited_invoices_filtering(
         transfer_sender_instance = Mock()
         mock_transfer_sender.return_value = transfer_sender_instance
 
-        mock_settings.default_account = mock_account
-        mock_settings.starkbank_project = "test-project"
+        mock_registry.return_value = [workspace_of(mock_account)]
 
         # Run function
         transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
@@ -225,8 +259,8 @@ def test_transfer_starkbank_undelivered_events_all_marked_delivered(
     ) as mock_status_changer, patch(
         "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
     ) as mock_transfer_sender, patch(
-        "app.jobs.transfer_starkbank_undelivered_credited_invoices.settings"
-    ) as mock_settings:
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry:
 
         # Setup mocks
         fetcher_instance = Mock()
@@ -243,8 +277,7 @@ def test_transfer_starkbank_undelivered_events_all_marked_delivered(
         transfer_sender_instance = Mock()
         mock_transfer_sender.return_value = transfer_sender_instance
 
-        mock_settings.default_account = mock_account
-        mock_settings.starkbank_project = "test-project"
+        mock_registry.return_value = [workspace_of(mock_account)]
 
         # Run function
         transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
@@ -277,14 +310,14 @@ def test_transfer_starkbank_undelivered_credited_invoices_error_handling(
     ) as mock_status_changer, patch(
         "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
     ) as mock_transfer_sender, patch(
-        "app.jobs.transfer_starkbank_undelivered_credited_invoices.settings"
-    ) as mock_settings:
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry:
 
         # Setup mocks
         fetcher_instance = Mock()
         # Return two events - one will fail, one should succeed
         fetcher_instance.fetch_undelivered_events.return_value = [
-            mock_credited_invoice_event,  # This one will fail
+            mock_credited_invoice_event,  # This one will fail and stay undelivered
             mock_non_credited_invoice_event,  # This one should be marked as delivered
         ]
         mock_fetcher.return_value = fetcher_instance
@@ -297,8 +330,7 @@ def test_transfer_starkbank_undelivered_credited_invoices_error_handling(
         transfer_sender_instance.send.side_effect = Exception("Transfer failed")
         mock_transfer_sender.return_value = transfer_sender_instance
 
-        mock_settings.default_account = mock_account
-        mock_settings.starkbank_project = "test-project"
+        mock_registry.return_value = [workspace_of(mock_account)]
 
         # Run function - should not raise exception
         transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
@@ -310,5 +342,416 @@ def test_transfer_starkbank_undelivered_credited_invoices_error_handling(
         # Verify transfer was attempted for credited invoice event
         transfer_sender_instance.send.assert_called_once()
 
-        # Verify both events were marked as delivered
-        assert status_changer_instance.mark_as_delivered.call_count == 2 
\ No newline at end of file
+        # Verify only the event that did not fail was marked as delivered,
+        # the failed one is retried on the next run
+        status_changer_instance.mark_as_delivered.assert_called_once_with(
+            mock_non_credited_invoice_event.id
+        )
+
+
+def test_transfer_starkbank_undelivered_credited_invoices_counts_failures(
+    mock_credited_invoice_event,
+    mock_non_credited_invoice_event,
+    mock_account,
+    mock_thread_lock,
+    history,
+    caplog,
+):
+    with patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventFetcher"
+    ) as mock_fetcher, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventStatusChanger"
+    ) as mock_status_changer, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
+    ) as mock_transfer_sender, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry:
+
+        fetcher_instance = Mock()
+        fetcher_instance.fetch_undelivered_events.return_value = [
+            mock_credited_invoice_event,
+            mock_non_credited_invoice_event,
+        ]
+        mock_fetcher.return_value = fetcher_instance
+
+        mock_status_changer.return_value = Mock()
+
+        transfer_sender_instance = Mock()
+        transfer_sender_instance.send.side_effect = Exception("Transfer failed")
+        mock_transfer_sender.return_value = transfer_sender_instance
+
+        mock_registry.return_value = [workspace_of(mock_account)]
+
+        transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
+
+        [run] = history.runs()
+        assert run["status"] == "succeeded"
+        assert run["counts"] == {"failed": 1, "processed": 1}
+        [failure] = [r for r in caplog.records if r.levelname == "ERROR"]
+        assert failure.event_id == mock_credited_invoice_event.id
+
+
+@pytest.mark.parametrize(
+    "error", [CircuitOpenError("transfer"), RateLimitedError("starkbank:transfer")]
+)
+def test_transfer_starkbank_undelivered_credited_invoices_stops_when_circuit_open(
+    error,
+    mock_credited_invoice_event,
+    mock_non_credited_invoice_event,
+    mock_account,
+    mock_thread_lock,
+):
+    with patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventFetcher"
+    ) as mock_fetcher, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventStatusChanger"
+    ) as mock_status_changer, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
+    ) as mock_transfer_sender, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry:
+
+        fetcher_instance = Mock()
+        fetcher_instance.fetch_undelivered_events.return_value = [
+            mock_credited_invoice_event,
+            mock_non_credited_invoice_event,
+        ]
+        mock_fetcher.return_value = fetcher_instance
+
+        status_changer_instance = Mock()
+        mock_status_changer.return_value = status_changer_instance
+
+        transfer_sender_instance = Mock()
+        transfer_sender_instance.send.side_effect = error
+        mock_transfer_sender.return_value = transfer_sender_instance
+
+        mock_registry.return_value = [workspace_of(mock_account)]
+
+        transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
+
+        # the remaining events are left for the next run
+        assert mock_thread_lock.lock.call_count == 1
+        mock_thread_lock.unlock.assert_called_once_with(
+            f"event:{mock_credited_invoice_event.id}"
+        )
+        status_changer_instance.mark_as_delivered.assert_not_called()
+
+
+def test_transfer_starkbank_undelivered_credited_invoices_uses_event_archive(
+    tmp_path,
+    mock_credited_invoice_event,
+    mock_non_credited_invoice_event,
+    mock_account,
+    mock_thread_lock,
+):
+    event_archive = SQLiteEventArchive(str(tmp_path / "events.db"))
+    # transferred by a webhook, but Stark Bank never got the 200
+    event_archive.append(
+        [
+            ArchivedEvent(
+                event_id=mock_credited_invoice_event.id,
+                created=mock_credited_invoice_event.created,
+                outcome=EventOutcome.TRANSFERRED,
+                source="webhook",
+            )
+        ]
+    )
+    archive_writer = Mock()
+
+    with patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventFetcher"
+    ) as mock_fetcher, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventStatusChanger"
+    ) as mock_status_changer, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
+    ) as mock_transfer_sender, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_event_archive",
+        return_value=event_archive,
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_event_archive_writer",
+        return_value=archive_writer,
+    ):
+
+        fetcher_instance = Mock()
+        fetcher_instance.fetch_undelivered_events.return_value = [
+            mock_credited_invoice_event,
+            mock_non_credited_invoice_event,
+        ]
+        mock_fetcher.return_value = fetcher_instance
+
+        status_changer_instance = Mock()
+        mock_status_changer.return_value = status_changer_instance
+
+        transfer_sender_instance = Mock()
+        mock_transfer_sender.return_value = transfer_sender_instance
+
+        mock_registry.return_value = [workspace_of(mock_account)]
+
+        transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
+
+        # no second transfer, the event is only marked as delivered
+        transfer_sender_instance.send.assert_not_called()
+        assert status_changer_instance.mark_as_delivered.call_count == 2
+
+        archive_writer.submit.assert_called_once()
+        archived = archive_writer.submit.call_args[0][0]
+        assert archived.event_id == mock_non_credited_invoice_event.id
+        assert archived.outcome == EventOutcome.SKIPPED
+
+
+def test_transfer_starkbank_undelivered_credited_invoices_transfers_queued_events(
+    tmp_path,
+    mock_credited_invoice_event,
+    mock_account,
+    mock_thread_lock,
+):
+    event_archive = SQLiteEventArchive(str(tmp_path / "events.db"))
+    # queued by a webhook, but the outbox dead-lettered the transfer
+    event_archive.append(
+        [
+            ArchivedEvent(
+                event_id=mock_credited_invoice_event.id,
+                created=mock_credited_invoice_event.created,
+                outcome=EventOutcome.QUEUED,
+                source="webhook",
+            )
+        ]
+    )
+
+    with patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventFetcher"
+    ) as mock_fetcher, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventStatusChanger"
+    ) as mock_status_changer, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
+    ) as mock_transfer_sender, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_event_archive",
+        return_value=event_archive,
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_event_archive_writer",
+        return_value=None,
+    ):
+        mock_fetcher.return_value.fetch_undelivered_events.return_value = [
+            mock_credited_invoice_event
+        ]
+        mock_registry.return_value = [workspace_of(mock_account)]
+
+        transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
+
+        mock_transfer_sender.return_value.send.assert_called_once()
+        mock_status_changer.return_value.mark_as_delivered.assert_called_once_with(
+            mock_credited_invoice_event.id
+        )
+
+
+def make_credited_events(n):
+    return [
+        StarkBankEvent(
+            id=f"event-{i}",
+            subscription="invoice",
+            log={"type": "credited", "invoice": {"amount": 1000, "fee": 100}},
+            created=datetime.now(),
+            workspaceId="test-workspace",
+        )
+        for i in range(n)
+    ]
+
+
+def run_async_job(events, transfer_sender_instance, mock_account, max_concurrency):
+    thread_lock = AsyncMock()
+    thread_lock.lock.return_value = True
+    status_changer_instance = Mock()
+
+    with patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventFetcher"
+    ) as mock_fetcher, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventStatusChanger",
+        return_value=status_changer_instance,
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender",
+        return_value=transfer_sender_instance,
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry, ThreadPoolExecutor(
+        max_concurrency
+    ) as executor:
+        mock_fetcher.return_value.fetch_undelivered_events.return_value = iter(events)
+        mock_registry.return_value = [workspace_of(mock_account)]
+
+        asyncio.run(
+            transfer_starkbank_undelivered_credited_invoices_async(
+                thread_lock, executor, max_concurrency
+            )
+        )
+
+    return thread_lock, status_changer_instance
+
+
+def test_transfer_starkbank_undelivered_credited_invoices_async_runs_concurrently(
+    mock_account,
+):
+    events = make_credited_events(6)
+    # each transfer waits for two others to be in flight at the same time
+    in_flight = threading.Barrier(3, timeout=5)
+    transfer_sender_instance = Mock()
+    transfer_sender_instance.send.side_effect = lambda transfer: in_flight.wait()
+
+    thread_lock, status_changer_instance = run_async_job(
+        events, transfer_sender_instance, mock_account, max_concurrency=3
+    )
+
+    assert transfer_sender_instance.send.call_count == 6
+    delivered = {
+        c.args[0] for c in status_changer_instance.mark_as_delivered.mock_calls
+    }
+    assert delivered == {event.id for event in events}
+    assert thread_lock.unlock.await_count == 6
+
+
+def test_transfer_starkbank_undelivered_credited_invoices_async_stops_when_unavailable(
+    mock_account,
+):
+    events = make_credited_events(10)
+    transfer_sender_instance = Mock()
+    transfer_sender_instance.send.side_effect = CircuitOpenError("transfer")
+
+    thread_lock, status_changer_instance = run_async_job(
+        events, transfer_sender_instance, mock_account, max_concurrency=2
+    )
+
+    # only the events already in flight are attempted
+    assert transfer_sender_instance.send.call_count <= 2
+    assert thread_lock.lock.await_count == thread_lock.unlock.await_count
+    status_changer_instance.mark_as_delivered.assert_not_called()
+
+
+def test_transfer_starkbank_undelivered_credited_invoices_stops_when_draining(
+    mock_credited_invoice_event,
+    mock_non_credited_invoice_event,
+    mock_account,
+    mock_thread_lock,
+):
+    drain_tracker = DrainTracker("test_jobs")
+    transfer_sender_instance = Mock()
+    # shutdown starts while the first transfer is being sent
+    transfer_sender_instance.send.side_effect = (
+        lambda transfer: drain_tracker.stop_accepting()
+    )
+
+    with patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventFetcher"
+    ) as mock_fetcher, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventStatusChanger"
+    ) as mock_status_changer, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender",
+        return_value=transfer_sender_instance,
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry"
+    ) as mock_registry, patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_drain_tracker",
+        return_value=drain_tracker,
+    ):
+        mock_fetcher.return_value.fetch_undelivered_events.return_value = [
+            mock_credited_invoice_event,
+            mock_non_credited_invoice_event,
+        ]
+        mock_registry.return_value = [workspace_of(mock_account)]
+
+        transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
+
+        # the event in flight is finished, the next one is not started
+        mock_status_changer.return_value.mark_as_delivered.assert_called_once_with(
+            mock_credited_invoice_event.id
+        )
+        mock_thread_lock.lock.assert_called_once()
+        mock_thread_lock.unlock.assert_called_once()
+
+
+def test_each_workspace_is_reconciled_with_its_own_clients(
+    mock_credited_invoice_event, mock_account, mock_thread_lock
+):
+    other_account = mock_account.model_copy(update={"name": "Other Account"})
+    main, other = workspace_of(mock_account), workspace_of(other_account)
+    main.project, other.project = "main-project", "other-project"
+    other_event = mock_credited_invoice_event.model_copy(update={"id": "other-event"})
+    events = {
+        "main-project": [mock_credited_invoice_event],
+        "other-project": [other_event],
+    }
+    transfer_senders = {"main-project": Mock(), "other-project": Mock()}
+    # the budget of the main workspace is spent
+    transfer_senders["main-project"].send.side_effect = RateLimitedError("transfer")
+
+    with patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventFetcher",
+        side_effect=lambda project, caller, **options: Mock(
+            fetch_undelivered_events=Mock(return_value=events[project])
+        ),
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventStatusChanger"
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender",
+        side_effect=lambda project, caller: transfer_senders[project],
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry",
+        return_value=[main, other],
+    ):
+        transfer_starkbank_undelivered_credited_invoices(mock_thread_lock)
+
+    sent_transfer = transfer_senders["other-project"].send.call_args[0][0]
+    assert sent_transfer.account == other_account
+    assert sent_transfer.external_id == "event-other-event"
+
+
+@pytest.mark.parametrize(
+    "error", [RuntimeError("invalid credentials"), CircuitOpenError("event")]
+)
+@pytest.mark.parametrize("runtime", ["thread", "asyncio"])
+def test_a_workspace_that_cannot_be_fetched_does_not_stop_the_others(
+    mock_credited_invoice_event, mock_account, error, runtime
+):
+    main, other = workspace_of(mock_account), workspace_of(mock_account)
+    main.project, other.project = "main-project", "other-project"
+    fetchers = {
+        "main-project": Mock(fetch_undelivered_events=Mock(side_effect=error)),
+        "other-project": Mock(
+            fetch_undelivered_events=Mock(
+                return_value=iter([mock_credited_invoice_event])
+            )
+        ),
+    }
+    status_changer_instance = Mock()
+
+    with patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventFetcher",
+        side_effect=lambda project, caller, **options: fetchers[project],
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankEventStatusChanger",
+        return_value=status_changer_instance,
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.StarkBankTransferSender"
+    ), patch(
+        "app.jobs.transfer_starkbank_undelivered_credited_invoices.get_workspace_registry",
+        return_value=[main, other],
+    ):
+        if runtime == "thread":
+            thread_lock = Mock()
+            thread_lock.lock.return_value = True
+            transfer_starkbank_undelivered_credited_invoices(thread_lock)
+        else:
+            thread_lock = AsyncMock()
+            thread_lock.lock.return_value = True
+            with ThreadPoolExecutor(2) as executor:
+                asyncio.run(
+                    transfer_starkbank_undelivered_credited_invoices_async(
+                        thread_lock, executor, 2
+                    )
+                )
+
+    status_changer_instance.mark_as_delivered.assert_called_once_with(
+        mock_credited_invoice_event.id
+    )
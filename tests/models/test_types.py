@@ -8,6 +8,7 @@ from app.models.types import (
     Transfer,
     Invoice,
     StarkBankEvent,
+    credited_invoice_transfer,
 )
 
 
@@ -169,6 +170,44 @@ def test_transfer_invalid_amount():
     assert "Input should be less than 10000000000" in str(exc_info.value)
 
 
+def test_credited_invoice_transfer_is_built_from_trusted_data():
+    account = Account(
+        bank_code="341",
+        branch="0001",
+        account="1234567",
+        name="Test Account",
+        tax_id="123.456.789-00",
+        account_type=AccountType.CHECKING,
+    )
+
+    transfer = credited_invoice_transfer(account, 900, "event-1", "invoice-1")
+
+    assert transfer == Transfer(
+        account=account,
+        amount=900,
+        external_id="invoice-invoice-1",
+        tags=["event/event-1", "invoice/invoice-1"],
+    )
+    assert transfer.account is account
+
+
+def test_credited_invoice_transfer_checks_the_amount():
+    account = Account(
+        bank_code="341",
+        branch="0001",
+        account="1234567",
+        name="Test Account",
+        tax_id="123.456.789-00",
+        account_type=AccountType.CHECKING,
+    )
+
+    # a fee as large as the invoice leaves nothing to transfer
+    with pytest.raises(ValueError):
+        credited_invoice_transfer(account, 0, "event-1", "invoice-1")
+    with pytest.raises(ValueError):
+        credited_invoice_transfer(account, 10000000000, "event-1", "invoice-1")
+
+
 def test_invoice_valid():
     person = Person(name="John Doe", cpf="803.778.410-05")
     invoice = Invoice(amount=1000, person=person, due_date=date(2024, 12, 31))
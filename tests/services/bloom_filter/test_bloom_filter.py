@@ -0,0 +1,103 @@
+import pytest
+import time
+import fakeredis
+from app.services.bloom_filter.implementation import RedisRotatingBloomFilter
+
+
+class FakeClock:
+    def __init__(self):
+        # bucket keys use EXPIREAT, so the clock must follow Redis' clock
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def bloom_filter(redis_client, clock):
+    return RedisRotatingBloomFilter(
+        redis_client,
+        namespace="test:bloom",
+        capacity=1000,
+        error_rate=0.01,
+        bucket_seconds=60,
+        retention=300,
+        clock=clock,
+    )
+
+
+def test_added_members_are_found(bloom_filter):
+    bloom_filter.add("event-1")
+
+    assert bloom_filter.might_contain("event-1")
+    assert not bloom_filter.might_contain("event-2")
+
+
+def test_members_are_found_across_buckets(bloom_filter, clock):
+    bloom_filter.add("event-1")
+    clock.now += 120
+    bloom_filter.add("event-2")
+
+    assert bloom_filter.might_contain("event-1")
+    assert bloom_filter.might_contain("event-2")
+
+
+def test_members_are_forgotten_after_retention(bloom_filter, clock):
+    bloom_filter.add("event-1")
+
+    clock.now += 300
+    assert bloom_filter.might_contain("event-1")
+
+    clock.now += 120
+    assert not bloom_filter.might_contain("event-1")
+
+
+def test_bucket_keys_expire(bloom_filter, redis_client, clock):
+    bloom_filter.add("event-1")
+
+    keys = redis_client.keys("test:bloom:*")
+    assert len(keys) == 1
+    expire_at = redis_client.expiretime(keys[0])
+    assert clock.now + 300 <= expire_at <= clock.now + 300 + 2 * 60
+
+
+def test_false_positive_rate_is_bounded(bloom_filter):
+    for i in range(1000):
+        bloom_filter.add(f"event-{i}")
+
+    false_positives = sum(bloom_filter.might_contain(f"other-{i}") for i in range(2000))
+
+    assert false_positives / 2000 <= 0.01
+
+
+def test_memory_is_sized_from_capacity_and_error_rate(redis_client):
+    bloom_filter = RedisRotatingBloomFilter(
+        redis_client,
+        namespace="test:bloom",
+        capacity=250000,
+        error_rate=0.001,
+        bucket_seconds=6 * 3600,
+        retention=3 * 24 * 3600,
+    )
+
+    assert bloom_filter.n_buckets == 13
+    assert bloom_filter.memory_bytes < 10 * 1024 * 1024
+
+
+def test_invalid_arguments(redis_client):
+    with pytest.raises(ValueError):
+        RedisRotatingBloomFilter(redis_client, "ns", 0, 0.01, 60, 300)
+    with pytest.raises(ValueError):
+        RedisRotatingBloomFilter(redis_client, "ns", 10, 1, 60, 300)
+    with pytest.raises(ValueError):
+        RedisRotatingBloomFilter(redis_client, "ns", 10, 0.01, 60, 30)
@@ -0,0 +1,33 @@
+import pytest
+from app.services.concurrency_limiter.implementation import ConcurrencyLimiter
+
+
+def test_rejects_over_the_limit():
+    limiter = ConcurrencyLimiter("test", limit=2)
+
+    assert limiter.try_acquire() is True
+    assert limiter.try_acquire() is True
+    assert limiter.try_acquire() is False
+    assert limiter.in_flight == 2
+
+
+def test_release_frees_a_slot():
+    limiter = ConcurrencyLimiter("test", limit=1)
+    limiter.try_acquire()
+
+    limiter.release()
+
+    assert limiter.in_flight == 0
+    assert limiter.try_acquire() is True
+
+
+def test_release_without_acquire_fails():
+    limiter = ConcurrencyLimiter("test", limit=1)
+
+    with pytest.raises(RuntimeError):
+        limiter.release()
+
+
+def test_invalid_limit():
+    with pytest.raises(ValueError):
+        ConcurrencyLimiter("test", limit=0)
@@ -0,0 +1,64 @@
+import threading
+import pytest
+from prometheus_client import REGISTRY
+from app.services.drain.implementation import DrainingError, DrainTracker
+
+
+def drained(name, result):
+    return (
+        REGISTRY.get_sample_value(
+            "drain_work_total", {"tracker": name, "result": result}
+        )
+        or 0
+    )
+
+
+def test_tracks_work_in_flight():
+    tracker = DrainTracker("test_in_flight")
+
+    with tracker.track():
+        with tracker.track():
+            assert tracker.in_flight == 2
+    assert tracker.in_flight == 0
+
+
+def test_refuses_new_work_once_draining():
+    tracker = DrainTracker("test_refuses")
+
+    assert tracker.drain(0) == (0, 0)
+
+    assert tracker.draining
+    with pytest.raises(DrainingError):
+        with tracker.track():
+            pass
+
+
+def test_waits_for_work_in_flight():
+    tracker = DrainTracker("test_waits")
+    started = threading.Event()
+    finish = threading.Event()
+
+    def work():
+        with tracker.track():
+            started.set()
+            finish.wait(5)
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    started.wait(5)
+    threading.Timer(0.05, finish.set).start()
+
+    assert tracker.drain(5) == (1, 0)
+    assert drained("test_waits", "drained") == 1
+    thread.join()
+
+
+def test_counts_abandoned_work():
+    tracker = DrainTracker("test_abandons")
+
+    with tracker.track():
+        pass
+    with tracker.track(), tracker.track():
+        assert tracker.drain(0.01) == (0, 2)
+
+    assert drained("test_abandons", "abandoned") == 2
@@ -0,0 +1,142 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+import pytest
+from prometheus_client import REGISTRY
+from app.models.types import ArchivedEvent, EventOutcome
+from app.services.event_archive.implementation import (
+    BatchedEventArchiveWriter,
+    SQLiteEventArchive,
+)
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return SQLiteEventArchive(str(tmp_path / "events.db"))
+
+
+def record(event_id="event-1", outcome=EventOutcome.TRANSFERRED, minutes=0, **kwargs):
+    return ArchivedEvent(
+        event_id=event_id,
+        created=START + timedelta(minutes=minutes),
+        outcome=outcome,
+        source="test",
+        **kwargs,
+    )
+
+
+def archived(result):
+    return (
+        REGISTRY.get_sample_value("event_archive_records_total", {"result": result})
+        or 0
+    )
+
+
+def test_uses_write_ahead_logging(archive):
+    connection = sqlite3.connect(archive.path)
+
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = {row[1] for row in connection.execute("PRAGMA index_list(events)")}
+    assert indexes == {"events_event_id", "events_invoice_id", "events_created"}
+
+
+def test_finds_records_by_event_and_invoice(archive):
+    archive.append(
+        [
+            record("event-1", EventOutcome.FAILED, invoice_id="invoice-1", amount=990),
+            record("event-1", invoice_id="invoice-1", amount=990),
+            record("event-2", invoice_id="invoice-2"),
+        ]
+    )
+
+    found = archive.find_by_event("event-1")
+
+    assert [r.outcome for r in found] == [
+        EventOutcome.FAILED,
+        EventOutcome.TRANSFERRED,
+    ]
+    assert found[0].created == START
+    assert found[0].amount == 990
+    assert [r.event_id for r in archive.find_by_invoice("invoice-2")] == ["event-2"]
+
+
+def test_finds_records_created_in_a_range(archive):
+    local = timezone(timedelta(hours=-3))
+    archive.append([record(f"event-{i}", minutes=i) for i in range(5)])
+
+    found = archive.find_created_between(
+        (START + timedelta(minutes=1)).astimezone(local),
+        START + timedelta(minutes=3),
+    )
+
+    assert [r.event_id for r in found] == ["event-1", "event-2"]
+
+
+@pytest.mark.parametrize(
+    "outcomes, done",
+    [
+        ([], False),
+        ([EventOutcome.FAILED], False),
+        ([EventOutcome.FAILED, EventOutcome.TRANSFERRED], True),
+        ([EventOutcome.QUEUED], False),
+        ([EventOutcome.QUEUED, EventOutcome.TRANSFERRED], True),
+        ([EventOutcome.SKIPPED], True),
+    ],
+)
+def test_is_done(archive, outcomes, done):
+    archive.append([record(outcome=outcome) for outcome in outcomes])
+
+    assert archive.is_done("event-1") is done
+
+
+def test_writer_appends_in_batches(archive):
+    archive = Mock(wraps=archive)
+    writer = BatchedEventArchiveWriter(archive, max_batch_size=10, flush_interval=5)
+    before = archived("written")
+
+    for i in range(25):
+        writer.submit(record(f"event-{i}"))
+    writer.flush()
+
+    assert [len(call[0][0]) for call in archive.append.call_args_list] == [10, 10, 5]
+    assert archive.is_done("event-24")
+    assert archived("written") == before + 25
+    writer.close()
+
+
+def test_writer_writes_pending_records_on_close(archive):
+    writer = BatchedEventArchiveWriter(archive, flush_interval=60)
+
+    writer.submit(record())
+    writer.close(timeout=5)
+
+    assert archive.is_done("event-1")
+
+
+def test_writer_survives_archive_failures(archive):
+    failing = Mock()
+    failing.append.side_effect = [sqlite3.OperationalError("locked"), None]
+    writer = BatchedEventArchiveWriter(failing, flush_interval=0)
+    before = archived("failed")
+
+    writer.submit(record("event-1"))
+    writer.flush()
+    writer.submit(record("event-2"))
+    writer.flush()
+
+    assert failing.append.call_count == 2
+    assert archived("failed") == before + 1
+    writer.close()
+
+
+def test_writer_drops_records_when_full(archive):
+    writer = BatchedEventArchiveWriter(archive, max_pending=1)
+    # nothing is taken from the queue any more
+    writer.close()
+    before = archived("dropped")
+
+    assert writer.submit(record("event-1"))
+    assert not writer.submit(record("event-2"))
+    assert archived("dropped") == before + 1
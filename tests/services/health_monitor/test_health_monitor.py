@@ -0,0 +1,90 @@
+import time
+import pytest
+from app.services.health_monitor.implementation import (
+    DEGRADED,
+    NOT_READY,
+    READY,
+    HealthMonitor,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def fail():
+    raise ConnectionError("refused")
+
+
+def test_not_ready_before_the_first_refresh(clock):
+    monitor = HealthMonitor({"redis": lambda: {}}, clock=clock)
+
+    assert monitor.snapshot() == {"status": NOT_READY, "checks": {}}
+
+
+def test_ready_when_every_check_passes(clock):
+    monitor = HealthMonitor(
+        {"redis": lambda: {"latency_ms": 0.5}}, required=["redis"], clock=clock
+    )
+    monitor.refresh()
+    clock.now += 2
+
+    assert monitor.snapshot() == {
+        "status": READY,
+        "age_seconds": 2,
+        "checks": {"redis": {"ok": True, "latency_ms": 0.5}},
+    }
+
+
+def test_failed_required_check_is_not_ready(clock):
+    monitor = HealthMonitor({"redis": fail}, required=["redis"], clock=clock)
+    monitor.refresh()
+
+    snapshot = monitor.snapshot()
+
+    assert snapshot["status"] == NOT_READY
+    assert snapshot["checks"]["redis"] == {"ok": False, "error": "refused"}
+
+
+def test_failed_optional_check_is_degraded(clock):
+    monitor = HealthMonitor(
+        {"redis": lambda: {}, "starkbank": lambda: {"ok": False}},
+        required=["redis"],
+        clock=clock,
+    )
+    monitor.refresh()
+
+    assert monitor.snapshot()["status"] == DEGRADED
+
+
+def test_stale_snapshot_is_not_ready(clock):
+    monitor = HealthMonitor({"redis": lambda: {}}, interval=5, clock=clock)
+    monitor.refresh()
+
+    clock.now += 15
+    assert monitor.snapshot()["status"] == READY
+    clock.now += 1
+    assert monitor.snapshot()["status"] == NOT_READY
+
+
+def test_background_thread_refreshes_the_snapshot():
+    monitor = HealthMonitor({"redis": lambda: {}}, interval=0.01)
+
+    monitor.start()
+    try:
+        deadline = time.monotonic() + 1
+        while monitor.snapshot()["status"] != READY and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        monitor.stop(timeout=1)
+
+    assert monitor.snapshot()["status"] == READY
@@ -0,0 +1,158 @@
+import asyncio
+import fakeredis
+import pytest
+import redis
+import threading
+from unittest.mock import Mock
+from app.core.job_history import (
+    count_job_events,
+    record_job_run,
+    record_job_run_async,
+)
+from app.core import job_history
+from app.services.job_history.implementation import (
+    FAILED,
+    RUNNING,
+    SUCCEEDED,
+    RedisJobHistory,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def history(clock):
+    return RedisJobHistory(fakeredis.FakeRedis(), progress_interval=5, clock=clock)
+
+
+def test_a_run_is_recorded_from_start_to_finish(history, clock):
+    run = history.start("sweep_transfers")
+
+    assert history.run(run.run_id)["status"] == RUNNING
+
+    run.count("processed", 3)
+    clock.now += 2
+    history.finish(run)
+
+    record = history.run(run.run_id)
+    assert record["status"] == SUCCEEDED
+    assert record["started_at"] == 1000.0
+    assert record["finished_at"] == 1002.0
+    assert record["counts"] == {"processed": 3}
+    assert record["error"] is None
+
+
+def test_a_failed_run_keeps_its_error(history):
+    run = history.start("sweep_transfers")
+
+    history.finish(run, ValueError("boom"))
+
+    record = history.run(run.run_id)
+    assert record["status"] == FAILED
+    assert record["error"] == "ValueError: boom"
+
+
+def test_progress_is_published_at_most_every_interval(history, clock):
+    run = history.start("process_queued_events")
+
+    run.report(ready=10)
+    assert history.run(run.run_id)["progress"] == {}
+
+    clock.now += 5
+    run.report(ready=8)
+    assert history.run(run.run_id)["progress"] == {"ready": 8}
+
+
+def test_runs_are_listed_newest_first_with_their_latest_state(history):
+    first = history.start("sweep_transfers")
+    second = history.start("invoice_random_people")
+    history.finish(first)
+
+    runs = history.runs()
+
+    assert [run["run_id"] for run in runs] == [first.run_id, second.run_id]
+    assert runs[0]["status"] == SUCCEEDED
+
+
+def test_runs_can_be_filtered_by_job_and_limited(history):
+    for _ in range(3):
+        history.start("sweep_transfers")
+    history.start("invoice_random_people")
+
+    runs = history.runs(job="sweep_transfers", limit=2)
+
+    assert len(runs) == 2
+    assert {run["job"] for run in runs} == {"sweep_transfers"}
+
+
+def test_an_unknown_run_is_none(history):
+    assert history.run("missing") is None
+
+
+def test_a_redis_failure_does_not_fail_the_job():
+    redis_client = Mock()
+    redis_client.pipeline.return_value.execute.side_effect = redis.ConnectionError()
+    history = RedisJobHistory(redis_client)
+
+    run = history.start("sweep_transfers")
+    history.finish(run)
+
+    assert run.status == SUCCEEDED
+
+
+def test_record_job_run_counts_the_events_of_the_run(history, monkeypatch):
+    monkeypatch.setattr(job_history, "get_job_history", lambda: history)
+
+    with record_job_run("sweep_transfers") as run:
+        count_job_events("sweep_transfers", "processed", 2)
+        count_job_events("sweep_transfers", "failed")
+
+    record = history.run(run.run_id)
+    assert record["status"] == SUCCEEDED
+    assert record["counts"] == {"processed": 2, "failed": 1}
+
+
+def test_record_job_run_records_the_exception_and_raises_it(history, monkeypatch):
+    monkeypatch.setattr(job_history, "get_job_history", lambda: history)
+
+    with pytest.raises(RuntimeError):
+        with record_job_run("sweep_transfers") as run:
+            raise RuntimeError("Stark Bank is down")
+
+    assert history.run(run.run_id)["error"] == "RuntimeError: Stark Bank is down"
+    assert job_history.current_job_run.get() is None
+
+
+def test_record_job_run_async_publishes_off_the_event_loop(history, monkeypatch):
+    monkeypatch.setattr(job_history, "get_job_history", lambda: history)
+    publishing_threads = set()
+    publish = history.publish
+
+    def record_thread(run):
+        publishing_threads.add(threading.get_ident())
+        publish(run)
+
+    monkeypatch.setattr(history, "publish", record_thread)
+
+    async def job():
+        async with record_job_run_async("sweep_transfers") as run:
+            count_job_events("sweep_transfers", "processed", 2)
+        return run
+
+    run = asyncio.run(job())
+
+    assert threading.get_ident() not in publishing_threads
+    record = history.run(run.run_id)
+    assert record["status"] == SUCCEEDED
+    assert record["counts"] == {"processed": 2}
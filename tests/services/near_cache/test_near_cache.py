@@ -0,0 +1,57 @@
+import pytest
+from app.services.near_cache.implementation import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_contains_added_keys(clock):
+    cache = TTLCache("test", max_size=10, ttl=60, clock=clock)
+    cache.add("event-1")
+
+    assert cache.contains("event-1")
+    assert not cache.contains("event-2")
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache("test", max_size=10, ttl=60, clock=clock)
+    cache.add("event-1")
+
+    clock.now += 59
+    assert cache.contains("event-1")
+
+    clock.now += 1
+    assert not cache.contains("event-1")
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache("test", max_size=2, ttl=60, clock=clock)
+    cache.add("event-1")
+    cache.add("event-2")
+
+    # touching event-1 makes event-2 the least recently used
+    assert cache.contains("event-1")
+    cache.add("event-3")
+
+    assert len(cache) == 2
+    assert cache.contains("event-1")
+    assert not cache.contains("event-2")
+    assert cache.contains("event-3")
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        TTLCache("test", max_size=0, ttl=60)
+    with pytest.raises(ValueError):
+        TTLCache("test", max_size=10, ttl=0)
@@ -0,0 +1,71 @@
+import pytest
+import fakeredis
+from app.services.outbox.implementation import RedisOutbox
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def outbox(redis_client):
+    return RedisOutbox(redis_client, "test", consumer_id="consumer-1")
+
+
+def test_items_are_claimed_in_order(outbox):
+    outbox.push({"amount": 1})
+    outbox.push({"amount": 2})
+
+    assert outbox.claim(0.1)[1] == {"amount": 1}
+    assert outbox.claim(0.1)[1] == {"amount": 2}
+    assert outbox.claim(0.1) is None
+
+
+def test_claimed_item_is_kept_until_acknowledged(outbox, redis_client):
+    outbox.push({"amount": 1})
+
+    raw, _ = outbox.claim(0.1)
+    assert len(outbox) == 0
+    assert redis_client.llen("outbox:test:processing:consumer-1") == 1
+
+    outbox.ack(raw)
+    assert redis_client.llen("outbox:test:processing:consumer-1") == 0
+
+
+def test_retry_puts_the_item_back_at_the_end(outbox):
+    outbox.push({"amount": 1})
+    outbox.push({"amount": 2})
+    raw, _ = outbox.claim(0.1)
+
+    outbox.retry(raw)
+
+    assert outbox.claim(0.1)[1] == {"amount": 2}
+    assert outbox.claim(0.1)[1] == {"amount": 1}
+
+
+def test_dead_letter(outbox, redis_client):
+    outbox.push({"amount": 1})
+    raw, _ = outbox.claim(0.1)
+
+    outbox.dead_letter(raw)
+
+    assert len(outbox) == 0
+    assert redis_client.lrange("outbox:test:dead", 0, -1) == [raw]
+    assert redis_client.llen("outbox:test:processing:consumer-1") == 0
+
+
+def test_items_of_dead_consumers_are_recovered(outbox, redis_client):
+    outbox.push({"amount": 1})
+    outbox.push({"amount": 2})
+    outbox.claim(0.1)
+    other = RedisOutbox(redis_client, "test", consumer_id="consumer-2")
+
+    # consumer-1 is still alive
+    assert other.recover_abandoned() == 0
+
+    redis_client.delete("outbox:test:heartbeat:consumer-1")
+    assert other.recover_abandoned() == 1
+    # recovered items are claimed first
+    assert other.claim(0.1)[1] == {"amount": 1}
+    assert redis_client.smembers("outbox:test:consumers") == {b"consumer-2"}
@@ -0,0 +1,171 @@
+import pytest
+import fakeredis
+from app.services.rate_limiter.implementation import RedisTokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_burst_up_to_capacity(redis_client, clock):
+    bucket = RedisTokenBucket(redis_client, "test", rate=1, capacity=3, clock=clock)
+
+    results = [bucket.try_acquire()[0] for _ in range(4)]
+
+    assert results == [True, True, True, False]
+
+
+def test_reports_wait_until_tokens_are_available(redis_client, clock):
+    bucket = RedisTokenBucket(redis_client, "test", rate=2, capacity=1, clock=clock)
+    bucket.try_acquire()
+
+    acquired, wait = bucket.try_acquire()
+
+    assert not acquired
+    assert wait == pytest.approx(0.5)
+
+
+def test_refills_over_time(redis_client, clock):
+    bucket = RedisTokenBucket(redis_client, "test", rate=2, capacity=2, clock=clock)
+    bucket.try_acquire()
+    bucket.try_acquire()
+
+    clock.now += 0.5
+
+    assert bucket.try_acquire() == (True, 0)
+    assert bucket.try_acquire()[0] is False
+
+
+def test_refill_is_capped_at_capacity(redis_client, clock):
+    bucket = RedisTokenBucket(redis_client, "test", rate=10, capacity=2, clock=clock)
+    bucket.try_acquire()
+
+    clock.now += 60
+
+    results = [bucket.try_acquire()[0] for _ in range(3)]
+    assert results == [True, True, False]
+
+
+def test_budget_is_shared_between_instances(redis_client, clock):
+    first = RedisTokenBucket(redis_client, "test", rate=1, capacity=1, clock=clock)
+    second = RedisTokenBucket(redis_client, "test", rate=1, capacity=1, clock=clock)
+
+    assert first.try_acquire()[0] is True
+    assert second.try_acquire()[0] is False
+
+
+def test_buckets_with_different_names_are_independent(redis_client, clock):
+    first = RedisTokenBucket(redis_client, "first", rate=1, capacity=1, clock=clock)
+    second = RedisTokenBucket(redis_client, "second", rate=1, capacity=1, clock=clock)
+
+    assert first.try_acquire()[0] is True
+    assert second.try_acquire()[0] is True
+
+
+def test_bucket_key_expires(redis_client, clock):
+    bucket = RedisTokenBucket(redis_client, "test", rate=1, capacity=10, clock=clock)
+    bucket.try_acquire()
+
+    assert 0 < redis_client.ttl("ratelimit:test") <= 10 + bucket.recovery
+
+
+def test_reserve_is_left_for_other_callers(redis_client, clock):
+    bucket = RedisTokenBucket(redis_client, "test", rate=1, capacity=3, clock=clock)
+
+    low_priority = [bucket.try_acquire(reserve=1)[0] for _ in range(3)]
+
+    assert low_priority == [True, True, False]
+    assert bucket.try_acquire() == (True, 0)
+
+
+def test_reserve_is_included_in_the_wait(redis_client, clock):
+    bucket = RedisTokenBucket(redis_client, "test", rate=2, capacity=2, clock=clock)
+    bucket.try_acquire()
+    bucket.try_acquire()
+
+    acquired, wait = bucket.try_acquire(reserve=1)
+
+    assert not acquired
+    assert wait == pytest.approx(1)
+
+
+def test_penalize_cuts_the_rate_and_empties_the_bucket(redis_client, clock):
+    bucket = RedisTokenBucket(
+        redis_client, "test", rate=10, capacity=10, recovery=60, clock=clock
+    )
+
+    assert bucket.penalize() == pytest.approx(5)
+    assert bucket.try_acquire()[0] is False
+
+    clock.now += 1
+    results = [bucket.try_acquire()[0] for _ in range(10)]
+    assert results.count(True) == 5
+
+
+def test_penalize_is_shared_and_compounds(redis_client, clock):
+    first = RedisTokenBucket(redis_client, "test", rate=8, capacity=8, clock=clock)
+    second = RedisTokenBucket(redis_client, "test", rate=8, capacity=8, clock=clock)
+
+    first.penalize()
+
+    assert second.penalize() == pytest.approx(2)
+
+
+def test_penalize_does_not_go_below_min_rate(redis_client, clock):
+    bucket = RedisTokenBucket(
+        redis_client, "test", rate=10, capacity=10, min_rate=4, clock=clock
+    )
+
+    bucket.penalize()
+
+    assert bucket.penalize() == pytest.approx(4)
+
+
+def test_rate_recovers_after_penalty(redis_client, clock):
+    bucket = RedisTokenBucket(
+        redis_client, "test", rate=10, capacity=10, recovery=60, clock=clock
+    )
+    bucket.penalize()
+
+    clock.now += 30
+    assert bucket.penalize(factor=0.9) == pytest.approx(9)
+
+    clock.now += 60
+    bucket.try_acquire()
+    assert redis_client.hget("ratelimit:test", "penalized_rate") is None
+
+
+def test_reads_the_time_of_the_redis_server(redis_client):
+    bucket = RedisTokenBucket(redis_client, "test", rate=1, capacity=2)
+    seconds, microseconds = redis_client.time()
+
+    assert bucket.try_acquire() == (True, 0)
+    assert bucket.penalize() == 0.5
+
+    updated = float(redis_client.hget(bucket.key, "updated"))
+    assert updated == pytest.approx(seconds + microseconds / 1_000_000, abs=1)
+
+
+def test_invalid_parameters(redis_client):
+    with pytest.raises(ValueError):
+        RedisTokenBucket(redis_client, "test", rate=0, capacity=1)
+    with pytest.raises(ValueError):
+        RedisTokenBucket(redis_client, "test", rate=1, capacity=0)
+    with pytest.raises(ValueError):
+        RedisTokenBucket(redis_client, "test", rate=1, capacity=1, min_rate=2)
+    with pytest.raises(ValueError):
+        RedisTokenBucket(redis_client, "test", rate=1, capacity=1).penalize(factor=1)
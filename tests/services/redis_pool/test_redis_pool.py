@@ -0,0 +1,82 @@
+from unittest.mock import Mock
+import fakeredis
+import pytest
+import redis
+from prometheus_client import REGISTRY
+from app.services.redis_pool.implementation import (
+    InstrumentedConnectionPool,
+    RedisPoolRegistry,
+)
+
+
+def sample(name, pool):
+    return REGISTRY.get_sample_value(name, {"pool": pool}) or 0
+
+
+@pytest.fixture
+def pool():
+    return InstrumentedConnectionPool(
+        pool_name="test_pool",
+        connection_class=fakeredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        max_connections=2,
+        timeout=0.05,
+    )
+
+
+def test_connections_are_counted_when_opened_and_reused(pool):
+    created = sample("redis_pool_connections_created_total", "test_pool")
+    client = redis.Redis(connection_pool=pool)
+
+    client.set("key", "1")
+    client.get("key")
+
+    assert sample("redis_pool_connections_created_total", "test_pool") == created + 1
+
+
+def test_checked_out_connections_are_in_use(pool):
+    in_use = sample("redis_pool_connections_in_use", "test_pool")
+    waits = sample("redis_pool_wait_seconds_count", "test_pool")
+
+    connection = pool.get_connection("PING")
+
+    assert sample("redis_pool_connections_in_use", "test_pool") == in_use + 1
+    assert sample("redis_pool_wait_seconds_count", "test_pool") == waits + 1
+
+    pool.release(connection)
+
+    assert sample("redis_pool_connections_in_use", "test_pool") == in_use
+
+
+def test_checkout_waits_for_a_free_connection(pool):
+    connections = [pool.get_connection("PING") for _ in range(2)]
+
+    with pytest.raises(redis.ConnectionError):
+        pool.get_connection("PING")
+
+    pool.release(connections.pop())
+    connections.append(pool.get_connection("PING"))
+    for connection in connections:
+        pool.release(connection)
+
+
+def test_max_connections_are_exported():
+    before = sample("redis_pool_max_connections", "test_sized_pool")
+
+    InstrumentedConnectionPool(pool_name="test_sized_pool", max_connections=7)
+
+    assert sample("redis_pool_max_connections", "test_sized_pool") == before + 7
+
+
+def test_registry_connects_once_per_name():
+    connect = Mock(side_effect=lambda name: object())
+    registry = RedisPoolRegistry(connect)
+
+    default = registry.client("default")
+
+    assert registry.client("default") is default
+    assert registry.client("replica") is not default
+    assert [call.args for call in connect.call_args_list] == [
+        ("default",),
+        ("replica",),
+    ]
@@ -0,0 +1,328 @@
+import pytest
+from unittest.mock import Mock
+import redis
+import starkbank
+from app.services.resilience.implementation import (
+    SERVER_ERROR,
+    UNAVAILABLE,
+    CircuitBreaker,
+    CircuitOpenError,
+    RateLimitedError,
+    ResilientCaller,
+    RetryPolicy,
+    classify_starkbank_error,
+    is_rate_limited,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("test", failure_threshold=2, recovery_timeout=10, clock=clock)
+
+
+@pytest.fixture
+def caller(breaker, clock):
+    return ResilientCaller(
+        "transfer",
+        breaker,
+        RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=1, deadline=30),
+        sleep=clock.sleep,
+        clock=clock,
+    )
+
+
+def connection_refused():
+    return starkbank.error.UnknownError(
+        "ConnectionError: HTTPSConnectionPool(...): Max retries exceeded "
+        "(Caused by NewConnectionError('Connection refused'))"
+    )
+
+
+def test_classify_starkbank_errors():
+    assert classify_starkbank_error(connection_refused()) == UNAVAILABLE
+    assert (
+        classify_starkbank_error(starkbank.error.UnknownError(b"Too Many Requests"))
+        == UNAVAILABLE
+    )
+    assert (
+        classify_starkbank_error(starkbank.error.UnknownError("ReadTimeout: None"))
+        == SERVER_ERROR
+    )
+    assert classify_starkbank_error(starkbank.error.InternalServerError()) == (
+        SERVER_ERROR
+    )
+    assert (
+        classify_starkbank_error(
+            starkbank.error.InputErrors([{"code": "invalidJson", "message": "x"}])
+        )
+        is None
+    )
+    assert classify_starkbank_error(ValueError("bug")) is None
+
+
+def test_call_returns_result(caller):
+    function = Mock(return_value="ok")
+
+    assert caller.call("create", function, 1, user="project") == "ok"
+    function.assert_called_once_with(1, user="project")
+
+
+def test_call_retries_transient_errors(caller):
+    function = Mock(side_effect=[connection_refused(), "ok"])
+
+    assert caller.call("create", function, idempotent=False) == "ok"
+    assert function.call_count == 2
+
+
+def test_call_does_not_retry_non_transient_errors(caller, breaker):
+    function = Mock(side_effect=ValueError("bug"))
+
+    with pytest.raises(ValueError):
+        caller.call("create", function)
+
+    assert function.call_count == 1
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_idempotent_call_is_not_retried_after_ambiguous_error(caller):
+    function = Mock(side_effect=starkbank.error.InternalServerError())
+
+    with pytest.raises(starkbank.error.InternalServerError):
+        caller.call("create", function, idempotent=False)
+
+    assert function.call_count == 1
+
+
+def test_idempotent_call_retries_until_attempts_run_out(clock):
+    caller = ResilientCaller(
+        "event",
+        CircuitBreaker("test", failure_threshold=10, clock=clock),
+        RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=1, deadline=30),
+        sleep=clock.sleep,
+        clock=clock,
+    )
+    function = Mock(side_effect=starkbank.error.InternalServerError())
+
+    with pytest.raises(starkbank.error.InternalServerError):
+        caller.call("update", function)
+
+    assert function.call_count == 3
+
+
+def test_call_stops_retrying_at_deadline(clock):
+    caller = ResilientCaller(
+        "event",
+        CircuitBreaker("test", failure_threshold=10, clock=clock),
+        RetryPolicy(max_attempts=10, base_delay=1, max_delay=1, deadline=0.5),
+        sleep=clock.sleep,
+        clock=clock,
+    )
+    function = Mock(side_effect=connection_refused())
+    caller.retry_policy.backoff = Mock(return_value=1)
+
+    with pytest.raises(starkbank.error.UnknownError):
+        caller.call("update", function)
+
+    assert function.call_count == 1
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+
+    delays = [policy.backoff(10) for _ in range(100)]
+
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_breaker_opens_and_fails_fast(caller, breaker):
+    function = Mock(side_effect=starkbank.error.InternalServerError())
+
+    with pytest.raises(starkbank.error.InternalServerError):
+        caller.call("create", function, idempotent=False)
+    with pytest.raises(starkbank.error.InternalServerError):
+        caller.call("create", function, idempotent=False)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        caller.call("create", function, idempotent=False)
+    assert function.call_count == 2
+
+
+def test_breaker_half_opens_after_recovery_timeout(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    # only one probe is let through
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_breaker(breaker, clock):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_guard_records_failures_without_retrying(caller, breaker):
+    for _ in range(2):
+        with pytest.raises(starkbank.error.InternalServerError):
+            with caller.guard():
+                raise starkbank.error.InternalServerError()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        with caller.guard():
+            pass
+
+
+@pytest.fixture
+def rate_limiter():
+    rate_limiter = Mock()
+    rate_limiter.name = "starkbank:transfer"
+    rate_limiter.try_acquire.return_value = (True, 0)
+    return rate_limiter
+
+
+@pytest.fixture
+def limited_caller(breaker, clock, rate_limiter):
+    return ResilientCaller(
+        "transfer",
+        breaker,
+        RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=1, deadline=30),
+        rate_limiter=rate_limiter,
+        low_priority_reserve=2,
+        sleep=clock.sleep,
+        clock=clock,
+    )
+
+
+def test_is_rate_limited():
+    assert is_rate_limited(starkbank.error.UnknownError(b"Too Many Requests"))
+    assert not is_rate_limited(connection_refused())
+    assert not is_rate_limited(starkbank.error.InternalServerError())
+
+
+def test_call_acquires_a_token_per_attempt(limited_caller, rate_limiter):
+    function = Mock(side_effect=[connection_refused(), "ok"])
+
+    assert limited_caller.call("create", function) == "ok"
+    assert rate_limiter.try_acquire.call_count == 2
+
+
+def test_low_priority_leaves_the_reserve(limited_caller, rate_limiter):
+    limited_caller.call("create", Mock())
+    limited_caller.call("create", Mock(), high_priority=True)
+
+    assert rate_limiter.try_acquire.call_args_list[0].kwargs == {"reserve": 2}
+    assert rate_limiter.try_acquire.call_args_list[1].kwargs == {"reserve": 0}
+
+
+def test_call_waits_for_a_token(limited_caller, rate_limiter, clock):
+    rate_limiter.try_acquire.side_effect = [(False, 2), (True, 0)]
+    function = Mock(return_value="ok")
+
+    assert limited_caller.call("create", function) == "ok"
+    assert 2 <= clock.now <= 4
+
+
+def test_call_fails_when_no_token_before_deadline(limited_caller, rate_limiter):
+    rate_limiter.try_acquire.return_value = (False, 60)
+    function = Mock()
+
+    with pytest.raises(RateLimitedError):
+        limited_caller.call("create", function)
+    function.assert_not_called()
+
+
+def test_call_fails_open_when_limiter_is_down(limited_caller, rate_limiter):
+    rate_limiter.try_acquire.side_effect = redis.ConnectionError()
+
+    assert limited_caller.call("create", Mock(return_value="ok")) == "ok"
+
+
+def test_too_many_requests_penalizes_the_limiter(limited_caller, rate_limiter):
+    function = Mock(
+        side_effect=[starkbank.error.UnknownError(b"Too Many Requests"), "ok"]
+    )
+
+    assert limited_caller.call("create", function) == "ok"
+    rate_limiter.penalize.assert_called_once()
+
+
+def test_other_failures_do_not_penalize_the_limiter(limited_caller, rate_limiter):
+    function = Mock(side_effect=[connection_refused(), "ok"])
+
+    limited_caller.call("create", function)
+
+    rate_limiter.penalize.assert_not_called()
+
+
+def test_guard_acquires_only_when_asked(limited_caller, rate_limiter):
+    with limited_caller.guard(acquire=False):
+        pass
+    with limited_caller.guard():
+        pass
+
+    rate_limiter.try_acquire.assert_called_once()
+
+
+def test_open_breaker_spends_no_token(limited_caller, breaker, rate_limiter):
+    breaker.record_failure()
+    breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        limited_caller.call("create", Mock())
+    with pytest.raises(CircuitOpenError):
+        with limited_caller.guard():
+            pass
+
+    rate_limiter.try_acquire.assert_not_called()
+
+
+def test_probe_without_a_token_is_given_back(
+    limited_caller, breaker, rate_limiter, clock
+):
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+    rate_limiter.try_acquire.return_value = (False, 60)
+
+    with pytest.raises(RateLimitedError):
+        limited_caller.call("create", Mock())
+
+    rate_limiter.try_acquire.return_value = (True, 0)
+    assert limited_caller.call("create", Mock(return_value="ok")) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
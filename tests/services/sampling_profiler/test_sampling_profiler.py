@@ -0,0 +1,68 @@
+import pytest
+import threading
+import time
+from app.services.sampling_profiler.implementation import SamplingProfiler
+
+
+def busy_function(stop: threading.Event):
+    while not stop.is_set():
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_function, args=(stop,), name="busy-thread")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_profile_returns_collapsed_stacks(busy_thread):
+    profiler = SamplingProfiler(interval=0.005)
+
+    output = profiler.profile(0.1)
+
+    lines = output.strip().splitlines()
+    assert len(lines) > 0
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert stack
+
+    busy_lines = [line for line in lines if line.startswith("busy-thread;")]
+    assert len(busy_lines) > 0
+    assert any(
+        "busy_function (test_sampling_profiler.py:" in line for line in busy_lines
+    )
+
+
+def test_profile_does_not_sample_itself():
+    profiler = SamplingProfiler(interval=0.005)
+
+    output = profiler.profile(0.05)
+
+    assert "__sample" not in output
+
+
+def test_profile_rejects_concurrent_runs(busy_thread):
+    profiler = SamplingProfiler(interval=0.005)
+    thread = threading.Thread(target=profiler.profile, args=(0.2,))
+    thread.start()
+    time.sleep(0.05)
+
+    assert profiler.is_running
+    with pytest.raises(RuntimeError):
+        profiler.profile(0.05)
+
+    thread.join()
+    assert not profiler.is_running
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        SamplingProfiler(interval=0)
+
+    with pytest.raises(ValueError):
+        SamplingProfiler().profile(0)
@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from app.services.singleflight.implementation import SingleFlight
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_calls_are_coalesced():
+    async def scenario():
+        singleflight = SingleFlight("test")
+        calls = 0
+        release = asyncio.Event()
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "result"
+
+        tasks = [
+            asyncio.create_task(singleflight.do("event-1", work)) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        return calls, await asyncio.gather(*tasks)
+
+    calls, results = run(scenario())
+
+    assert calls == 1
+    assert results[0] == ("result", False)
+    assert all(result == ("result", True) for result in results[1:])
+
+
+def test_different_keys_are_not_coalesced():
+    async def scenario():
+        singleflight = SingleFlight("test")
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(
+            singleflight.do("a", lambda: work("a")),
+            singleflight.do("b", lambda: work("b")),
+        )
+
+    assert run(scenario()) == [("a", False), ("b", False)]
+
+
+def test_calls_are_not_cached_after_completion():
+    async def scenario():
+        singleflight = SingleFlight("test")
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        first = await singleflight.do("event-1", work)
+        second = await singleflight.do("event-1", work)
+        return first, second
+
+    assert run(scenario()) == ((1, False), (2, False))
+
+
+def test_errors_are_shared_with_waiting_callers():
+    async def scenario():
+        singleflight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        return await asyncio.gather(
+            singleflight.do("event-1", work),
+            singleflight.do("event-1", work),
+            return_exceptions=True,
+        )
+
+    results = run(scenario())
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_waiting_caller_retries_when_errors_are_not_shared():
+    async def scenario():
+        singleflight = SingleFlight("test")
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            if calls == 1:
+                raise ValueError("failed")
+            return "result"
+
+        results = await asyncio.gather(
+            singleflight.do("event-1", work, share_errors=False),
+            singleflight.do("event-1", work, share_errors=False),
+            return_exceptions=True,
+        )
+        return calls, results
+
+    calls, results = run(scenario())
+
+    assert calls == 2
+    assert isinstance(results[0], ValueError)
+    assert results[1] == ("result", False)
+
+
+def test_leader_errors_without_waiters_are_raised():
+    async def scenario():
+        singleflight = SingleFlight("test")
+
+        async def work():
+            raise ValueError("failed")
+
+        await singleflight.do("event-1", work)
+
+    with pytest.raises(ValueError):
+        run(scenario())
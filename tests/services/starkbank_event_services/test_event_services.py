@@ -1,9 +1,12 @@
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, Mock, patch
 from datetime import datetime
+import threading
+import time
 from app.services.starkbank_event_services.implementation import (
     StarkBankEventFetcher,
     StarkBankEventStatusChanger,
+    prefetched,
 )
 from app.models.types import StarkBankEvent
 
@@ -56,21 +59,22 @@ class MockComplexInvoice(MockInvoice):
         self.customer_id = "cust-123"  # Flattened from customer
 
 
-def test_event_fetcher_fetches_undelivered_events(mock_starkbank_project, mock_starkbank_event):
-    with patch("starkbank.event.query") as mock_query:
+def test_event_fetcher_fetches_undelivered_events(
+    mock_starkbank_project, mock_starkbank_event
+):
+    with patch("starkbank.event.page") as mock_query:
         # Setup mock to return our test event
-        mock_query.return_value = [mock_starkbank_event]
-        
+        mock_query.return_value = ([mock_starkbank_event], None)
+
         # Create fetcher and get events
         fetcher = StarkBankEventFetcher(mock_starkbank_project)
         events = list(fetcher.fetch_undelivered_events())
-        
+
         # Verify query was called with correct parameters
         mock_query.assert_called_once_with(
-            is_delivered=False,
-            user=mock_starkbank_project
+            cursor=None, limit=100, is_delivered=False, user=mock_starkbank_project
         )
-        
+
         # Verify event was converted correctly
         assert len(events) == 1
         event = events[0]
@@ -79,7 +83,7 @@ def test_event_fetcher_fetches_undelivered_events(mock_starkbank_project, mock_s
         assert event.subscription == "invoice"
         assert event.workspaceId == "workspace-1"
         assert event.created == datetime(2024, 1, 1, 12, 0)
-        
+
         # Verify log was converted correctly
         assert event.log["id"] == "log-123"
         assert event.log["type"] == "credited"
@@ -89,23 +93,47 @@ def test_event_fetcher_fetches_undelivered_events(mock_starkbank_project, mock_s
 
 
 def test_event_fetcher_handles_empty_result(mock_starkbank_project):
-    with patch("starkbank.event.query") as mock_query:
+    with patch("starkbank.event.page") as mock_query:
         # Setup mock to return empty list
-        mock_query.return_value = []
-        
+        mock_query.return_value = ([], None)
+
         # Create fetcher and get events
         fetcher = StarkBankEventFetcher(mock_starkbank_project)
         events = list(fetcher.fetch_undelivered_events())
-        
+
         # Verify query was called
         mock_query.assert_called_once()
-        
+
         # Verify no events were returned
         assert len(events) == 0
 
 
+def test_event_fetcher_calls_the_api_once_per_page(mock_starkbank_project):
+    with patch("starkbank.event.page") as mock_page:
+        mock_page.side_effect = [
+            ([MockEvent() for _ in range(50)], "cursor-1"),
+            ([MockEvent() for _ in range(50)], "cursor-2"),
+            ([MockEvent() for _ in range(20)], None),
+        ]
+        resilient_caller = MagicMock()
+        resilient_caller.call.side_effect = (
+            lambda method, function, *args, **kwargs: function(*args, **kwargs)
+        )
+
+        fetcher = StarkBankEventFetcher(
+            mock_starkbank_project, resilient_caller=resilient_caller, page_size=50
+        )
+        events = list(fetcher.fetch_undelivered_events())
+
+        assert len(events) == 120
+        assert resilient_caller.call.call_count == 3
+        cursors = [c.kwargs["cursor"] for c in mock_page.call_args_list]
+        assert cursors == [None, "cursor-1", "cursor-2"]
+        assert {c.kwargs["limit"] for c in mock_page.call_args_list} == {50}
+
+
 def test_event_fetcher_handles_complex_log_attributes(mock_starkbank_project):
-    with patch("starkbank.event.query") as mock_query:
+    with patch("starkbank.event.page") as mock_query:
         # Create a mock event with nested attributes
         event = MockEvent()
         invoice = MockComplexInvoice()
@@ -116,12 +144,12 @@ def test_event_fetcher_handles_complex_log_attributes(mock_starkbank_project):
         invoice.name = "John Doe"  # Flattened customer attributes
         invoice.customer_id = "cust-123"  # Flattened customer attributes
         event.log.invoice = invoice
-        mock_query.return_value = [event]
-        
+        mock_query.return_value = ([event], None)
+
         # Create fetcher and get events
         fetcher = StarkBankEventFetcher(mock_starkbank_project)
         events = list(fetcher.fetch_undelivered_events())
-        
+
         # Verify complex attributes were converted correctly
         event = events[0]
         assert event.log["invoice"]["amount"] == 1000
@@ -132,15 +160,15 @@ def test_event_fetcher_handles_complex_log_attributes(mock_starkbank_project):
 
 
 def test_event_fetcher_handles_query_error(mock_starkbank_project):
-    with patch("starkbank.event.query") as mock_query:
+    with patch("starkbank.event.page") as mock_query:
         # Setup mock to raise an exception
         mock_query.side_effect = Exception("API Error")
-        
+
         # Create fetcher and try to get events
         fetcher = StarkBankEventFetcher(mock_starkbank_project)
         with pytest.raises(Exception) as exc_info:
             list(fetcher.fetch_undelivered_events())
-        
+
         assert "API Error" in str(exc_info.value)
 
 
@@ -149,12 +177,10 @@ def test_event_status_changer_marks_event_as_delivered(mock_starkbank_project):
         # Create status changer and mark event
         status_changer = StarkBankEventStatusChanger(mock_starkbank_project)
         status_changer.mark_as_delivered("event-123")
-        
+
         # Verify update was called with correct parameters
         mock_update.assert_called_once_with(
-            "event-123",
-            is_delivered=True,
-            user=mock_starkbank_project
+            "event-123", is_delivered=True, user=mock_starkbank_project
         )
 
 
@@ -162,10 +188,86 @@ def test_event_status_changer_handles_update_error(mock_starkbank_project):
     with patch("starkbank.event.update") as mock_update:
         # Setup mock to raise an exception
         mock_update.side_effect = Exception("Update failed")
-        
+
         # Create status changer and try to mark event
         status_changer = StarkBankEventStatusChanger(mock_starkbank_project)
         with pytest.raises(Exception) as exc_info:
             status_changer.mark_as_delivered("event-123")
-        
-        assert "Update failed" in str(exc_info.value) 
\ No newline at end of file
+
+        assert "Update failed" in str(exc_info.value)
+
+
+def test_event_fetcher_fetches_the_next_page_while_one_is_handled(
+    mock_starkbank_project,
+):
+    next_page_fetched = threading.Event()
+
+    def page(cursor=None, **query):
+        if cursor is None:
+            return [MockEvent()], "cursor-1"
+        next_page_fetched.set()
+        return [MockEvent()], None
+
+    with patch("starkbank.event.page", side_effect=page):
+        fetcher = StarkBankEventFetcher(mock_starkbank_project, read_ahead=1)
+        events = fetcher.fetch_undelivered_events()
+
+        next(events)
+        # still handling the first page
+        assert next_page_fetched.wait(1)
+        assert len(list(events)) == 1
+
+
+def wait_for_prefetch_threads():
+    deadline = time.monotonic() + 1
+    while any(t.name == "prefetch" for t in threading.enumerate()):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_prefetched_keeps_the_order():
+    assert list(prefetched(range(10), read_ahead=3)) == list(range(10))
+
+
+def test_prefetched_reads_at_most_read_ahead_items_ahead():
+    produced = []
+
+    def items():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    consumer = prefetched(items(), read_ahead=2)
+    next(consumer)
+    time.sleep(0.05)
+
+    # the one taken, the buffered ones and the one waiting for room
+    assert len(produced) <= 4
+    consumer.close()
+    wait_for_prefetch_threads()
+
+
+def test_prefetched_raises_the_error_of_the_items_in_order():
+    def items():
+        yield 1
+        raise ValueError("page failed")
+
+    consumer = prefetched(items(), read_ahead=2)
+
+    assert next(consumer) == 1
+    with pytest.raises(ValueError, match="page failed"):
+        next(consumer)
+
+
+def test_closing_prefetched_stops_the_thread():
+    def items():
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    consumer = prefetched(items(), read_ahead=2)
+    next(consumer)
+    consumer.close()
+
+    wait_for_prefetch_threads()
@@ -139,3 +139,12 @@ def test_api_error_handling():
             StarkBankSignatureVerifier(project)
 
         assert "Failed to get signatures" in str(exc_info.value)
+
+
+def test_public_keys_are_fetched_with_a_timeout(mock_starkbank_project):
+    with patch("requests.get") as mock_get:
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"publicKeys": []}
+        StarkBankSignatureVerifier(mock_starkbank_project, timeout=3)
+
+    assert mock_get.call_args.kwargs["timeout"] == 3
@@ -0,0 +1,112 @@
+import json
+import logging
+import queue
+import sys
+import threading
+from app.services.structured_logging.implementation import (
+    ContextFilter,
+    DebugSampler,
+    JsonFormatter,
+    LogPipeline,
+    NonBlockingQueueHandler,
+)
+
+
+def make_record(level=logging.INFO, msg="Handled %s", args=("event",), **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+    for name, value in extra.items():
+        setattr(record, name, value)
+    return record
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = []
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+        self.threads.append(threading.current_thread().name)
+
+
+def test_json_formatter_writes_one_object_with_the_extra_fields():
+    line = JsonFormatter().format(make_record(event_id="1", counts={"processed": 2}))
+
+    entry = json.loads(line)
+    assert entry["level"] == "INFO"
+    assert entry["logger"] == "app.test"
+    assert entry["message"] == "Handled event"
+    assert entry["event_id"] == "1"
+    assert entry["counts"] == {"processed": 2}
+    assert "time" in entry
+
+
+def test_json_formatter_writes_the_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record(logging.ERROR)
+        record.exc_info = sys.exc_info()
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_context_filter_adds_the_context_and_keeps_the_extra_fields():
+    context_filter = ContextFilter(lambda: {"request_id": "r1", "event_id": "e1"})
+    record = make_record(event_id="given")
+
+    assert context_filter.filter(record)
+    assert record.request_id == "r1"
+    assert record.event_id == "given"
+
+
+def test_debug_sampler_keeps_a_share_of_the_debug_records():
+    draws = iter([0.05, 0.5])
+    sampler = DebugSampler(0.1, draw=lambda: next(draws))
+
+    kept = make_record(logging.DEBUG)
+    assert sampler.filter(kept)
+    assert kept.sample_rate == 0.1
+    assert not sampler.filter(make_record(logging.DEBUG))
+
+
+def test_debug_sampler_keeps_every_other_record():
+    sampler = DebugSampler(0, draw=lambda: 0.99)
+
+    assert sampler.filter(make_record(logging.INFO))
+    assert sampler.filter(make_record(logging.WARNING))
+
+
+def test_a_full_queue_drops_the_record_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+
+    handler.handle(make_record())
+    handler.handle(make_record())
+
+    assert handler.queue.qsize() == 1
+
+
+def test_the_message_is_taken_when_logged():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    counts = {"processed": 1}
+
+    handler.handle(make_record(msg="Counts %s", args=(counts,)))
+    counts["processed"] = 2
+
+    assert handler.queue.get().getMessage() == "Counts {'processed': 1}"
+
+
+def test_pipeline_writes_from_a_background_thread():
+    output = ListHandler()
+    output.setFormatter(JsonFormatter())
+    pipeline = LogPipeline(output)
+    pipeline.start()
+
+    pipeline.handler.handle(make_record())
+    pipeline.stop()
+
+    assert [json.loads(line)["message"] for line in output.records] == ["Handled event"]
+    assert output.threads != [threading.current_thread().name]
@@ -0,0 +1,27 @@
+import asyncio
+import fakeredis
+from app.services.thread_lock.implementation import (
+    AsyncRedisThreadLock,
+    RedisThreadLock,
+)
+
+
+def test_lock_is_exclusive():
+    thread_lock = RedisThreadLock(fakeredis.FakeRedis())
+
+    assert thread_lock.lock("job", 60)
+    assert not thread_lock.lock("job", 60)
+    thread_lock.unlock("job")
+    assert thread_lock.lock("job", 60)
+
+
+def test_async_lock_is_exclusive():
+    async def scenario():
+        thread_lock = AsyncRedisThreadLock(fakeredis.FakeAsyncRedis())
+        results = [await thread_lock.lock("job", 60), await thread_lock.lock("job", 60)]
+        await thread_lock.unlock("job")
+        results.append(await thread_lock.lock("job", 60))
+        return results
+
+    first, second, third = asyncio.run(scenario())
+    assert first and not second and third
@@ -1,6 +1,8 @@
+import json
 import pytest
 from unittest.mock import Mock, patch
-from app.models.types import Transfer, Account, AccountType
+import starkbank
+from app.models.types import Transfer, Account, AccountType, credited_invoice_transfer
 from app.services.transfer_service.implementation import StarkBankTransferSender
 
 
@@ -30,7 +32,7 @@ def test_send_converts_to_starkbank_transfer(mock_account, mock_starkbank_projec
         mock_create.assert_called_once()
         created_transfers = mock_create.call_args[0][0]
         assert len(created_transfers) == 1
-        
+
         starkbank_transfer = created_transfers[0]
         assert starkbank_transfer.bank_code == "341"
         assert starkbank_transfer.branch_code == "0001"
@@ -67,7 +69,7 @@ def test_send_with_hyphenated_account(mock_starkbank_project):
     account = Account(
         bank_code="341",
         branch="0001",
-        account="123456-7",  
+        account="123456-7",
         name="Test Account",
         tax_id="123.456.789-00",
         account_type=AccountType.CHECKING,
@@ -81,4 +83,85 @@ def test_send_with_hyphenated_account(mock_starkbank_project):
         mock_create.assert_called_once()
         created_transfers = mock_create.call_args[0][0]
         starkbank_transfer = created_transfers[0]
-        assert starkbank_transfer.account_number == "123456-7" 
\ No newline at end of file
+        assert starkbank_transfer.account_number == "123456-7"
+
+
+def test_send_passes_priority(mock_account, mock_starkbank_project):
+    resilient_caller = Mock()
+    sender = StarkBankTransferSender(
+        mock_starkbank_project, resilient_caller=resilient_caller, high_priority=True
+    )
+
+    sender.send(Transfer(account=mock_account, amount=1000))
+
+    assert resilient_caller.call.call_args.kwargs["high_priority"] is True
+    assert resilient_caller.call.call_args.kwargs["idempotent"] is False
+
+
+def test_send_sets_external_id_and_tags(mock_account, mock_starkbank_project):
+    resilient_caller = Mock()
+    sender = StarkBankTransferSender(
+        mock_starkbank_project, resilient_caller=resilient_caller
+    )
+
+    sender.send(credited_invoice_transfer(mock_account, 1000, "123", "456"))
+
+    starkbank_transfer = resilient_caller.call.call_args[0][2][0]
+    assert starkbank_transfer.external_id == "invoice-456"
+    assert starkbank_transfer.tags == ["event/123", "invoice/456"]
+    assert resilient_caller.call.call_args.kwargs["idempotent"] is True
+
+
+def test_credited_invoice_transfer_without_invoice_uses_the_event(mock_account):
+    transfer = credited_invoice_transfer(mock_account, 1000, "123")
+
+    assert transfer.external_id == "event-123"
+    assert transfer.tags == ["event/123"]
+
+
+# body of the 400 Stark Bank answers a transfer whose external id is taken
+REUSED_EXTERNAL_ID_RESPONSE = (
+    b'{"errors": [{"code": "invalidExternalId", '
+    b'"message": "Element 0: externalId invoice-456 is already in use"}]}'
+)
+
+
+def test_send_counts_a_reused_external_id_as_sent(mock_account, mock_starkbank_project):
+    resilient_caller = Mock()
+    # built as the SDK does from the response
+    resilient_caller.call.side_effect = starkbank.error.InputErrors(
+        json.loads(REUSED_EXTERNAL_ID_RESPONSE)["errors"]
+    )
+    sender = StarkBankTransferSender(
+        mock_starkbank_project, resilient_caller=resilient_caller
+    )
+
+    sender.send(credited_invoice_transfer(mock_account, 1000, "123", "456"))
+
+
+def test_send_matches_a_reused_external_id_by_code(
+    mock_account, mock_starkbank_project
+):
+    resilient_caller = Mock()
+    resilient_caller.call.side_effect = starkbank.error.InputErrors(
+        [{"code": "invalidTransfer", "message": "externalId must be url safe"}]
+    )
+    sender = StarkBankTransferSender(
+        mock_starkbank_project, resilient_caller=resilient_caller
+    )
+
+    with pytest.raises(starkbank.error.InputErrors):
+        sender.send(credited_invoice_transfer(mock_account, 1000, "123", "456"))
+
+
+def test_send_raises_other_input_errors(mock_account, mock_starkbank_project):
+    resilient_caller = Mock()
+    resilient_caller.call.side_effect = starkbank.error.InputErrors(
+        [{"code": "invalidAccountNumber", "message": "Invalid account number"}]
+    )
+    sender = StarkBankTransferSender(
+        mock_starkbank_project, resilient_caller=resilient_caller
+    )
+
+    with pytest.raises(starkbank.error.InputErrors):
+        sender.send(credited_invoice_transfer(mock_account, 1000, "123", "456"))
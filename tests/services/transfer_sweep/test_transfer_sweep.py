@@ -0,0 +1,126 @@
+import fakeredis
+import pytest
+from app.models.types import Account, AccountType
+from app.services.transfer_sweep.implementation import RedisTransferSweeper
+
+
+@pytest.fixture
+def account():
+    return Account(
+        bank_code="341",
+        branch="0001",
+        account="1234567",
+        name="Test Account",
+        tax_id="123.456.789-00",
+        account_type=AccountType.CHECKING,
+    )
+
+
+@pytest.fixture
+def now():
+    return [1000.0]
+
+
+@pytest.fixture
+def sweeper(now):
+    return RedisTransferSweeper(fakeredis.FakeRedis(), clock=lambda: now[0])
+
+
+def test_credits_accumulate_once_per_event(sweeper, account):
+    assert sweeper.credit(account, "event-1", 900)
+    assert sweeper.credit(account, "event-2", 100)
+    assert not sweeper.credit(account, "event-1", 900)
+
+    assert sweeper.pending_amount(account) == 1000
+    assert sweeper.accounts() == [account]
+
+
+def test_take_moves_the_pending_credits_to_a_batch(sweeper, account):
+    sweeper.credit(account, "event-1", 900)
+    sweeper.credit(account, "event-2", 100)
+
+    batch = sweeper.take(account)
+
+    assert batch.amount == 1000
+    assert batch.event_ids == ["event-1", "event-2"]
+    assert sweeper.pending_amount(account) == 0
+    assert sweeper.open_batches(account) == [batch.sweep_id]
+    assert sweeper.take(account) is None
+
+
+def test_credits_after_a_take_go_to_the_next_batch(sweeper, account):
+    sweeper.credit(account, "event-1", 900)
+    sweeper.take(account)
+
+    sweeper.credit(account, "event-2", 100)
+
+    assert sweeper.take(account).event_ids == ["event-2"]
+
+
+def test_complete_records_the_sweep_in_the_ledger(sweeper, account):
+    sweeper.credit(account, "event-1", 900)
+    batch = sweeper.take(account)
+
+    sweeper.complete(batch)
+
+    (entry,) = sweeper.ledger()
+    assert entry["sweep_id"] == batch.sweep_id
+    assert entry["amount"] == 900
+    assert entry["event_ids"] == ["event-1"]
+    assert entry["status"] == "sent"
+    assert sweeper.open_batches(account) == []
+
+
+def test_open_batches_can_be_read_back(sweeper, account):
+    sweeper.credit(account, "event-1", 900)
+    sweeper.credit(account, "event-2", 100)
+    batch = sweeper.take(account)
+
+    assert sweeper.batch(account, batch.sweep_id) == batch
+    assert sweeper.batch(account, "unknown") is None
+
+
+def test_fail_sets_the_batch_aside(sweeper, account):
+    sweeper.credit(account, "event-1", 900)
+    batch = sweeper.take(account)
+
+    sweeper.fail(batch)
+
+    assert sweeper.ledger()[0]["status"] == "failed"
+    assert sweeper.open_batches(account) == []
+    assert sweeper.failed_batches(account) == [batch.sweep_id]
+    assert sweeper.batch(account, batch.sweep_id) == batch
+
+
+def test_is_due_on_threshold_or_interval(sweeper, account, now):
+    assert not sweeper.is_due(account, threshold=1000, interval=60)
+
+    sweeper.credit(account, "event-1", 900)
+    now[0] += 60
+    assert sweeper.is_due(account, threshold=1000, interval=60)
+
+    sweeper.take(account)
+    sweeper.credit(account, "event-2", 900)
+    assert not sweeper.is_due(account, threshold=1000, interval=60)
+
+    sweeper.credit(account, "event-3", 100)
+    assert sweeper.is_due(account, threshold=1000, interval=60)
+
+    sweeper.take(account)
+    sweeper.credit(account, "event-4", 100)
+    now[0] += 60
+    assert sweeper.is_due(account, threshold=1000, interval=60)
+
+
+def test_the_first_credit_of_an_account_is_not_overdue(sweeper, account, now):
+    sweeper.credit(account, "event-1", 900)
+    assert not sweeper.is_due(account, threshold=1000, interval=60)
+
+    # the interval counts from the first credit, not the later ones
+    now[0] += 30
+    sweeper.credit(account, "event-2", 50)
+    now[0] += 29
+    assert not sweeper.is_due(account, threshold=1000, interval=60)
+
+    now[0] += 1
+    assert sweeper.is_due(account, threshold=1000, interval=60)
@@ -0,0 +1,144 @@
+import fakeredis
+import pytest
+from app.services.work_queue.implementation import RedisWorkQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def queue(clock):
+    return RedisWorkQueue(
+        fakeredis.FakeRedis(), "test", visibility_timeout=60, clock=clock
+    )
+
+
+def test_items_are_claimed_in_order_in_batches(queue):
+    queue.push({"a": "1", "b": "2", "c": "3"})
+
+    assert queue.claim(2) == [("a", "1"), ("b", "2")]
+    assert queue.claim(2) == [("c", "3")]
+    assert queue.claim(2) == []
+
+
+def test_queued_items_are_not_pushed_again(queue):
+    assert queue.push({"a": "1"}) == 1
+    assert queue.push({"a": "1", "b": "2"}) == 1
+    queue.claim(1)
+
+    # still in flight
+    assert queue.push({"a": "1"}) == 0
+    assert queue.counts() == {"ready": 1, "in_flight": 1}
+
+
+def test_acknowledged_items_are_gone(queue, clock):
+    queue.push({"a": "1"})
+    queue.claim(1)
+
+    queue.ack(["a"])
+    clock.now += 61
+
+    assert queue.claim(1) == []
+    assert queue.counts() == {"ready": 0, "in_flight": 0}
+    assert queue.push({"a": "1"}) == 1
+
+
+def test_unacknowledged_items_are_claimed_again_after_the_timeout(queue, clock):
+    queue.push({"a": "1"})
+    queue.claim(1)
+
+    clock.now += 59
+    assert queue.claim(1) == []
+    clock.now += 1
+    assert queue.claim(1) == [("a", "1")]
+
+
+def test_released_items_are_claimed_again_after_the_delay(queue, clock):
+    queue.push({"a": "1", "b": "2"})
+    queue.claim(2)
+
+    queue.release(["a"])
+    queue.release(["b"], delay=10)
+
+    assert queue.claim(2) == [("a", "1")]
+    clock.now += 10
+    assert queue.claim(2) == [("b", "2")]
+
+
+def test_release_ignores_acknowledged_items(queue):
+    queue.push({"a": "1"})
+    queue.claim(1)
+    queue.ack(["a"])
+
+    queue.release(["a"])
+
+    assert queue.counts() == {"ready": 0, "in_flight": 0}
+
+
+def test_extended_items_stay_invisible_for_another_timeout(queue, clock):
+    queue.push({"a": "1"})
+    queue.claim(1)
+
+    clock.now += 50
+    queue.extend(["a"])
+    clock.now += 50
+
+    assert queue.claim(1) == []
+    clock.now += 10
+    assert queue.claim(1) == [("a", "1")]
+
+
+def test_failed_items_go_to_the_dead_letters_after_max_attempts(clock):
+    queue = RedisWorkQueue(fakeredis.FakeRedis(), "test", max_attempts=2, clock=clock)
+    queue.push({"a": "1"})
+
+    queue.claim(1)
+    assert queue.fail(["a"], delay=10) == []
+    clock.now += 10
+    queue.claim(1)
+    assert queue.fail(["a"], delay=10) == ["a"]
+
+    clock.now += 10
+    assert queue.claim(1) == []
+    assert queue.dead_letters() == {"a": "1"}
+    # not queued again by the next coordinator run
+    assert queue.push({"a": "1"}) == 0
+
+
+def test_acknowledging_forgets_the_failures(clock):
+    queue = RedisWorkQueue(fakeredis.FakeRedis(), "test", max_attempts=2, clock=clock)
+    queue.push({"a": "1"})
+    queue.claim(1)
+    queue.fail(["a"])
+    queue.claim(1)
+    queue.ack(["a"])
+
+    queue.push({"a": "1"})
+    queue.claim(1)
+
+    assert queue.fail(["a"]) == []
+
+
+def test_reads_the_time_of_the_redis_server():
+    redis_client = fakeredis.FakeRedis()
+    queue = RedisWorkQueue(redis_client, "test", visibility_timeout=60)
+    seconds, microseconds = redis_client.time()
+    now = seconds + microseconds / 1_000_000
+    queue.push({"a": "1", "b": "2"})
+    queue.claim(2)
+
+    queue.release(["b"], delay=10)
+
+    in_flight = dict(redis_client.zrange(queue.in_flight_key, 0, -1, withscores=True))
+    assert in_flight[b"a"] == pytest.approx(now + 60, abs=1)
+    assert in_flight[b"b"] == pytest.approx(now + 10, abs=1)
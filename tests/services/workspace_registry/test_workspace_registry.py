@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import patch
+from app.models.types import Account, AccountType
+from app.services.workspace_registry.implementation import (
+    Workspace,
+    WorkspaceRegistry,
+)
+
+
+@pytest.fixture
+def account():
+    return Account(
+        bank_code="341",
+        branch="0001",
+        account="1234567",
+        name="Test Account",
+        tax_id="123.456.789-00",
+        account_type=AccountType.CHECKING,
+    )
+
+
+def make_workspace(account, workspace_id, namespace=""):
+    return Workspace(
+        f"{workspace_id}-project",
+        workspace_id,
+        "sandbox",
+        "private-key",
+        account,
+        rate_limits={"transfer": 5},
+        namespace=namespace,
+    )
+
+
+def test_finds_workspaces_by_workspace_id(account):
+    main = make_workspace(account, "main")
+    other = make_workspace(account, "other", "workspace:other")
+    registry = WorkspaceRegistry([main, other])
+
+    assert registry.get("other") is other
+    assert registry.get("other-project") is None
+    assert registry.get_by_project("other-project") is other
+    assert registry.find_queued("other-project") is other
+    assert registry.find_queued("other") is other
+    assert registry.get("unknown") is None
+    assert registry.get(None) is None
+    assert registry.default is main
+    assert list(registry) == [main, other]
+    assert len(registry) == 2
+
+
+def test_needs_a_workspace():
+    with pytest.raises(ValueError):
+        WorkspaceRegistry([])
+
+
+def test_main_workspace_keeps_its_keys(account):
+    assert make_workspace(account, "main").key("sweep") == "sweep"
+    assert (
+        make_workspace(account, "other", "workspace:other").key("sweep")
+        == "workspace:other:sweep"
+    )
+
+
+def test_project_is_built_once(account):
+    workspace = make_workspace(account, "main")
+
+    with patch("starkbank.Project") as mock_project:
+        assert workspace.project is workspace.project
+
+    mock_project.assert_called_once_with(
+        environment="sandbox", id="main-project", private_key="private-key"
+    )
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+# cumulative time to import app.main, as a multiple of the time to import
+# the framework it is built on, measured in the same run: both slow down
+# together on a busy machine. Override with IMPORT_TIME_BUDGET_RATIO
+BASELINE_MODULE = "fastapi"
+IMPORT_TIME_BUDGET_RATIO = float(os.getenv("IMPORT_TIME_BUDGET_RATIO", "2.5"))
+ATTEMPTS = 3
+
+# only needed once the application runs, imported where they are used
+LAZY_MODULES = ("apscheduler", "faker", "starkbank", "requests")
+
+
+def run_python(code: str, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_time_ms(module: str) -> float:
+    stderr = run_python(f"import {module}", "-X", "importtime").stderr
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    raise AssertionError(f"{module} not found in -X importtime output:\n{stderr}")
+
+
+def test_app_import_time_is_within_budget():
+    # the best of a few interleaved runs, so a busy moment does not fail it
+    app_times, baseline_times = [], []
+    for _ in range(ATTEMPTS):
+        app_times.append(import_time_ms("app.main"))
+        baseline_times.append(import_time_ms(BASELINE_MODULE))
+    import_time, baseline = min(app_times), min(baseline_times)
+
+    assert import_time <= IMPORT_TIME_BUDGET_RATIO * baseline, (
+        f"importing app.main took {import_time:.0f} ms, "
+        f"{import_time / baseline:.1f} times {BASELINE_MODULE} ({baseline:.0f} ms), "
+        f"the budget is {IMPORT_TIME_BUDGET_RATIO:.1f} times"
+    )
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    result = run_python(
+        "import sys, app.main; "
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+
+    assert result.stdout.strip() == ""
+
+
+def test_settings_are_not_loaded_on_import():
+    result = run_python(
+        "import app.main; from app.core.config import get_settings; "
+        "print(get_settings.cache_info().currsize)"
+    )
+
+    assert result.stdout.strip() == "0"